@@ -0,0 +1,88 @@
+'''
+Compares the columnar RK model store with pickling a list of models.
+
+Models are built by a pipeline from random rows of a 316 node ontology (15
+groups of 20 leaves). The store is timed for writing, for readAll, which is
+lazy and decodes nothing, for materialising every model read (its graph,
+mask and edges, which are overlays over the stored structural graph), and
+for reading every node value and edge of every model, which decodes them.
+
+    python example/columnar_benchmark.py --rows 2000
+'''
+import argparse
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from rktoolkit.functions.htg_transformers import BaseOntologyTransform
+from rktoolkit.functions.filters import RangeFilter
+from rktoolkit.functions.linkers import SimpleChildLinker
+from rktoolkit.models.pipeline import RKPipeline
+from rktoolkit.io.columnar import ColumnarModelWriter, ColumnarModelReader
+
+def build_models(rows, seed=0):
+    mapping = {"root": {"G{}".format(i): {"G{}_{}".format(i, j): {} for j in range(20)} for i in range(15)}}
+    cols = ["G{}_{}".format(i, j) for i in range(15) for j in range(20)]
+    df = pd.DataFrame(np.random.default_rng(seed).random((rows, len(cols))), columns=cols)
+    pipeline = RKPipeline({c: RangeFilter(min=.2, max=.9) for c in cols[::3]},
+                          {"root": SimpleChildLinker(theta=.05)})
+    return list(pipeline.transform_batch(df, BaseOntologyTransform(mapping=mapping)))
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return time.perf_counter() - start, result
+
+def materialize(models):
+    for m in models:
+        m.G, m.mask, m.edges
+    return models
+
+def read_all(models):
+    for m in models:
+        m.G.get_value_dict()
+        list(m.edges.values())
+    return models
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+    models = build_models(args.rows)
+    d = tempfile.mkdtemp()
+    pkl, store = os.path.join(d, "models.pkl"), os.path.join(d, "models.rk")
+
+    def write_pickle():
+        with open(pkl, "wb") as f:
+            pickle.dump(models, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def write_store():
+        with ColumnarModelWriter(store) as writer:
+            for m in models:
+                writer.write(m)
+
+    def read_pickle():
+        with open(pkl, "rb") as f:
+            return pickle.load(f)
+
+    def read_store():
+        with ColumnarModelReader(store) as reader:
+            return reader.readAll()
+
+    rows = [
+        ("write", timed(write_pickle)[0], timed(write_store)[0]),
+        ("readAll", timed(read_pickle)[0], timed(read_store)[0]),
+        ("readAll + materialise", timed(lambda: materialize(read_pickle()))[0],
+         timed(lambda: materialize(read_store()))[0]),
+        ("readAll + read values", timed(lambda: read_all(read_pickle()))[0],
+         timed(lambda: read_all(read_store()))[0]),
+    ]
+    print("{} models, pickle {:.1f} MB, store {:.1f} MB".format(
+        len(models), os.path.getsize(pkl) / 2**20, os.path.getsize(store) / 2**20))
+    for name, p, c in rows:
+        print("{:<22} pickle {:7.3f}s  store {:7.3f}s  {:6.1f}x".format(name, p, c, p / c))
+
+if __name__ == "__main__":
+    main()
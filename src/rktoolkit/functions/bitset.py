@@ -0,0 +1,211 @@
+import numpy as np
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def popcount(words, axis=-1):
+    '''
+    Number of set bits of uint64 words, summed over an axis. Uses
+    :code:`np.bitwise_count` where NumPy provides it and a byte lookup table
+    otherwise.
+
+    :param words: Packed bitsets
+    :type words: ndarray[uint64]
+    :param axis: Axis of the words of one bitset, defaults to -1
+    :type axis: int, optional
+    :rtype: ndarray[int64]
+    '''
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        bits = np.bitwise_count(words)
+    else:
+        bits = _POPCOUNT8[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1)
+    return bits.sum(axis=axis, dtype=np.int64)
+
+class Vocabulary():
+    '''
+    Encodes hashable items (node ids, edge tuples) as integer positions, so
+    sets of items become packed uint64 bitsets. Items that are not in the
+    vocabulary are kept aside as a python set and only compared as sets.
+
+    :param items: Initial items of the vocabulary, defaults to none
+    :type items: Iterable, optional
+    '''
+
+    def __init__(self, items=()):
+        self.items = []
+        self._index = {}
+        for item in items:
+            self.add(item)
+
+    @classmethod
+    def from_graph(cls, G, kind="nodes"):
+        '''
+        Builds the vocabulary of the node ids or edge keys of a graph.
+
+        :param G: Graph, typically the structural graph shared by the models
+        :type G: Graph
+        :param kind: "nodes" or "edges", defaults to "nodes"
+        :type kind: str, optional
+        :rtype: Vocabulary
+        '''
+        if kind == "nodes":
+            return cls(G.nodes)
+        if kind == "edges":
+            return cls(G.edges)
+        raise ValueError("Unknown kind {}".format(kind))
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self._index
+
+    def index(self, item):
+        '''
+        Returns the position of an item.
+
+        :raises KeyError: Raises KeyError if the item is not in the vocabulary
+        :rtype: int
+        '''
+        return self._index[item]
+
+    def add(self, item):
+        '''
+        Adds an item if it is new and returns its position.
+
+        :rtype: int
+        '''
+        i = self._index.get(item)
+        if i is None:
+            i = self._index[item] = len(self.items)
+            self.items.append(item)
+        return i
+
+    @property
+    def width(self):
+        '''Number of uint64 words of a bitset over the vocabulary'''
+        return (len(self.items) + 63) // 64
+
+    def encode(self, items):
+        '''
+        Encodes a set of items.
+
+        :param items: Items of the set
+        :type items: Iterable
+        :return: Packed bitset of the items in the vocabulary and the set of the others
+        :rtype: tuple[ndarray, frozenset]
+        '''
+        words = np.zeros(self.width, dtype=np.uint64)
+        positions, oov = [], set()
+        for item in items:
+            i = self._index.get(item)
+            if i is None:
+                oov.add(item)
+            else:
+                positions.append(i)
+        if positions:
+            p = np.array(positions, dtype=np.uint64)
+            np.bitwise_or.at(words, (p >> np.uint64(6)).astype(np.intp), np.uint64(1) << (p & np.uint64(63)))
+        return words, frozenset(oov)
+
+    def encode_many(self, collections):
+        '''
+        Encodes many sets of items.
+
+        :param collections: Sets of items
+        :type collections: Iterable[Iterable]
+        :return: Matrix of bitsets (one row per set) and the out of vocabulary items of every set
+        :rtype: tuple[ndarray, list[frozenset]]
+        '''
+        encoded = [self.encode(items) for items in collections]
+        words = np.zeros((len(encoded), self.width), dtype=np.uint64)
+        for k, (w, _) in enumerate(encoded):
+            words[k, :len(w)] = w
+        return words, [e[1] for e in encoded]
+
+def _pad(words, width):
+    if words.shape[-1] >= width:
+        return words
+    pad = [(0, 0)] * (words.ndim - 1) + [(0, width - words.shape[-1])]
+    return np.pad(words, pad)
+
+def _distance(inter, union):
+    inter = np.asarray(inter, dtype=np.float64)
+    union = np.asarray(union, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        d = 1 - inter / union
+    return np.where(union == 0, 0., d)
+
+def bitset_jaccard(a, b):
+    '''
+    Jaccard distance between two sets encoded by :meth:`Vocabulary.encode`,
+    as :func:`jaccard`. Two empty sets have a distance of 0.
+
+    :param a: First encoded set
+    :type a: tuple[ndarray, frozenset]
+    :param b: Second encoded set
+    :type b: tuple[ndarray, frozenset]
+    :rtype: float
+    '''
+    (wa, oa), (wb, ob) = a, b
+    width = max(len(wa), len(wb))
+    wa, wb = _pad(wa, width), _pad(wb, width)
+    inter = int(popcount(wa & wb)) + len(oa & ob)
+    union = int(popcount(wa)) + len(oa) + int(popcount(wb)) + len(ob) - inter
+    return float(_distance(inter, union))
+
+def bitset_jaccard_one_to_many(a, B):
+    '''
+    Jaccard distances between one encoded set and many.
+
+    :param a: Set encoded by :meth:`Vocabulary.encode`
+    :type a: tuple[ndarray, frozenset]
+    :param B: Sets encoded by :meth:`Vocabulary.encode_many`
+    :type B: tuple[ndarray, list[frozenset]]
+    :return: One distance per set of B
+    :rtype: ndarray
+    '''
+    (wa, oa), (WB, OB) = a, B
+    width = max(len(wa), WB.shape[1])
+    wa, WB = _pad(wa, width), _pad(WB, width)
+    inter = popcount(WB & wa[None, :])
+    if oa:
+        inter = inter + np.array([len(oa & o) for o in OB], dtype=np.int64)
+    sizes = popcount(WB) + np.array([len(o) for o in OB], dtype=np.int64)
+    return _distance(inter, int(popcount(wa)) + len(oa) + sizes - inter)
+
+def bitset_jaccard_many_to_many(A, B=None, block_size=256):
+    '''
+    Jaccard distances between every pair of encoded sets of A and B,
+    computed in blocks of rows of A, one word at a time, so memory stays at
+    block_size x len(B) counts.
+
+    :param A: Sets encoded by :meth:`Vocabulary.encode_many`
+    :type A: tuple[ndarray, list[frozenset]]
+    :param B: Sets encoded by :meth:`Vocabulary.encode_many`, defaults to A
+    :type B: tuple[ndarray, list[frozenset]], optional
+    :param block_size: Number of rows of A compared at once, defaults to 256
+    :type block_size: int, optional
+    :return: Distance matrix of shape (len(A), len(B))
+    :rtype: ndarray
+    '''
+    B = A if B is None else B
+    (WA, OA), (WB, OB) = A, B
+    width = max(WA.shape[1], WB.shape[1])
+    WA, WB = _pad(WA, width), _pad(WB, width)
+    sa = popcount(WA) + np.array([len(o) for o in OA], dtype=np.int64)
+    sb = popcount(WB) + np.array([len(o) for o in OB], dtype=np.int64)
+    oov_a = [i for i, o in enumerate(OA) if o]
+    oov_b = [j for j, o in enumerate(OB) if o]
+    out = np.empty((WA.shape[0], WB.shape[0]), dtype=np.float64)
+    for i0 in range(0, WA.shape[0], block_size):
+        i1 = min(i0 + block_size, WA.shape[0])
+        inter = np.zeros((i1 - i0, WB.shape[0]), dtype=np.int64)
+        for k in range(width):
+            inter += popcount((WA[i0:i1, k, None] & WB[None, :, k])[..., None])
+        for i in oov_a:
+            if i0 <= i < i1:
+                for j in oov_b:
+                    inter[i - i0, j] += len(OA[i] & OB[j])
+        out[i0:i1] = _distance(inter, sa[i0:i1, None] + sb[None, :] - inter)
+    return out
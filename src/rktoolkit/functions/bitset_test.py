@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from .bitset import (
+    Vocabulary,
+    popcount,
+    bitset_jaccard,
+    bitset_jaccard_one_to_many,
+    bitset_jaccard_many_to_many,
+)
+from .distance import jaccard
+
+def make_sets(n=12, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{("n", int(i)) for i in rng.choice(150, size=rng.integers(1, 60), replace=False)}
+            for _ in range(n)]
+
+def test_popcount(monkeypatch):
+    words = np.array([[0, 1, 2**64 - 1], [3, 2**63, 0]], dtype=np.uint64)
+    assert popcount(words).tolist() == [65, 3]
+    monkeypatch.delattr(np, "bitwise_count", raising=False)
+    assert popcount(words).tolist() == [65, 3]
+
+def test_bitset_jaccard():
+    sets = make_sets()
+    vocab = Vocabulary(("n", i) for i in range(100)) # items 100-149 are out of vocabulary
+    assert len(vocab) == 100 and vocab.width == 2
+    assert vocab.index(("n", 5)) == 5 and ("n", 120) not in vocab
+
+    encoded = [vocab.encode(s) for s in sets]
+    for a, ea in zip(sets, encoded):
+        for b, eb in zip(sets, encoded):
+            assert bitset_jaccard(ea, eb) == pytest.approx(jaccard(a, b))
+
+    B = vocab.encode_many(sets)
+    D = bitset_jaccard_many_to_many(B, block_size=5)
+    for i, a in enumerate(sets):
+        assert np.allclose(bitset_jaccard_one_to_many(encoded[i], B), D[i])
+        assert np.allclose(D[i], [jaccard(a, b) for b in sets])
+
+    # bitsets encoded before the vocabulary grew are padded
+    old = vocab.encode(sets[0])
+    vocab.add(("n", 149))
+    assert bitset_jaccard(old, vocab.encode(sets[0] | {("n", 149)})) == pytest.approx(
+        jaccard(sets[0], sets[0] | {("n", 149)}))
+    assert bitset_jaccard(vocab.encode([]), vocab.encode(set())) == 0
@@ -1,5 +1,6 @@
 import scipy as sp
 import numpy as np
+from scipy.linalg import cholesky, solve_triangular
 
 
 def jaccard(s1, s2): # two sets
@@ -27,24 +28,149 @@ def jaccard(s1, s2): # two sets
     jin = len(intersect)  / (len(s1) + len(s2) - len(intersect))
     return 1-jin
 
+def cosine_similarity(X, Y=None):
+    '''
+    Cosine similarity between the rows of X and the rows of Y. Rows with a zero
+    norm have a similarity of 0 with every other row.
+
+    :param X: Matrix of shape (n, p)
+    :type X: ndarray
+    :param Y: Matrix of shape (m, p). If None, X is compared with itself.
+    :type Y: ndarray, optional
+    :return: Similarity matrix of shape (n, m)
+    :rtype: ndarray
+    '''
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    Y = X if Y is None else np.atleast_2d(np.asarray(Y, dtype=float))
+    xn = np.linalg.norm(X, axis=1)
+    yn = np.linalg.norm(Y, axis=1)
+    xn[xn == 0] = 1
+    yn[yn == 0] = 1
+    return (X @ Y.T) / np.outer(xn, yn)
+
 def mahalanobis(x=None, data=None, cov=None):
     '''
-    Value Distance Funtion
-    
+    Value Distance Funtion. Fits a :class:`MahalanobisModel` on data and
+    scores x with it; fit a model once instead when scoring against the same
+    data repeatedly.
+
     :param x: vector or matrix of data with, say, p columns, defaults to None
     :type x: ndarray, optional
     :param data: ndarray of the distribution from which Value distance of each observation of x is to be computed, defaults to None
     :type data: ndarray, optional
     :param cov: covariance matrix (p x p) of the distribution. If None, will be computed from data.
     :type cov: ndarray, optional
-    :return: Value/Magnitudinal distance.
+    :return: Value/Magnitudinal distance (the squared Mahalanobis distance of every row of x).
     :rtype: ndarray
     '''
-    x_minus_mu = x - np.mean(data)
-    if not cov:
-        cov = np.cov(data.values.T)
-    inv_covmat = np.linalg.inv(cov)
+    return MahalanobisModel(cov=cov).fit(data).score(x)
+
+class MahalanobisModel():
+    '''
+    Mahalanobis distance to a fitted distribution. The mean and covariance
+    are fitted once, or incrementally from chunks of a stream with the
+    parallel form of Welford's algorithm, and the Cholesky factor L of the
+    covariance is computed once and cached. A batch of rows is scored by
+    solving L y = (x - mean) for every row, so only the p x p factor and the
+    rows themselves are ever held, never an n x n matrix.
+
+    :param cov: Fixed covariance matrix (p x p). If None, it is fitted with the mean, defaults to None
+    :type cov: ndarray, optional
+    '''
+
+    def __init__(self, cov=None):
+        self.fixed_cov = None if cov is None else np.asarray(cov, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        '''Forgets everything fitted so far.'''
+        self.n = 0
+        self.mean = None
+        self._m2 = None
+        self._factor = None
+
+    def fit(self, data, chunk_size=None):
+        '''
+        Fits the mean and covariance of data, replacing any previous fit.
+
+        :param data: Observations, one per row
+        :type data: ndarray
+        :param chunk_size: Fit chunk_size rows at a time, e.g. for memory mapped arrays, defaults to all rows at once
+        :type chunk_size: int, optional
+        :return: The fitted model
+        :rtype: MahalanobisModel
+        '''
+        self.reset()
+        n = len(data)
+        step = chunk_size or max(n, 1)
+        for i in range(0, n, step):
+            self.partial_fit(data[i:i + step])
+        return self
+
+    def partial_fit(self, X):
+        '''
+        Updates the mean and covariance with a chunk of observations.
+
+        :param X: Observations, one per row
+        :type X: ndarray
+        :return: The updated model
+        :rtype: MahalanobisModel
+        '''
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if X.shape[0] == 0:
+            return self
+        n, mean = X.shape[0], X.mean(axis=0)
+        centered = X - mean
+        m2 = centered.T @ centered
+        if self.n == 0:
+            self.mean, self._m2 = mean, m2
+        else:
+            total = self.n + n
+            delta = mean - self.mean
+            self.mean = self.mean + delta * n / total
+            self._m2 = self._m2 + m2 + np.outer(delta, delta) * self.n * n / total
+        self.n += n
+        self._factor = None
+        return self
+
+    @property
+    def cov(self):
+        '''Covariance matrix of the fitted distribution'''
+        if self.fixed_cov is not None:
+            return self.fixed_cov
+        if self.n < 2:
+            raise ValueError("At least two observations are needed to estimate the covariance")
+        return self._m2 / (self.n - 1)
+
+    @property
+    def factor(self):
+        '''Lower Cholesky factor of the covariance, computed once per fit'''
+        if self._factor is None:
+            self._factor = cholesky(np.atleast_2d(self.cov), lower=True)
+        return self._factor
+
+    def score(self, x, chunk_size=65536):
+        '''
+        Computes the squared Mahalanobis distance of every row of x.
 
-    left_term = np.dot(x_minus_mu, inv_covmat)
-    mahal = np.dot(left_term, x_minus_mu.T)
-    return mahal.diagonal()
+        :param x: Vector or matrix with p columns. Any array supporting row slices works, e.g. a memory mapped array larger than RAM.
+        :type x: ndarray
+        :param chunk_size: Number of rows scored at once, defaults to 65536
+        :type chunk_size: int, optional
+        :raises ValueError: Raises ValueError if the model is not fitted
+        :raises LinAlgError: Raises LinAlgError if the covariance is not positive definite
+        :return: Squared distances, one per row
+        :rtype: ndarray
+        '''
+        if self.mean is None:
+            raise ValueError("The model is not fitted")
+        if np.ndim(x) < 2:
+            x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+        L = self.factor
+        n = len(x)
+        out = np.empty(n, dtype=np.float64)
+        for i in range(0, n, chunk_size):
+            d = np.asarray(x[i:i + chunk_size], dtype=np.float64) - self.mean
+            y = solve_triangular(L, d.T, lower=True, check_finite=False)
+            out[i:i + chunk_size] = np.einsum("ij,ij->j", y, y)
+        return out
@@ -23,3 +23,34 @@ def test_mahalanobis():
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.spatial.distance.mahalanobis.html
 #    assert mahalanobis(x = pd.DataFrame([[1,0,0]]),
 #                       data = pd.DataFrame([[1, 0, 0], [0, 1, 0], [0, 0, 1]])) == 1
+
+def test_mahalanobis_model():
+    import numpy as np
+    import pytest
+    from scipy.spatial.distance import mahalanobis as sp_mahalanobis
+    from .distance import MahalanobisModel
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(200, 3)) @ np.array([[1, .5, 0], [0, 1, .2], [0, 0, 2]])
+    x = rng.normal(size=(17, 3))
+    VI = np.linalg.inv(np.cov(data.T))
+    expected = [sp_mahalanobis(r, data.mean(axis=0), VI) ** 2 for r in x]
+
+    model = MahalanobisModel().fit(data)
+    assert np.allclose(model.cov, np.cov(data.T))
+    assert np.allclose(model.score(x), expected)
+    assert np.allclose(model.score(x, chunk_size=4), expected)
+    assert np.allclose(model.score(x[0]), expected[:1])
+    assert np.allclose(mahalanobis(x=x, data=pd.DataFrame(data)), expected)
+
+    streamed = MahalanobisModel()
+    for chunk in np.array_split(data, [1, 50, 51, 120]):
+        streamed.partial_fit(chunk)
+    assert streamed.n == 200
+    assert np.allclose(streamed.mean, data.mean(axis=0))
+    assert np.allclose(streamed.cov, np.cov(data.T))
+    assert np.allclose(MahalanobisModel().fit(data, chunk_size=7).score(x), expected)
+
+    fixed = MahalanobisModel(cov=np.eye(3)).fit(data)
+    assert np.allclose(fixed.score(x), ((x - data.mean(axis=0)) ** 2).sum(axis=1))
+    with pytest.raises(ValueError):
+        MahalanobisModel().score(x)
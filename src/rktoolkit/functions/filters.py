@@ -1,3 +1,6 @@
+import numbers
+import numpy as np
+
 class RangeFilter():
     '''
     |   A range filter is one of the simplest filters that is provided in version 1 of the R-K Toolkit. We assign the filters to each level of the hierarchy that contains numeric data which operates as follows:
@@ -18,6 +21,7 @@ class RangeFilter():
 
         self.min = min
         self.max = max
+        self.missing = 0
 
     def get_knobs(self):
         '''Get knobs to be used for the filter range.
@@ -56,11 +60,25 @@ class RangeFilter():
         :rtype: bool
         '''
         if not "value" in node or node["value"] is None:
-            print("Warning: No value present for {}. Could not filter".format(node))
+            self.missing += 1
             return False
 
         return not (node["value"] > self.min and node["value"] <= self.max)
 
+    def filter_array(self, values):
+        '''
+        Vectorized :meth:`filter` over an array of values. NaN values are
+        filtered, as in :meth:`filter`.
+
+        :param values: Values of the nodes
+        :type values: ndarray
+        :return: True where the value is filtered
+        :rtype: ndarray[bool]
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        with np.errstate(invalid="ignore"):
+            return ~((values > self.min) & (values <= self.max))
+
 class FilterAll():
     '''
     Filter for all knobs. To be used when all needs to be filtered.
@@ -74,6 +92,9 @@ class FilterAll():
     def filter(self, node):
         return False
 
+    def filter_array(self, values):
+        return np.zeros(np.shape(values), dtype=bool)
+
 
 class FilterNone():
     '''
@@ -87,3 +108,93 @@ class FilterNone():
 
     def filter(self, node):
         return True
+
+    def filter_array(self, values):
+        return np.ones(np.shape(values), dtype=bool)
+
+class FilterBank():
+    '''
+    Compiles a filter map into arrays aligned to its nodes, so the filters of
+    every node (and of many rows) are evaluated at once. Range filters become
+    min / max vectors compared in a single NumPy operation, FilterAll and
+    FilterNone become constant masks and other filters are evaluated through
+    their :code:`filter_array`, or :code:`filter` if they have none.
+
+    The bank reads the knobs when it is created; create a new bank after
+    changing them. :attr:`fallback` holds the positions of the filters that
+    are not compiled.
+
+    :param filter_map: Filters by node id
+    :type filter_map: dict
+    '''
+
+    def __init__(self, filter_map):
+        self.nodes = list(filter_map.keys())
+        self.filters = list(filter_map.values())
+        kinds = [type(f) for f in self.filters]
+        self._range = np.array([i for i, k in enumerate(kinds) if k is RangeFilter], dtype=np.int64)
+        self._none = np.array([i for i, k in enumerate(kinds) if k is FilterNone], dtype=np.int64)
+        self.fallback = [i for i, k in enumerate(kinds) if k not in (RangeFilter, FilterAll, FilterNone)]
+        self.min = np.array([self.filters[i].min for i in self._range], dtype=np.float64)
+        self.max = np.array([self.filters[i].max for i in self._range], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def gather(self, G):
+        '''
+        Reads the values of the filtered nodes of a graph.
+
+        :param G: Graph to read the values from
+        :type G: Graph
+        :return: The values as floats (NaN where not a number) and whether a value is present
+        :rtype: tuple[ndarray, ndarray]
+        '''
+        values = np.full(len(self.nodes), np.nan)
+        present = np.zeros(len(self.nodes), dtype=bool)
+        for i, n in enumerate(self.nodes):
+            v = G.nodes[n].get("value")
+            present[i] = v is not None
+            if isinstance(v, numbers.Number):
+                values[i] = v
+        return values, present
+
+    def filter_array(self, values, present=None, nodes=None):
+        '''
+        Evaluates every filter of the bank.
+
+        :param values: Values with one column per node of the bank, or a single row
+        :type values: ndarray
+        :param present: Whether a value is present, defaults to all present.
+            Range filters never filter a missing value, they count it in
+            their :code:`missing` attribute instead.
+        :type present: ndarray, optional
+        :param nodes: Node attributes passed to filters without :code:`filter_array`, defaults to None
+        :type nodes: list[dict], optional
+        :return: True where the node is filtered, same shape as values
+        :rtype: ndarray[bool]
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        single = values.ndim == 1
+        values = np.atleast_2d(values)
+        out = np.zeros(values.shape, dtype=bool)
+        r = self._range
+        with np.errstate(invalid="ignore"):
+            out[:, r] = ~((values[:, r] > self.min) & (values[:, r] <= self.max))
+        if present is not None:
+            present = np.atleast_2d(np.asarray(present, dtype=bool))
+            out[:, r] &= present[:, r]
+            for i, m in zip(r.tolist(), (~present[:, r]).sum(axis=0).tolist()):
+                self.filters[i].missing += m
+        out[:, self._none] = True
+        for i in self.fallback:
+            f = self.filters[i]
+            if hasattr(f, "filter_array"):
+                out[:, i] = f.filter_array(values[:, i])
+            else:
+                node = nodes[i] if nodes is not None else {}
+                column = values[:, i].tolist()
+                if present is not None:
+                    column = [v if p else None for v, p in zip(column, present[:, i].tolist())]
+                out[:, i] = [bool(f.filter({**node, "value": v})) for v in column]
+        return out[0] if single else out
@@ -1,4 +1,5 @@
-from .filters import RangeFilter, FilterAll, FilterNone
+import numpy as np
+from .filters import RangeFilter, FilterAll, FilterNone, FilterBank
 
 def testFilters():
     '''
@@ -19,6 +20,35 @@ def testRangeFilterRemap():
     test.filter.set_knob("min", -1)
     assert test.filter.filter({'value': 0}) == False
 
+def testFilterArray():
+    '''
+    test vectorized filters match the scalar ones
+    '''
+    for f in make_filter_tests():
+        values = np.array([c[0] for c in f.cases], dtype=float)
+        assert f.filter.filter_array(values).tolist() == [c[1] for c in f.cases]
+
+class OddFilter():
+    def filter(self, node):
+        return node["value"] is not None and node["value"] % 2 == 1
+
+def testFilterBank():
+    '''
+    test a filter bank over many rows
+    '''
+    filters = {"a": RangeFilter(0, 1), "b": FilterAll(), "c": FilterNone(), "d": OddFilter(), "e": RangeFilter(-1, 3)}
+    bank = FilterBank(filters)
+    values = np.array([[.5, 0, 0, 1, 4], [2, 0, 0, 2, np.nan], [0, 0, 0, 3, 0]])
+    present = np.array([[True] * 5, [True] * 4 + [False], [True] * 5])
+    out = bank.filter_array(values, present)
+    for i, row in enumerate(values):
+        for j, n in enumerate(bank.nodes):
+            v = row[j] if present[i, j] else None
+            assert out[i, j] == filters[n].filter({"value": v})
+    assert filters["e"].missing == 2
+    assert filters["a"].missing == 0
+    assert bank.filter_array(values[0]).tolist() == out[0].tolist()
+
 
 class FilterTests():
     '''
@@ -1,8 +1,11 @@
 from ..models.graph import (
     Graph,
+    GraphOverlay,
     Vertex,
-    Edge
+    Edge,
+    copy_attributes
 )
+from ..models.compact import structural_index
 
 import numpy as np
 import matplotlib
@@ -19,19 +22,105 @@ class BaseOntologyTransform():
         self.cmap = matplotlib.cm.get_cmap('Spectral')
         self.color_decay_rate = color_decay_rate
 
+    @property
+    def mapping(self):
+        return self._mapping
+
+    @mapping.setter
+    def mapping(self, mapping):
+        self._mapping = mapping
+        self._template = None
+
+    @property
+    def lens(self):
+        return self._lens
+
+    @lens.setter
+    def lens(self, lens):
+        self._lens = lens
+        self._template = None
+
+    @property
+    def color_decay_rate(self):
+        return self._color_decay_rate
+
+    @color_decay_rate.setter
+    def color_decay_rate(self, color_decay_rate):
+        self._color_decay_rate = color_decay_rate
+        self._template = None
+
+    def compile(self):
+        '''
+        Compiles the mapping into an :class:`OntologyTemplate`. The hierarchy is
+        walked once and the node order, edges and colors are kept, so every
+        later transform only gathers the values of a row. The template is
+        cached and used by :meth:`transform` and :meth:`transform_many`.
+        Assigning the mapping, lens or color decay rate drops it; call
+        :meth:`compile` again after changing the mapping in place.
+
+        :return: Compiled template of the ontology
+        :rtype: OntologyTemplate
+        '''
+        H = Graph()
+        H.add_vertex(Vertex(self.lens))
+        self._template = OntologyTemplate(self._convert({}, H, self.mapping, parent=self.lens, level=1),
+                                          self.keys())
+        return self._template
+
+    @property
+    def template(self):
+        '''
+        Compiled template of the ontology, compiled on first use and again
+        after the mapping, lens or color decay rate were assigned.
+        '''
+        if getattr(self, "_template", None) is None:
+            self.compile()
+        return self._template
+
     def transform(self, X):
         '''
         Transforms the ontology into a Graph using the data from the dataframe of GWTC.
-        An empty graph is created and the rest of vertices and edges are added using a private convert method.
+        The structure comes from the compiled template (see :meth:`compile`);
+        only the values of the row are read, and the graph is an overlay over
+        the graph of the template (see :meth:`OntologyTemplate.build`).
 
         :param X: Data to be transformed to graph
         :type X: Any
         :return: Graph transform for the given data.
-        :rtype: Graph
+        :rtype: GraphOverlay
         '''
-        H = Graph()
-        H.add_vertex(Vertex(self.lens))
-        return self._convert(X, H, self.mapping, parent=self.lens, level=1)
+        template = self.template
+        return template.build(template.gather(X))
+
+    def transform_many(self, df):
+        '''
+        Transforms every row of a DataFrame into a Graph. Same as calling
+        :meth:`transform` on every row, but the values are gathered column by
+        column.
+
+        :param df: Data with one column per node of the ontology
+        :type df: DataFrame
+        :return: One graph per row
+        :rtype: list[GraphOverlay]
+        '''
+        template = self.template
+        return [template.build(v) for v in template.gather_frame(df)]
+
+    def keys(self):
+        '''
+        Returns the ids of the nodes whose value is read from the data, in the
+        order they are added to the graph. The lens is only included if it is
+        also a key of the mapping.
+
+        :rtype: list
+        '''
+        keys = []
+        def walk(hmap):
+            for k, v in hmap.items():
+                keys.append(k)
+                walk(v)
+        walk(self.mapping)
+        return list(dict.fromkeys(keys))
 
     def _convert(self, X, H, hmap=None, parent=None, level=0, color=None, lens="root", no_self_refrence=True):
         count = 0
@@ -48,3 +137,104 @@ class BaseOntologyTransform():
             count+=1
         return H
 
+
+class OntologyTemplate():
+    '''
+    Immutable, compiled form of an ontology. Nodes are kept in the order the
+    ontology adds them, edges as an array of (parent, child) node positions
+    and node attributes (such as the colors) are precomputed. The graph of
+    the ontology without values, :attr:`graph`, is built once and shared
+    read-only by every graph built from the template, which only holds the
+    values of its row.
+
+    :param G: Graph built from the ontology without any values
+    :type G: Graph
+    :param keys: Ids of the nodes whose value is read from the data
+    :type keys: list
+    '''
+
+    def __init__(self, G, keys):
+        self.ids = tuple(G.nodes)
+        index = {n: i for i, n in enumerate(self.ids)}
+        self.edges = np.array([(index[u], index[v]) for u, v in G.edges], dtype=np.int64).reshape(-1, 2)
+        self.parent = np.full(len(self.ids), -1, dtype=np.int64)
+        for u, v in self.edges[::-1]:
+            self.parent[v] = u
+        self.keys = tuple(keys)
+        self.value_index = np.array([index[k] for k in self.keys], dtype=np.int64)
+        self.attributes = tuple(copy_attributes({k: v for k, v in G.nodes[n].items() if k not in ("id", "value")})
+                                for n in self.ids)
+        self.edges.flags.writeable = False
+        self.parent.flags.writeable = False
+        self.value_index.flags.writeable = False
+        self.graph = Graph(id=getattr(G, "id", None))
+        self.graph.graph.update(copy_attributes(G.graph))
+        self.graph.add_nodes_from((n, {"id": n, "value": None, **copy_attributes(a)})
+                                  for n, a in zip(self.ids, self.attributes))
+        self.graph.add_edges_from((u, v, copy_attributes(d)) for u, v, d in G.edges(data=True))
+        # structure of the graphs built from the template, which share the
+        # index of its graph (see structural_index)
+        self.index = structural_index(self.graph)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def gather(self, X):
+        '''
+        Gathers the values of a row, aligned to :attr:`keys`. Keys missing
+        from the row get None.
+
+        :param X: Row of data, a mapping or a pandas Series
+        :type X: Any
+        :rtype: ndarray
+        '''
+        if hasattr(X, "index") and hasattr(X, "to_numpy"):
+            X = dict(zip(X.index, X.to_numpy()))
+        values = np.empty(len(self.keys), dtype=object)
+        for j, k in enumerate(self.keys):
+            values[j] = X[k] if k in X else None
+        return values
+
+    def gather_frame(self, df):
+        '''
+        Gathers the values of every row of a DataFrame, one row per row of df
+        and one column per key.
+
+        :param df: Data with one column per node of the ontology
+        :type df: DataFrame
+        :rtype: ndarray
+        '''
+        values = np.full((len(df), len(self.keys)), None, dtype=object)
+        for j, k in enumerate(self.keys):
+            if k in df.columns:
+                values[:, j] = df[k].to_numpy()
+        return values
+
+    def build(self, values=None, edges=None):
+        '''
+        Builds the graph of a row from its gathered values: an overlay over
+        :attr:`graph` holding only the values, so neither the structure nor
+        the node attributes are copied. Attributes of the template are read
+        through read-only views; use :meth:`GraphOverlay.update_node` to
+        change them, or :meth:`GraphOverlay.materialize` to get an
+        independent :class:`Graph`.
+
+        :param values: Values aligned to :attr:`keys`, defaults to no values
+        :type values: ndarray, optional
+        :param edges: Edges of the row that are not edges of the template, as (u, v, attributes) tuples, defaults to none. They are not checked.
+        :type edges: list, optional
+        :rtype: GraphOverlay
+        '''
+        nodes = None if values is None else self.delta(values)
+        return GraphOverlay.from_delta(self.graph, nodes=nodes, edges=edges)
+
+    def delta(self, values):
+        '''
+        Changes of the nodes of a row over :attr:`graph`: the values that are not None, by node id.
+
+        :param values: Values aligned to :attr:`keys`
+        :type values: ndarray
+        :rtype: dict[Any, dict]
+        '''
+        ids = self.ids
+        return {ids[i]: {"value": v} for i, v in zip(self.value_index.tolist(), values) if v is not None}
@@ -1,4 +1,6 @@
+import numpy as np
 import pandas as pd
+import pytest
 from .htg_transformers import (
     BaseOntologyTransform
 )
@@ -26,3 +28,65 @@ def testBaseOntologyTransform():
     assert g.is_dag() == True
     assert g.validate() == True
 
+
+def convert(transform, X):
+    from ..models.graph import Graph, Vertex
+    H = Graph()
+    H.add_vertex(Vertex(transform.lens))
+    return transform._convert(X, H, transform.mapping, parent=transform.lens, level=1)
+
+def assert_same_graph(a, b):
+    import numpy as np
+    assert list(a.edges) == list(b.edges)
+    assert list(a.nodes) == list(b.nodes)
+    for n in a.nodes:
+        x, y = a.nodes[n], b.nodes[n]
+        assert list(x.keys()) == list(y.keys())
+        assert x["value"] == y["value"] or repr(x["value"]) == repr(y["value"])
+        if "color" in x:
+            assert np.array_equal(x["color"], y["color"])
+
+def testCompiledOntologyTemplate():
+    mapping = {
+        "root": {"A": {"A_1": {}, "shared": {}}, "B": {"B_1": {"B_1_a": {}}, "shared": {}}},
+        "C": {},
+    }
+    transform = BaseOntologyTransform(mapping=mapping)
+    template = transform.compile()
+    assert template is transform.template
+    assert set(template.keys) == set(transform.keys())
+    assert template.parent[template.ids.index("A_1")] == template.ids.index("A")
+
+    df = pd.DataFrame({"A_1": [1.0, 2.5], "shared": [3, 4], "B_1_a": ["x", None], "root": [7, 8]})
+    graphs = transform.transform_many(df)
+    for i in range(len(df)):
+        expected = convert(transform, df.iloc[i])
+        assert_same_graph(transform.transform(df.iloc[i]), expected)
+        assert_same_graph(graphs[i], expected)
+    assert_same_graph(transform.transform({"A": 1}), convert(transform, {"A": 1}))
+    # graphs share the template graph read-only and only hold their values
+    assert all(g.base is template.graph for g in graphs)
+    color = graphs[0].nodes["A_1"]["color"]
+    with pytest.raises(ValueError):
+        color[3] = 0
+    graphs[0].update_node("A_1", color=np.zeros(4))
+    assert graphs[1].nodes["A_1"]["color"][3] != 0
+    assert template.graph.nodes["A_1"]["color"][3] != 0
+    assert graphs[1].materialize().nodes["A_1"]["value"] == 2.5
+
+    # the template is compiled again when the mapping, lens or decay rate
+    # are assigned, and by compile after the mapping changed in place
+    mapping["C"]["C_1"] = {}
+    assert transform.template is template
+    assert transform.compile() is not template
+    assert "C_1" in transform.transform({"C_1": 1}).nodes
+    template = transform.template
+    transform.mapping = dict(mapping)
+    assert transform.template is not template
+    template = transform.template
+    transform.lens = "top"
+    assert transform.template is not template
+    assert "top" in transform.transform({}).nodes
+    template = transform.template
+    transform.color_decay_rate = .5
+    assert transform.template is not template
@@ -4,16 +4,35 @@ import logging
 import numpy as np
 import itertools
 from typing import Optional
-import copy
 import numbers
+from scipy.spatial import cKDTree
+
+METHODS = ("pairwise", "sort", "kdtree")
 
 class SimpleChildLinker():
     '''
     A simple leaf-linker function is provided in the R-K Toolkit which can be used to build a specific R-K model based on the choice of lens and application. The simple leaf linker compares only the leafs of a graph tree, and provides an edge E in the case the euclidean distance is less than the specified threshold. Thus a Leaf Linker function compares the distances between values with ϵ < θ, and links the leafs of the final clusters based upon the set threshold.
+
+    The siblings within θ of each other can be found with one of three methods:
+
+        • pairwise: compares every pair of siblings, O(k²) per parent.
+        • sort: sorts the scalar sibling values once and sweeps a window of width θ, O(k log k + output) per parent. Produces exactly the same edges as pairwise.
+        • kdtree: queries a KD-tree of the sibling values, which may also be vectors (1-D arrays of equal length). Vector valued edges point from the lexicographically smaller value to the larger one.
+
+    :param theta: Distance threshold θ, defaults to 1
+    :type theta: float, optional
+    :param method: Method used to find the siblings within θ, defaults to "sort"
+    :type method: str, optional
     '''
 
-    def __init__(self, theta=1):
+    #: Number of values compared at once by the batch methods, bounding their memory
+    chunk_size = 1 << 20
+
+    def __init__(self, theta=1, method="sort"):
+        if method not in METHODS:
+            raise ValueError("Unknown linkage method {}".format(method))
         self.theta = theta
+        self.method = method
 
     def get_knobs(self):
         '''
@@ -56,25 +75,270 @@ class SimpleChildLinker():
 
     def link(self, G):
         '''
-        Links the nodes of the given Graph by creating a copy of the graph  and adding nodes to it based on criteria
+        Links the nodes of the given Graph by creating a copy on write overlay
+        of the graph and adding edges to it based on criteria. The given graph
+        is not modified.
 
         :param G: Graph to be linked.
         :type G: Graph
         :return: A linked graph with all child nodes linked.
-        :rtype: Graph
+        :rtype: GraphOverlay
         '''
-        gC = copy.deepcopy(G)
-        for n in G.nodes:
-            for p in itertools.combinations(G.get_children(n), 2):
-                if len(p) < 2:
-                    continue
-                if not self.check_valid_node(G.nodes[p[0]]) or not self.check_valid_node(G.nodes[p[1]]):
-                    continue
-                u_v, v_v = G.nodes[p[0]]["value"], G.nodes[p[1]]["value"]
-                d = np.linalg.norm(u_v - v_v)
-                if d < self.theta:
-                    fn = 0 if u_v < v_v else 1
-                    tn = 1 ^ fn
-                    gC.add_edge(Edge(u=p[fn], v=p[tn], attributes={"edge_distance": d}))
+        gC = G.overlay()
+        pairs = {"pairwise": self._pairwise, "sort": self._sorted, "kdtree": self._kdtree}[self.method]
+        nodes = G.nodes
+        for n in nodes:
+            children = G.get_children(n)
+            if len(children) < 2:
+                continue
+            # attributes of the children, read once per parent
+            attrs = [nodes[c] for c in children]
+            for u, v, d in pairs(children, attrs):
+                gC.add_edge(Edge(u=u, v=v, attributes={"edge_distance": d}))
         return gC
 
+    def _pairwise(self, children, attrs):
+        for (i, j) in itertools.combinations(range(len(children)), 2):
+            if not self.check_valid_node(attrs[i]) or not self.check_valid_node(attrs[j]):
+                continue
+            p = (children[i], children[j])
+            u_v, v_v = attrs[i]["value"], attrs[j]["value"]
+            d = np.linalg.norm(u_v - v_v)
+            if d < self.theta:
+                fn = 0 if u_v < v_v else 1
+                tn = 1 ^ fn
+                yield p[fn], p[tn], d
+
+    def _emit(self, children, attrs, a, b, less):
+        '''
+        Emits the candidate pairs (positions a < b in children) within theta,
+        in the order :meth:`_pairwise` would, with the same distances.
+        '''
+        order = np.lexsort((b, a))
+        for i, j in zip(a[order].tolist(), b[order].tolist()):
+            p = (children[i], children[j])
+            u_v, v_v = attrs[i]["value"], attrs[j]["value"]
+            # as floats, since numpy does not subtract bools
+            d = np.linalg.norm(np.asarray(u_v, dtype=np.float64) - np.asarray(v_v, dtype=np.float64))
+            if d < self.theta:
+                fn = 0 if less(u_v, v_v) else 1
+                yield p[fn], p[1 ^ fn], d
+
+    def _sorted(self, children, attrs):
+        if not self.theta > 0:
+            # no distance is below a non positive theta
+            return
+        pos = [i for i, a in enumerate(attrs) if self.check_valid_node(a)]
+        x = np.array([attrs[i]["value"] for i in pos], dtype=np.float64)
+        keep = ~np.isnan(x)
+        pos, x = np.array(pos, dtype=np.int64)[keep], x[keep]
+        if len(x) < 2:
+            return
+        order = np.argsort(x, kind="stable")
+        xs = x[order]
+        # widen the window by a few ulps so that rounding never drops a pair;
+        # candidates are checked against theta exactly when emitted
+        bound = xs + self.theta
+        bound = bound + np.abs(bound) * 1e-12 + np.finfo(np.float64).tiny
+        end = np.searchsorted(xs, bound, side="right")
+        counts = end - np.arange(len(xs)) - 1
+        first = np.repeat(np.arange(len(xs)), counts)
+        second = first + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        i, j = pos[order[first]], pos[order[second]]
+        yield from self._emit(children, attrs, np.minimum(i, j), np.maximum(i, j), lambda u, v: u < v)
+
+    def _kdtree(self, children, attrs):
+        if not self.theta > 0:
+            return
+        pos, points = [], []
+        for i, a in enumerate(attrs):
+            v = a.get("value")
+            if isinstance(v, numbers.Number) or (isinstance(v, (list, tuple, np.ndarray)) and np.ndim(v) == 1):
+                p = np.atleast_1d(np.asarray(v, dtype=np.float64))
+                if not np.isnan(p).any():
+                    pos.append(i)
+                    points.append(p)
+        if len(points) < 2 or len({len(p) for p in points}) > 1:
+            return
+        r = self.theta * (1 + 1e-9) + np.finfo(np.float64).tiny
+        pairs = cKDTree(np.array(points)).query_pairs(r=r, output_type="ndarray")
+        pos = np.array(pos, dtype=np.int64)
+        i, j = pos[pairs[:, 0]], pos[pairs[:, 1]]
+        less = lambda u, v: tuple(np.atleast_1d(u)) < tuple(np.atleast_1d(v))
+        yield from self._emit(children, attrs, np.minimum(i, j), np.maximum(i, j), less)
+
+    def sibling_groups(self, G):
+        '''
+        Returns the children of every parent with at least two children, in
+        the order :meth:`link` visits them, as positions in the node order of G.
+
+        :param G: Graph to be linked.
+        :type G: Graph
+        :return: One int array of child positions per parent
+        :rtype: list[ndarray]
+        '''
+        index = {n: i for i, n in enumerate(G.nodes)}
+        groups = []
+        for n in G.nodes:
+            children = G.get_children(n)
+            if len(children) > 1:
+                groups.append(np.array([index[c] for c in children], dtype=np.int64))
+        return groups
+
+    def sibling_pairs(self, G):
+        '''
+        Returns every pair of siblings compared by :meth:`link`, in the same
+        order, as positions in the node order of G.
+
+        :param G: Graph to be linked.
+        :type G: Graph
+        :return: Two int arrays with the positions of the first and second node of each pair
+        :rtype: tuple[ndarray, ndarray]
+        '''
+        a, b = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for children in self.sibling_groups(G):
+            for i, j in _pair_blocks(len(children), self.chunk_size):
+                a.append(children[i])
+                b.append(children[j])
+        return np.concatenate(a), np.concatenate(b)
+
+    def sibling_distances(self, G, values, valid):
+        '''
+        Returns every pair of siblings with a numeric value and their
+        distance, for many rows sharing the structure of G, before θ is
+        applied. Pairs are ordered by row and then as in :meth:`link`, and
+        point from the smaller value to the larger one.
+
+        Rows and the pairs of each parent are compared in blocks of about
+        :attr:`chunk_size` values, so only the result grows with the O(k²)
+        pairs of a parent with k children.
+
+        :param G: Structural graph shared by all rows.
+        :type G: Graph
+        :param values: Float matrix (rows x nodes) of node values aligned to the node order of G
+        :type values: ndarray
+        :param valid: Bool matrix (rows x nodes), True where the node value is a number
+        :type valid: ndarray
+        :return: Row, source position, target position and distance of every pair
+        :rtype: tuple[ndarray, ndarray, ndarray, ndarray]
+        '''
+        groups = self.sibling_groups(G)
+        out = []
+        for r0, r1 in _row_blocks(values, self.chunk_size):
+            x, ok = values[r0:r1], valid[r0:r1]
+            block = []
+            for children in groups:
+                for i, j in _pair_blocks(len(children), max(1, self.chunk_size // (r1 - r0))):
+                    a, b = children[i], children[j]
+                    va, vb = x[:, a], x[:, b]
+                    with np.errstate(invalid="ignore"):
+                        d = np.abs(va - vb)
+                        keep = ok[:, a] & ok[:, b] & ~np.isnan(d)
+                    rows, k = np.nonzero(keep)
+                    forward = va[rows, k] < vb[rows, k]
+                    block.append((rows + r0, np.where(forward, a[k], b[k]), np.where(forward, b[k], a[k]), d[rows, k]))
+            out.append(_by_row(block))
+        return _concat(out)
+
+    def link_batch(self, G, values, valid, raw=None):
+        '''
+        Links many rows sharing the structure of G at once. Equivalent to
+        calling :meth:`link` on a copy of G holding the values of every row,
+        but the siblings within θ are found as array operations.
+
+        The values of the siblings of every row are sorted and compared to
+        the values 1, 2, ... places further along, until no row has two
+        values within θ that far apart, as the sort method does row by row.
+        Rows are processed in blocks of about :attr:`chunk_size` values, so
+        memory does not grow with the O(k²) pairs of a parent with k children.
+
+        Only scalar values are linked. With the kdtree method, which links
+        vector values row by row, the raw values must be given so that
+        vectors raise rather than being left unlinked.
+
+        :param G: Structural graph shared by all rows.
+        :type G: Graph
+        :param values: Float matrix (rows x nodes) of node values aligned to the node order of G
+        :type values: ndarray
+        :param valid: Bool matrix (rows x nodes), True where the node value is a number
+        :type valid: ndarray
+        :param raw: Object matrix (rows x nodes) of the node values as given, defaults to None
+        :type raw: ndarray, optional
+        :raises ValueError: If the method is kdtree and raw holds vector values
+        :return: Row, source position, target position and edge distance of every linkage edge, ordered by row
+        :rtype: tuple[ndarray, ndarray, ndarray, ndarray]
+        '''
+        if self.method == "kdtree" and raw is not None:
+            if any(isinstance(v, (list, tuple, np.ndarray)) for v in raw[~valid]):
+                raise ValueError("link_batch only links scalar values, link the rows with vector values one by one")
+        if not self.theta > 0:
+            return _concat([])
+        # parents with the same number of children are stacked and sorted together
+        stacks = {}
+        for rank, children in enumerate(self.sibling_groups(G)):
+            stacks.setdefault(len(children), []).append((rank, children))
+        stacks = [(np.array([r for r, _ in s]), np.array([c for _, c in s])) for s in stacks.values()]
+        out = []
+        for r0, r1 in _row_blocks(values, self.chunk_size):
+            block = []
+            for ranks, children in stacks:
+                m, k = children.shape
+                x = values[r0:r1][:, children].reshape(-1, k)
+                # missing values sort last and are never within θ of another
+                x[~valid[r0:r1][:, children].reshape(-1, k) | np.isnan(x)] = np.inf
+                order = np.argsort(x, axis=1, kind="stable")
+                xs = np.take_along_axis(x, order, axis=1)
+                for s in range(1, k):
+                    with np.errstate(invalid="ignore"):
+                        d = xs[:, s:] - xs[:, :-s]
+                        hit = d < self.theta
+                    if not hit.any():
+                        # the sorted differences only grow with s
+                        break
+                    r, j = np.nonzero(hit)
+                    lo, hi = order[r, j], order[r, j + s]
+                    # equal values point from the later sibling, as in pairwise
+                    tie = xs[r, j] == xs[r, j + s]
+                    first, second = np.where(tie, np.maximum(lo, hi), lo), np.where(tie, np.minimum(lo, hi), hi)
+                    row, p = np.divmod(r, m)
+                    block.append((row + r0, ranks[p], np.minimum(lo, hi), np.maximum(lo, hi),
+                                  children[p, first], children[p, second], d[r, j]))
+            if block:
+                row, rank, a, b, u, v, d = (np.concatenate(c) for c in zip(*block))
+                order = np.lexsort((b, a, rank, row))
+                out.append((row[order], u[order], v[order], d[order]))
+        return _concat(out)
+
+def _row_blocks(values, size):
+    '''Splits the rows of values into blocks of about size values'''
+    n, width = values.shape
+    step = max(1, size // max(1, width))
+    return [(r, min(n, r + step)) for r in range(0, n, step)]
+
+def _pair_blocks(k, size):
+    '''
+    Yields the pairs (i < j) of k positions in the order of
+    itertools.combinations, as two int arrays of about size pairs at a time.
+    '''
+    i = 0
+    while i < k - 1:
+        counts = np.arange(k - 1 - i, 0, -1)
+        stop = max(1, int(np.searchsorted(np.cumsum(counts), size, side="right")))
+        counts = counts[:stop]
+        first = np.repeat(np.arange(i, i + stop), counts)
+        second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(counts) - counts, counts)
+        yield first, second
+        i += stop
+
+def _by_row(blocks):
+    '''Concatenates blocks of (row, u, v, d) arrays, stably ordered by row'''
+    if not blocks:
+        return _concat([])
+    rows, u, v, d = (np.concatenate(c) for c in zip(*blocks))
+    order = np.argsort(rows, kind="stable")
+    return rows[order], u[order], v[order], d[order]
+
+def _concat(blocks):
+    '''Concatenates blocks of (row, u, v, d) arrays'''
+    empty = [(np.empty(0, dtype=np.int64),) * 3 + (np.empty(0, dtype=np.float64),)]
+    return tuple(np.concatenate(c) for c in zip(*(empty + list(blocks))))
@@ -42,3 +42,99 @@ def testSimpleChildLinker():
 
     assert linker.get_knobs().get("theta", None) == .1
 
+
+def build_wide_graph(n=200, seed=0, values=None):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    g = Graph()
+    g.add_vertex(Vertex('root'))
+    for p in ['a', 'b']:
+        g.add_vertex(Vertex(p))
+        g.add_edge(Edge('root', p))
+        for i in range(n):
+            c = '{}_{}'.format(p, i)
+            v = values(rng) if values else float(rng.integers(0, 50)) / 4
+            if i % 17 == 0:
+                v = None
+            g.add_vertex(Vertex(c, value=v))
+            g.add_edge(Edge(p, c))
+    return g
+
+def testSortedLinkerMatchesPairwise():
+    g = build_wide_graph()
+    for theta in [-1, 0, .25, .3, 1, 5]:
+        expected = SimpleChildLinker(theta, method="pairwise").link(g)
+        for method in ["sort", "kdtree"]:
+            linked = SimpleChildLinker(theta, method=method).link(g)
+            assert list(linked.edges.items()) == list(expected.edges.items()), (method, theta)
+
+def testLinkerBoolValues():
+    import numpy as np
+    g = build_wide_graph(40, values=lambda rng: bool(rng.integers(0, 2)))
+    for theta in [.5, 1, 2]:
+        expected = SimpleChildLinker(theta, method="pairwise").link(g)
+        assert any(d.get("edge_distance") == 1 for d in expected.edges.values()) == (theta > 1)
+        for method in ["sort", "kdtree"]:
+            linked = SimpleChildLinker(theta, method=method).link(g)
+            assert list(linked.edges.items()) == list(expected.edges.items()), (method, theta)
+
+    # numpy bools, as read from a bool column, are linked as by pairwise
+    h = build_wide_graph(40, values=lambda rng: np.bool_(rng.integers(0, 2)))
+    expected = SimpleChildLinker(2, method="pairwise").link(h)
+    for method in ["sort", "kdtree"]:
+        assert list(SimpleChildLinker(2, method=method).link(h).edges.items()) == list(expected.edges.items())
+
+def testKDTreeLinkerVectors():
+    import numpy as np
+    import pytest
+    g = build_wide_graph(30, values=lambda rng: rng.random(3))
+    linked = SimpleChildLinker(.3, method="kdtree").link(g)
+    added = [(e, d) for e, d in linked.edges.items() if not g.has_edge(*e)]
+    assert len(added) > 0
+    for (u, v), d in added:
+        uv, vv = g.nodes[u]["value"], g.nodes[v]["value"]
+        assert d["edge_distance"] == pytest.approx(np.linalg.norm(uv - vv))
+        assert d["edge_distance"] < .3
+        assert tuple(uv) < tuple(vv)
+
+    with pytest.raises(ValueError):
+        SimpleChildLinker(method="bad")
+
+def testLinkBatch():
+    import numpy as np
+    import pytest
+    g = build_wide_graph(60)
+    ids = list(g.nodes)
+    rng = np.random.default_rng(1)
+    values = np.floor(rng.random((25, len(ids))) * 40) / 8
+    valid = rng.random(values.shape) > .1
+    values[::7, 3] = np.nan
+    linker = SimpleChildLinker(.3)
+    linked = linker.link_batch(g, values, valid)
+    distances = linker.sibling_distances(g, values, valid)
+    for i in range(len(values)):
+        h = g.copy()
+        for j, n in enumerate(ids):
+            h.nodes[n]["value"] = values[i, j] if valid[i, j] else None
+        expected = [(ids.index(u), ids.index(v), d["edge_distance"])
+                    for (u, v), d in SimpleChildLinker(.3, method="pairwise").link(h).edges.items() if not g.has_edge(u, v)]
+        rows = linked[0] == i
+        assert list(zip(linked[1][rows].tolist(), linked[2][rows].tolist(), linked[3][rows].tolist())) == expected
+        rows = (distances[0] == i) & (distances[3] < .3)
+        assert list(zip(distances[1][rows].tolist(), distances[2][rows].tolist(), distances[3][rows].tolist())) == expected
+
+    # blocks of a few values give the same edges in bounded memory
+    small = SimpleChildLinker(.3)
+    small.chunk_size = 50
+    for a, b in zip(small.link_batch(g, values, valid), linked):
+        assert a.tolist() == b.tolist()
+    for a, b in zip(small.sibling_distances(g, values, valid), distances):
+        assert a.tolist() == b.tolist()
+    assert len(small.sibling_pairs(g)[0]) == 1 + 2 * 60 * 59 // 2
+
+    # vectors are linked by kdtree row by row, so the batch refuses them
+    raw = np.full(values.shape, None, dtype=object)
+    raw[0, 3] = np.zeros(2)
+    with pytest.raises(ValueError):
+        SimpleChildLinker(.3, method="kdtree").link_batch(g, values, valid & False, raw=raw)
+    assert len(SimpleChildLinker(.3).link_batch(g, values, valid & False, raw=raw)[0]) == 0
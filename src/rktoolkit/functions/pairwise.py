@@ -0,0 +1,210 @@
+import numbers
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy.sparse import csr_matrix
+from ..models.compact import CompactGraph
+from .bitset import Vocabulary
+
+METHODS = ("node", "edge", "topological", "value", "weighted")
+
+class GraphEncoding():
+    '''
+    Encodes a collection of graphs once over a shared vocabulary of node ids
+    and edge keys. Every graph becomes a sparse indicator row for its nodes, a
+    sparse indicator row for its edges and a sparse row of node values, so set
+    intersections between all pairs of graphs become sparse matrix products.
+
+    :param graphs: Graphs, compact graphs or RK models to be encoded
+    :type graphs: list
+    :param key: Node attribute used for value distances, defaults to "value"
+    :type key: str, optional
+    :param fillValue: Value used for missing node values, defaults to 0
+    :type fillValue: float, optional
+    '''
+
+    def __init__(self, graphs, key="value", fillValue=0):
+        self.node_vocab = Vocabulary()
+        self.edge_vocab = Vocabulary()
+        nrows, erows, vrows = [], [], []
+        for g in graphs:
+            g = _as_graph(g)
+            nodes, edges = graph_keys(g)
+            nrows.append(np.array([self.node_vocab.add(n) for n in nodes], dtype=np.int64))
+            erows.append(np.array([self.edge_vocab.add(e) for e in edges], dtype=np.int64))
+            vd = g.get_value_dict(key=key)
+            vrows.append(np.array([_as_float(vd[n], fillValue) for n in nodes], dtype=np.float64))
+        self.nodes = _indicator(nrows, len(self.node_vocab))
+        self.edges = _indicator(erows, len(self.edge_vocab))
+        self.values = _indicator(nrows, len(self.node_vocab), vrows)
+        self._sizes()
+
+    def _sizes(self):
+        self.node_sizes = np.asarray(self.nodes.sum(axis=1)).ravel()
+        self.edge_sizes = np.asarray(self.edges.sum(axis=1)).ravel()
+
+    def __len__(self):
+        return self.nodes.shape[0]
+
+    def split(self, n):
+        '''
+        Splits the encoding into the first n graphs and the rest. Both parts
+        share the same vocabulary.
+
+        :rtype: tuple[GraphEncoding, GraphEncoding]
+        '''
+        parts = []
+        for rows in (slice(0, n), slice(n, None)):
+            part = GraphEncoding.__new__(GraphEncoding)
+            part.node_vocab, part.edge_vocab = self.node_vocab, self.edge_vocab
+            part.nodes, part.edges, part.values = self.nodes[rows], self.edges[rows], self.values[rows]
+            part._sizes()
+            parts.append(part)
+        return tuple(parts)
+
+def _as_graph(m):
+    if isinstance(m, CompactGraph) or hasattr(m, "nodes"):
+        return m
+    return m.get()
+
+def graph_keys(g):
+    '''
+    Returns the node ids and edge keys of a graph, compact graph or RK model.
+
+    :param g: Graph to get the keys from
+    :type g: Graph
+    :return: Node ids and edge (u, v) tuples
+    :rtype: tuple[list, list]
+    '''
+    g = _as_graph(g)
+    if isinstance(g, CompactGraph):
+        return g.ids, g.edge_keys()
+    return list(g.nodes), list(g.edges)
+
+def _as_float(v, fillValue):
+    if isinstance(v, numbers.Real) and not isinstance(v, bool) and not np.isnan(v):
+        return v
+    return fillValue
+
+def _indicator(rows, width, data=None):
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in rows], out=indptr[1:])
+    indices = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    if data is None:
+        data = np.ones(len(indices), dtype=np.float64)
+    else:
+        data = np.concatenate(data) if data else np.empty(0, dtype=np.float64)
+    return csr_matrix((data, indices, indptr), shape=(len(rows), width))
+
+def _jaccard_block(A, B, sa, sb):
+    inter = (A @ B.T).toarray()
+    union = sa[:, None] + sb[None, :] - inter
+    with np.errstate(invalid="ignore", divide="ignore"):
+        d = 1 - inter / union
+    d[union == 0] = 0
+    return d
+
+def _cosine_block(VA, PA, VB, PB):
+    dot = (VA @ VB.T).toarray()
+    na = np.sqrt((VA.multiply(VA) @ PB.T).toarray())
+    nb = np.sqrt((PA @ VB.multiply(VB).T).toarray())
+    norm = na * nb
+    norm[norm == 0] = np.inf
+    return 1 - dot / norm
+
+def _block(X, Y, i0, i1, method, weights):
+    rows = slice(i0, i1)
+    out = 0
+    if method in ("node", "topological", "weighted"):
+        nd = _jaccard_block(X.nodes[rows], Y.nodes, X.node_sizes[rows], Y.node_sizes)
+    if method in ("edge", "topological", "weighted"):
+        ed = _jaccard_block(X.edges[rows], Y.edges, X.edge_sizes[rows], Y.edge_sizes)
+    if method == "node":
+        return nd
+    if method == "edge":
+        return ed
+    if method in ("topological", "weighted"):
+        out = (ed * weights[0] + nd * weights[1]) / 2
+    if method == "topological":
+        return out
+    vd = _cosine_block(X.values[rows], X.nodes[rows], Y.values, Y.nodes)
+    if method == "value":
+        return vd
+    return (vd + out) / 2
+
+def pairwise_distances(models, Y=None, method="topological", weights=[.5, .5], n_jobs=1,
+                       condensed=False, key="value", fillValue=0, block_size=1024):
+    '''
+    Computes the distance between every pair of graphs in one pass. Each
+    graph is encoded once over a shared node and edge vocabulary (see
+    :class:`GraphEncoding`) and the Jaccard and cosine distances are computed
+    with blocked sparse matrix products, instead of rebuilding python sets for
+    every pair.
+
+    The methods match the pairwise methods of :class:`Graph`:
+
+        • node: :meth:`Graph.node_distance`
+        • edge: :meth:`Graph.edge_distance`
+        • topological: :meth:`Graph.topological_distance`
+        • value: :meth:`Graph.value_distance`
+        • weighted: :meth:`Graph.weighted_distance`
+
+    :param models: Graphs, compact graphs or RK models. RK models are compared through :meth:`RKModel.get`.
+    :type models: list
+    :param Y: Second collection. If given, returns the len(models) x len(Y) cross distances, defaults to None
+    :type Y: list, optional
+    :param method: Distance to compute, defaults to "topological"
+    :type method: str, optional
+    :param weights: Weights of the edge and node distances, defaults to [.5,.5]
+    :type weights: list, optional
+    :param n_jobs: Number of threads computing row blocks, defaults to 1
+    :type n_jobs: int, optional
+    :param condensed: Return the condensed upper triangle (as scipy's pdist) instead of the square matrix, defaults to False
+    :type condensed: bool, optional
+    :param key: Node attribute used for value distances, defaults to "value"
+    :type key: str, optional
+    :param fillValue: Value used for missing node values, defaults to 0
+    :type fillValue: float, optional
+    :param block_size: Number of rows computed at once, defaults to 1024
+    :type block_size: int, optional
+    :raises ValueError: Raises ValueError when an unknown method is selected
+    :return: Distance matrix
+    :rtype: ndarray
+    '''
+    if method not in METHODS:
+        raise ValueError("Unknown method to compute distances")
+    if condensed and Y is not None:
+        raise ValueError("Condensed output is only available without Y")
+
+    if Y is None:
+        X = Y = GraphEncoding(models, key=key, fillValue=fillValue)
+    else:
+        models = list(models)
+        X, Y = GraphEncoding(models + list(Y), key=key, fillValue=fillValue).split(len(models))
+
+    n, m = len(X), len(Y)
+    blocks = [(i, min(i + block_size, n)) for i in range(0, n, block_size)]
+    if condensed:
+        out = np.zeros(n * (n - 1) // 2, dtype=np.float64)
+    else:
+        out = np.zeros((n, m), dtype=np.float64)
+
+    def run(b):
+        i0, i1 = b
+        d = _block(X, Y, i0, i1, method, weights)
+        if not condensed:
+            out[i0:i1] = d
+            return
+        for i in range(i0, i1):
+            start = i * n - i * (i + 1) // 2
+            out[start:start + n - i - 1] = d[i - i0, i + 1:]
+
+    if n_jobs == 1 or len(blocks) == 1:
+        for b in blocks:
+            run(b)
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs if n_jobs > 0 else None) as pool:
+            list(pool.map(run, blocks))
+
+    if Y is X and not condensed:
+        np.fill_diagonal(out, 0)
+    return out
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from scipy.spatial.distance import squareform
+from .pairwise import pairwise_distances
+from ..models.graph import Graph, Vertex, Edge
+from ..models.compact import CompactGraph
+
+def build_graphs(n=6, seed=0):
+    rng = np.random.default_rng(seed)
+    graphs = []
+    for i in range(n):
+        g = Graph(id=i)
+        g.add_vertex(Vertex("root"))
+        for c in ["a", "b", "c", "d", "e"]:
+            if rng.random() < .8:
+                g.add_vertex(Vertex(c, value=float(rng.integers(0, 5))))
+                g.add_edge(Edge("root", c))
+        kids = [c for c in g.nodes if c != "root"]
+        for u, v in zip(kids, kids[1:]):
+            if rng.random() < .5:
+                g.add_edge(Edge(u, v))
+        graphs.append(g)
+    return graphs
+
+def test_pairwise_matches_graph_methods():
+    graphs = build_graphs()
+    expected = {
+        "node": lambda a, b: a.node_distance(b),
+        "edge": lambda a, b: a.edge_distance(b),
+        "topological": lambda a, b: a.topological_distance(b),
+        "value": lambda a, b: a.value_distance(b)[0][0],
+        "weighted": lambda a, b: a.weighted_distance(b)[0],
+    }
+    for method, f in expected.items():
+        D = pairwise_distances(graphs, method=method, block_size=4)
+        for i, a in enumerate(graphs):
+            for j, b in enumerate(graphs):
+                if i != j:
+                    assert D[i, j] == pytest.approx(f(a, b)), method
+
+def test_pairwise_condensed_and_cross():
+    graphs = build_graphs(7, seed=1)
+    D = pairwise_distances(graphs, n_jobs=2, block_size=2)
+    assert np.allclose(D, D.T)
+    assert np.allclose(squareform(pairwise_distances(graphs, condensed=True, block_size=3)), D)
+
+    compact = [CompactGraph.from_graph(g) for g in graphs[:2]]
+    C = pairwise_distances(graphs, Y=compact, method="weighted")
+    assert C.shape == (7, 2)
+    assert np.allclose(C, pairwise_distances(graphs, method="weighted")[:, :2])
+
+    with pytest.raises(ValueError):
+        pairwise_distances(graphs, method="unknown")
@@ -0,0 +1,272 @@
+import hashlib
+import heapq
+import json
+import numpy as np
+from ..functions.bitset import Vocabulary, bitset_jaccard_one_to_many
+from ..functions.pairwise import graph_keys
+
+_PRIME = np.uint64(4294967311) # smallest prime above 2**32
+_EMPTY = np.iinfo(np.uint64).max
+
+def _plain(item):
+    '''Converts numpy scalars, in items and tuples, to the python value they are equal to'''
+    if isinstance(item, np.generic):
+        return item.item()
+    if isinstance(item, tuple):
+        return tuple(_plain(i) for i in item)
+    return item
+
+def _item_hash(item):
+    '''Stable 32 bit hash of a node id or edge key, independent of PYTHONHASHSEED'''
+    return int.from_bytes(hashlib.blake2b(repr(_plain(item)).encode(), digest_size=4).digest(), "little")
+
+def _freeze(v):
+    '''Restores tuples after a json round trip'''
+    if isinstance(v, list):
+        return tuple(_freeze(i) for i in v)
+    return v
+
+class MinHash():
+    '''
+    A family of `num_perm` universal hash functions h(x) = (a * x + b) mod p.
+    The signature of a set is the minimum of every hash function over its
+    items. The probability that two signatures agree on a position equals the
+    Jaccard similarity of the two sets.
+
+    :param num_perm: Number of hash functions, defaults to 128
+    :type num_perm: int, optional
+    :param seed: Seed of the hash family, defaults to 1
+    :type seed: int, optional
+    '''
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.seed = seed
+        self.a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items):
+        '''
+        Computes the signature of a set
+
+        :param items: Hashable items of the set
+        :type items: iterable
+        :return: Signature of length num_perm
+        :rtype: ndarray
+        '''
+        x = np.fromiter((_item_hash(i) for i in items), dtype=np.uint64)
+        if x.size == 0:
+            return np.full(self.num_perm, _EMPTY, dtype=np.uint64)
+        return ((self.a[:, None] * x[None, :] + self.b[:, None]) % _PRIME).min(axis=1)
+
+class MinHashLSHIndex():
+    '''
+    Approximate nearest neighbour index over RK models. Every model is
+    summarised by a MinHash signature of its node set and one of its edge set
+    (the sets compared by :meth:`Graph.node_distance` and
+    :meth:`Graph.edge_distance`). Signatures are split into `bands` bands of
+    num_perm / bands rows, and models sharing any band of either signature
+    become candidates. Candidates are then re-ranked with the exact
+    topological distance, so a query touches only the buckets it hashes to
+    instead of scanning the whole archive.
+
+    The node and edge sets of the indexed models are kept as packed bitsets
+    over a :class:`Vocabulary` of the index, which grows as models are
+    inserted. Numpy scalars in node ids and edge keys are converted to the
+    python values they are equal to, so they hash and match the same.
+
+    With r rows per band, two sets with Jaccard similarity s become
+    candidates with probability 1 - (1 - s^r)^bands.
+
+    :param num_perm: Number of hash functions per signature, defaults to 128
+    :type num_perm: int, optional
+    :param bands: Number of LSH bands, must divide num_perm, defaults to 32
+    :type bands: int, optional
+    :param weights: Weights of the edge and node distances used to re-rank, defaults to [.5,.5]
+    :type weights: list, optional
+    :param seed: Seed of the hash family, defaults to 1
+    :type seed: int, optional
+    '''
+
+    def __init__(self, num_perm=128, bands=32, weights=[.5, .5], seed=1):
+        if num_perm % bands != 0:
+            raise ValueError("bands must divide num_perm")
+        self.minhash = MinHash(num_perm=num_perm, seed=seed)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.weights = list(weights)
+        self.vocabularies = (Vocabulary(), Vocabulary()) # nodes, edges
+        self._entries = {} # key -> (node bits, edge bits, node signature, edge signature)
+        self._buckets = ({}, {}) # per kind: (band, band hash) -> set of keys
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        return list(self._entries.keys())
+
+    def _bands(self, sig):
+        for i in range(self.bands):
+            yield (i, sig[i * self.rows:(i + 1) * self.rows].tobytes())
+
+    def _sketch(self, model, add=False):
+        '''
+        Encodes the node and edge sets of a model with the vocabularies of the
+        index, as (bits, items outside the vocabularies) pairs, with their
+        signatures. Items are added to the vocabularies when add is set.
+        '''
+        sets, signatures = [], []
+        for vocab, items in zip(self.vocabularies, graph_keys(model)):
+            items = {_plain(i) for i in items}
+            if add:
+                for i in items:
+                    vocab.add(i)
+            sets.append(vocab.encode(items))
+            signatures.append(self.minhash.signature(items))
+        return sets[0], sets[1], signatures[0], signatures[1]
+
+    def _add(self, key, entry):
+        self._entries[key] = entry
+        for kind in (0, 1):
+            for band in self._bands(entry[2 + kind]):
+                self._buckets[kind].setdefault(band, set()).add(key)
+
+    def insert(self, model, key=None):
+        '''
+        Inserts a model into the index, replacing any model with the same key.
+
+        :param model: Graph, compact graph or RK model to be indexed
+        :type model: Graph
+        :param key: Key of the model, defaults to the id of the model
+        :type key: Any, optional
+        :raises ValueError: Raises ValueError if no key is given and the model has no id
+        '''
+        if key is None:
+            key = getattr(model, "id", None)
+        if key is None:
+            raise ValueError("Model has no id. Please provide a key")
+        if key in self._entries:
+            self.remove(key)
+        nodes, edges, nsig, esig = self._sketch(model, add=True)
+        self._add(key, (nodes[0], edges[0], nsig, esig))
+
+    def remove(self, key):
+        '''
+        Removes a model from the index.
+
+        :param key: Key of the model
+        :type key: Any
+        :raises KeyError: Raises KeyError if the key is not indexed
+        '''
+        entry = self._entries.pop(key)
+        for kind in (0, 1):
+            for band in self._bands(entry[2 + kind]):
+                bucket = self._buckets[kind][band]
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[kind][band]
+
+    def candidates(self, model):
+        '''
+        Returns the keys of all models sharing at least one band with the given model.
+
+        :param model: Query model
+        :type model: Graph
+        :rtype: set
+        '''
+        return self._candidates(self._sketch(model))
+
+    def _candidates(self, sketch):
+        found = set()
+        for kind in (0, 1):
+            for band in self._bands(sketch[2 + kind]):
+                found |= self._buckets[kind].get(band, set())
+        return found
+
+    def _stack(self, kind, keys):
+        words = np.zeros((len(keys), self.vocabularies[kind].width), dtype=np.uint64)
+        for r, k in enumerate(keys):
+            w = self._entries[k][kind]
+            words[r, :len(w)] = w
+        return words, [frozenset()] * len(keys)
+
+    def distances(self, sketch, keys):
+        '''
+        Exact topological distances, as :meth:`Graph.topological_distance`,
+        between a sketch and indexed models.
+
+        :param sketch: Sketch of the query
+        :param keys: Keys of the indexed models
+        :type keys: list
+        :rtype: ndarray
+        '''
+        ed = bitset_jaccard_one_to_many(sketch[1], self._stack(1, keys))
+        nd = bitset_jaccard_one_to_many(sketch[0], self._stack(0, keys))
+        return (ed * self.weights[0] + nd * self.weights[1]) / 2
+
+    def query(self, model, k=50):
+        '''
+        Finds the k most similar indexed models.
+
+        :param model: Query model
+        :type model: Graph
+        :param k: Number of neighbours to return, defaults to 50
+        :type k: int, optional
+        :return: (key, distance) pairs sorted by increasing exact topological distance
+        :rtype: list[tuple]
+        '''
+        sketch = self._sketch(model)
+        keys = list(self._candidates(sketch))
+        scored = zip(self.distances(sketch, keys).tolist(), keys)
+        return [(c, d) for d, c in heapq.nsmallest(k, scored, key=lambda x: x[0])]
+
+    def save(self, path):
+        '''
+        Persists the index to a .npz file. Node ids and edge keys are stored
+        as JSON, so they must be JSON serializable.
+
+        :param path: Path of the file
+        :type path: str
+        '''
+        keys = list(self._entries.keys())
+        entries = [self._entries[k] for k in keys]
+        width = self.minhash.num_perm
+        meta = {
+            "num_perm": width,
+            "bands": self.bands,
+            "weights": self.weights,
+            "seed": self.minhash.seed,
+            "keys": keys,
+            "nodes": self.vocabularies[0].items,
+            "edges": [list(e) for e in self.vocabularies[1].items],
+        }
+        np.savez(path, meta=np.array(json.dumps(meta)),
+                 node_bits=self._stack(0, keys)[0], edge_bits=self._stack(1, keys)[0],
+                 node_signatures=np.array([e[2] for e in entries], dtype=np.uint64).reshape(-1, width),
+                 edge_signatures=np.array([e[3] for e in entries], dtype=np.uint64).reshape(-1, width))
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Loads an index persisted with :meth:`save`.
+
+        :param path: Path of the file
+        :type path: str
+        :rtype: MinHashLSHIndex
+        '''
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            nbits, ebits = data["node_bits"], data["edge_bits"]
+            nsigs, esigs = data["node_signatures"], data["edge_signatures"]
+        index = cls(num_perm=meta["num_perm"], bands=meta["bands"],
+                    weights=meta["weights"], seed=meta["seed"])
+        for vocab, items in zip(index.vocabularies, (meta["nodes"], meta["edges"])):
+            for i in items:
+                vocab.add(_freeze(i))
+        for i, key in enumerate(meta["keys"]):
+            index._add(_freeze(key), (nbits[i], ebits[i], nsigs[i], esigs[i]))
+        return index
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from .minhash import MinHash, MinHashLSHIndex
+from ..functions.distance import jaccard
+from ..models.graph import Graph, Vertex, Edge
+
+def build_graph(i, n=40, drop=()):
+    g = Graph(id=i)
+    g.add_vertex(Vertex("root"))
+    for c in range(n):
+        if c in drop:
+            continue
+        g.add_vertex(Vertex("n{}".format(c)))
+        g.add_edge(Edge("root", "n{}".format(c)))
+    return g
+
+def test_minhash_estimates_jaccard():
+    mh = MinHash(num_perm=256)
+    a, b = set(range(100)), set(range(50, 150))
+    est = np.mean(mh.signature(a) == mh.signature(b))
+    assert abs(est - (1 - jaccard(a, b))) < .1
+    assert np.array_equal(mh.signature(a), MinHash(num_perm=256).signature(a))
+
+def test_lsh_index_query():
+    index = MinHashLSHIndex(num_perm=64, bands=16)
+    base = build_graph("base")
+    index.insert(build_graph("same"))
+    index.insert(build_graph("near", drop=(1, 2)))
+    index.insert(build_graph("far", n=80, drop=range(40)))
+    assert len(index) == 3
+
+    result = index.query(base, k=2)
+    assert [k for k, _ in result] == ["same", "near"]
+    assert result[0][1] == 0
+    assert result[1][1] == pytest.approx(base.topological_distance(build_graph("near", drop=(1, 2))))
+    assert "far" not in index.candidates(base)
+
+    index.remove("same")
+    assert "same" not in index
+    assert index.query(base, k=1)[0][0] == "near"
+    with pytest.raises(KeyError):
+        index.remove("same")
+
+def test_lsh_index_persistence(tmp_path):
+    index = MinHashLSHIndex(num_perm=32, bands=8)
+    for i in range(5):
+        index.insert(build_graph(i, drop=range(i)))
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = MinHashLSHIndex.load(path)
+    assert sorted(loaded.keys()) == sorted(index.keys())
+    q = build_graph("q")
+    assert loaded.query(q, k=3) == index.query(q, k=3)
+    loaded.insert(build_graph(5, drop=range(5)))
+    assert len(loaded) == 6
+
+def test_lsh_index_numpy_keys():
+    index = MinHashLSHIndex(num_perm=32, bands=8)
+    g = Graph(id="np")
+    g.add_vertex(Vertex(np.str_("root")))
+    for c in range(10):
+        g.add_vertex(Vertex(np.str_("n{}".format(c))))
+        g.add_edge(Edge(np.str_("root"), np.str_("n{}".format(c))))
+    index.insert(g)
+    result = index.query(build_graph("q", n=10), k=1)
+    assert result == [("np", 0)]
+    assert len(index.vocabularies[0]) == 11
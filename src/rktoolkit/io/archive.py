@@ -0,0 +1,198 @@
+import collections
+import mmap
+import warnings
+import weakref
+from .io import RKModelReader
+from .columnar import MAGIC, GRAPH_FRAME, _FRAME, decode_chunk, decode_graph, load_index, model_key
+from ..functions.htg_transformers import OntologyTemplate
+
+class ModelArchive(RKModelReader):
+    '''
+    Random access reader of a columnar store written by
+    :class:`ColumnarModelWriter`. The file is memory mapped and only the
+    structural graph and the :class:`StoreIndex` are read when the archive
+    is opened; the index arrays are views of the map. A model is decoded when
+    it is accessed, from zero-copy views of its chunk, so only the pages of
+    the chunks that are touched become resident. Decoded chunks are kept in
+    a small LRU cache. As with :class:`ColumnarModelReader`, the graph, mask
+    and edges of a model are only built when they are accessed, as overlays
+    over the stored structural graph whose values and linkage edges are
+    decoded when they are read.
+
+    The archive is a sequence of models in write order, models are also
+    found by key (their id, or the id of their graph if they have none), and
+    :meth:`next` / :meth:`readAll` read from a cursor as the other readers.
+
+    :param path: Path of the file
+    :type path: str
+    :param cache_size: Number of decoded chunks kept, defaults to 16
+    :type cache_size: int, optional
+    :raises ValueError: Raises ValueError if the file is not a columnar store
+    '''
+
+    def __init__(self, path, cache_size=16):
+        self.path = path
+        self.cache_size = cache_size
+        self.index = None
+        self._chunks = collections.OrderedDict()
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            self._file.close()
+            raise ValueError("{} is not a columnar RK model store".format(path))
+        self._map_ref = weakref.ref(self._mmap)
+        self._buffer = memoryview(self._mmap)
+        if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ValueError("{} is not a columnar RK model store".format(path))
+        self.G = None
+        self.template = None
+        if len(self._buffer) >= len(MAGIC) + _FRAME.size:
+            kind, _ = _FRAME.unpack_from(self._buffer, len(MAGIC))
+            if kind != GRAPH_FRAME:
+                self.close()
+                raise ValueError("{} does not start with a graph frame".format(path))
+            self.G = decode_graph(self._frame(len(MAGIC)))
+            self.template = OntologyTemplate(self.G, list(self.G.nodes))
+        self.index, _ = load_index(self._buffer)
+        self._cursor = 0
+
+    def _frame(self, offset):
+        _, length = _FRAME.unpack_from(self._buffer, offset)
+        start = offset + _FRAME.size
+        return self._buffer[start:start + length]
+
+    def chunk(self, c):
+        '''
+        Returns a chunk of the archive.
+
+        :param c: Position of the chunk
+        :type c: int
+        :rtype: ModelChunk
+        '''
+        chunk = self._chunks.get(c)
+        if chunk is None:
+            offset = int(self.index.chunk_offsets[c])
+            kind, _ = _FRAME.unpack_from(self._buffer, offset)
+            chunk = decode_chunk(self.template, kind, self._frame(offset))
+            self._chunks[c] = chunk
+            if len(self._chunks) > self.cache_size:
+                self._chunks.popitem(last=False)
+        else:
+            self._chunks.move_to_end(c)
+        return chunk
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("archive index out of range")
+        c, row = self.index.locate(i)
+        return self.chunk(c)[row]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def position(self, key):
+        '''
+        Returns the position of the first model with a key.
+
+        :param key: Id of the model, or of its graph if the model has no id
+        :type key: Any
+        :raises KeyError: Raises KeyError if no model has the key
+        :rtype: int
+        '''
+        for i in self.index.positions(key).tolist():
+            c, row = self.index.locate(i)
+            chunk = self.chunk(c)
+            if model_key(chunk.ids[row], chunk.graph_ids[row]) == key:
+                return i
+        raise KeyError(key)
+
+    def get(self, key):
+        '''
+        Returns the first model with a key. See :meth:`position`.
+
+        :rtype: RKModel
+        '''
+        return self[self.position(key)]
+
+    def seek(self, i):
+        '''
+        Moves the cursor of :meth:`next` to a position.
+
+        :param i: Position of the next model to be read
+        :type i: int
+        '''
+        self._cursor = max(0, min(i, len(self)))
+
+    def next(self):
+        '''
+        Reads the model at the cursor and moves the cursor forward.
+
+        :return: The model, or None once every model was read
+        :rtype: RKModel
+        '''
+        if self._cursor >= len(self):
+            return None
+        self._cursor += 1
+        return self[self._cursor - 1]
+
+    def read(self):
+        '''
+        Reads the model at the cursor. See :meth:`next`.
+
+        :rtype: RKModel
+        '''
+        return self.next()
+
+    def readAll(self):
+        '''
+        Reads every model from the cursor on. The models are decoded on access.
+
+        :rtype: list[RKModel]
+        '''
+        models = self[self._cursor:]
+        self._cursor = len(self)
+        return models
+
+    @property
+    def mapped(self):
+        '''Whether the file is still mapped, by the archive or by models read from it'''
+        m = self._map_ref()
+        return m is not None and not m.closed
+
+    def close(self):
+        '''
+        Closes the archive. If models read from it are still referenced, their
+        arrays are views of the map, so the map cannot be closed yet: a
+        ResourceWarning is issued and the map is closed when the last of
+        these models is freed. :attr:`mapped` tells whether it still is.
+        '''
+        if self._mmap is None:
+            return
+        self._chunks.clear()
+        self.index = None
+        self._buffer.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            warnings.warn("{} is still mapped by the models read from it, it is unmapped "
+                          "when they are freed".format(self.path), ResourceWarning, stacklevel=2)
+        # the map unmaps itself when its last view is freed
+        self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
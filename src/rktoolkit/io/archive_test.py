@@ -0,0 +1,65 @@
+import pytest
+from .io import RKModelReader
+from .archive import ModelArchive
+from .columnar import ColumnarModelReader, ColumnarModelWriter
+from .columnar_test import make_models
+from ..models.pipeline_test import assert_same_model
+
+def test_archive_random_access(tmp_path):
+    models = make_models(30)
+    path = str(tmp_path / "models.rkc")
+    with ColumnarModelWriter(path, chunk_size=4) as writer:
+        for m in models:
+            writer.write(m)
+
+    with ModelArchive(path, cache_size=2) as archive:
+        assert isinstance(archive, RKModelReader)
+        assert len(archive) == len(models)
+        assert_same_model(models[13], archive[13])
+        assert_same_model(models[-1], archive[-1])
+        assert [m.id for m in archive[5:11:2]] == [m.id for m in models[5:11:2]]
+        assert len(archive._chunks) == 2
+        with pytest.raises(IndexError):
+            archive[len(models)]
+
+        assert archive.position(("run", 17)) == 17
+        assert_same_model(models[17], archive.get(("run", 17)))
+        with pytest.raises(KeyError):
+            archive.get(("run", 99))
+
+        archive.seek(28)
+        assert archive.next().id == ("run", 28)
+        assert [m.id for m in archive.readAll()] == [("run", 29)]
+        assert archive.next() is None
+
+    # the streaming reader skips the index
+    with ColumnarModelReader(path) as reader:
+        assert len(reader.readAll()) == len(models)
+
+def test_archive_without_trailer_and_append(tmp_path):
+    models = make_models(20)
+    path = str(tmp_path / "models.rkc")
+    writer = ColumnarModelWriter(path, chunk_size=8)
+    for m in models[:10]:
+        writer.write(m)
+    writer.flush()
+    # a writer that was not closed left no index, the archive scans the chunks
+    with ModelArchive(path) as archive:
+        assert len(archive) == 10
+        assert archive.get(("run", 9)).id == ("run", 9)
+    writer.close()
+
+    with ColumnarModelWriter(path, chunk_size=8, append=True) as writer:
+        for m in models[10:]:
+            writer.write(m)
+    with pytest.warns(ResourceWarning):
+        with ModelArchive(path) as archive:
+            assert len(archive) == len(models)
+            assert [m.id for m in archive] == [m.id for m in models]
+            assert_same_model(models[15], archive.get(("run", 15)))
+            model = archive[3]
+    # models stay readable after the archive is closed, and keep it mapped
+    assert archive.mapped
+    assert_same_model(models[3], model)
+    del model
+    assert not archive.mapped
@@ -0,0 +1,121 @@
+import os
+import pickle
+import numpy as np
+import pytest
+from .io import RKModelReader, RKModelWriter
+from .columnar import ColumnarModelReader, ColumnarModelWriter, StoredOverlay
+from ..models.pipeline import RKPipeline
+from ..models.pipeline_test import make_frame, make_ontology, assert_same_model
+from ..models.graph import Graph, GraphOverlay, Vertex, Edge
+from ..models.rkmodel import RKModel
+from ..functions.filters import RangeFilter
+from ..functions.linkers import SimpleChildLinker
+
+def make_models(n=25, seed=2):
+    df = make_frame(n, seed=seed)
+    filters = {k: RangeFilter(min=.2, max=.9) for k in ["A", "A_2", "B_3"]}
+    pipeline = RKPipeline(filters, {"root": SimpleChildLinker(theta=.3)})
+    models = list(pipeline.transform_batch(df, make_ontology()))
+    for i, m in enumerate(models):
+        m.id = ("run", i)
+    return models
+
+def test_columnar_round_trip(tmp_path):
+    models = make_models()
+    path = str(tmp_path / "models.rkc")
+    with ColumnarModelWriter(path, chunk_size=7) as writer:
+        assert isinstance(writer, RKModelWriter)
+        for m in models:
+            assert writer.write(m)
+
+    with ColumnarModelReader(path) as reader:
+        assert isinstance(reader, RKModelReader)
+        first = reader.next()
+        assert first.id == ("run", 0)
+        assert_same_model(models[0], first)
+        rest = reader.readAll()
+        assert reader.next() is None
+    assert len(rest) == len(models) - 1
+    for m1, m2 in zip(models[1:], rest):
+        assert m1.id == m2.id
+        assert_same_model(m1, m2)
+        assert set(m1.get().edges) == set(m2.get().edges)
+
+    with ColumnarModelReader(path) as reader:
+        assert [m.id for m in reader] == [m.id for m in models]
+
+    restored = pickle.loads(pickle.dumps(rest[0]))
+    assert type(restored) is RKModel
+    assert_same_model(models[1], restored)
+    assert os.path.getsize(path) < len(pickle.dumps(models))
+
+def test_columnar_lazy_read(tmp_path):
+    models = make_models(10)
+    path = str(tmp_path / "models.rkc")
+    with ColumnarModelWriter(path, chunk_size=4) as writer:
+        for m in models:
+            writer.write(m)
+    with ColumnarModelReader(path) as reader:
+        rest = reader.readAll()
+    # readAll decodes no graph, mask or edges until they are accessed
+    assert all(m._G is None and m._mask is None and m._edges is None for m in rest)
+    assert_same_model(models[3], rest[3])
+    assert rest[3]._G is not None and rest[4]._G is None
+
+    # graphs and edges are overlays over the structural graph of the store,
+    # decoded from the chunk when read
+    m = rest[5]
+    G, edges = m.G, m.edges
+    assert isinstance(G, StoredOverlay) and G.base is edges._o.base is reader.template.graph
+    assert "_updates" not in vars(G) and "_added_edges" not in vars(edges._o)
+    assert_same_model(models[5], m)
+    assert "_updates" in vars(G) and "_added_edges" in vars(edges._o)
+    G.update_node("A_1", value=-1)
+    assert m.G.nodes["A_1"]["value"] == -1 and reader.template.graph.nodes["A_1"]["value"] is None
+    restored = pickle.loads(pickle.dumps(rest[7].edges._o))
+    assert type(restored) is GraphOverlay
+    assert dict(restored.edges.items()) == dict(models[7].edges.items())
+
+def test_columnar_append_and_values(tmp_path):
+    g = Graph(id="g")
+    g.add_vertex(Vertex("root", attributes={"color": np.array([1., 0., 0.])}))
+    for c in ("a", "b", "c"):
+        g.add_vertex(Vertex(c))
+        g.add_edge(Edge("root", c, attributes={"w": 2}))
+    values = [{"a": 1.5, "b": 3, "c": None}, {"a": np.float32(.5), "b": "x", "c": 2.}]
+    models = []
+    for i, vals in enumerate(values):
+        h = g.copy()
+        h.id = "g"
+        for k, v in vals.items():
+            h.nodes[k]["value"] = v
+        gC = h.overlay()
+        gC.add_edge(Edge("a", "b", attributes={"edge_distance": .25 * i}))
+        models.append(RKModel(h, ["c"] if i else [], gC.edges, id=i))
+
+    path = str(tmp_path / "models.rkc")
+    with ColumnarModelWriter(path) as writer:
+        writer.write(models[0])
+    with ColumnarModelWriter(path, append=True) as writer:
+        writer.write(models[1])
+        other = Graph()
+        other.add_vertex(Vertex("root"))
+        with pytest.raises(ValueError):
+            writer.write(RKModel(other, [], other.edges))
+
+    with ColumnarModelReader(path) as reader:
+        loaded = reader.readAll()
+    assert len(loaded) == 2
+    for m1, m2 in zip(models, loaded):
+        assert m2.G.id == "g"
+        assert_same_model(m1, m2)
+        for n in ("a", "b", "c"):
+            assert type(m1.G.nodes[n]["value"]) == type(m2.G.nodes[n]["value"])
+        assert np.array_equal(m2.G.nodes["root"]["color"], [1., 0., 0.])
+        assert m2.G.edges["root", "a"] == {"w": 2}
+
+def test_columnar_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a model store")
+    with pytest.raises(ValueError):
+        ColumnarModelReader(str(path))
@@ -0,0 +1,176 @@
+import numpy as np
+from .columnar import ColumnarModelWriter, StoredRKModel, StoredOverlay, DELTA_FRAME, pack_arrays
+
+# Kinds of the changed node values of a delta
+_FLOAT, _NONE, _OTHER = 0, 1, 2
+
+def _same_value(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b or (a != a and b != b)
+    return a is b
+
+def _same_distance(a, b):
+    return a == b or (a != a and b != b)
+
+class DeltaModelWriter(ColumnarModelWriter):
+    '''
+    Writes RK models to a columnar store as deltas, for archives of
+    consecutive models that differ in a few masked nodes, values and linkage
+    edges, such as the models of a time windowed run.
+
+    Every chunk starts with a keyframe, and a keyframe is written every
+    `keyframe_interval` models. A keyframe is a delta against the structural
+    graph: its masked nodes, its node values and its linkage edges. The
+    other models are deltas against the previous model: the nodes whose
+    mask flips (the XOR of the two mask bitsets), the node values that
+    change, and the linkage edges that are added (or change distance) and
+    removed. Decoding a model replays at most `keyframe_interval` deltas,
+    and reading models in order applies one delta per model.
+
+    The store is read by :class:`ColumnarModelReader` and
+    :class:`ModelArchive` as any columnar store. See
+    :class:`ColumnarModelWriter` for the other parameters.
+
+    :param keyframe_interval: Number of models between keyframes, 1 writes only keyframes, defaults to 64
+    :type keyframe_interval: int, optional
+    '''
+
+    def __init__(self, path, chunk_size=1024, append=False, keyframe_interval=64):
+        super().__init__(path, chunk_size=chunk_size, append=append)
+        self.keyframe_interval = keyframe_interval
+
+    def _encode_chunk(self, rows):
+        n = len(self._ids)
+        keyframes = []
+        flips, flip_offsets = [], [0]
+        value_pos, value_kind, value_new, value_offsets, extras = [], [], [], [0], []
+        added, added_d, added_offsets = [], [], [0]
+        removed, removed_offsets = [], [0]
+        for i, (_, _, mask_positions, values, links) in enumerate(rows):
+            mask = np.zeros(n, dtype=bool)
+            mask[mask_positions] = True
+            flat = iter(links)
+            links = {(u, v): d for u, v, d in zip(flat, flat, flat)}
+            if i % self.keyframe_interval == 0:
+                keyframes.append(i)
+                prev_mask, prev_values, prev_links = np.zeros(n, dtype=bool), [None] * n, {}
+            flips.extend(np.flatnonzero(mask ^ prev_mask).tolist())
+            for j, (v, p) in enumerate(zip(values, prev_values)):
+                if _same_value(v, p):
+                    continue
+                value_pos.append(j)
+                if isinstance(v, float):
+                    value_kind.append(_FLOAT)
+                    value_new.append(v)
+                else:
+                    value_kind.append(_NONE if v is None else _OTHER)
+                    value_new.append(np.nan)
+                    if v is not None:
+                        extras.append([i, j, v])
+            for e, d in links.items():
+                if e not in prev_links or not _same_distance(d, prev_links[e]):
+                    added.append(e)
+                    added_d.append(d)
+            removed.extend(e for e in prev_links if e not in links)
+            flip_offsets.append(len(flips))
+            value_offsets.append(len(value_pos))
+            added_offsets.append(len(added))
+            removed_offsets.append(len(removed))
+            prev_mask, prev_values, prev_links = mask, values, links
+        meta = {"count": len(rows), "ids": [r[0] for r in rows],
+                "graph_ids": [r[1] for r in rows], "extras": extras}
+        return DELTA_FRAME, pack_arrays(meta, {
+            "keyframes": np.array(keyframes, dtype=np.int64),
+            "flip_offsets": np.array(flip_offsets, dtype=np.int64),
+            "flips": np.array(flips, dtype=np.int32),
+            "value_offsets": np.array(value_offsets, dtype=np.int64),
+            "value_pos": np.array(value_pos, dtype=np.int32),
+            "value_kind": np.array(value_kind, dtype=np.uint8),
+            "value_new": np.array(value_new, dtype=np.float64),
+            "added_offsets": np.array(added_offsets, dtype=np.int64),
+            "added_uv": np.array(added, dtype=np.int32).reshape(-1, 2),
+            "added_d": np.array(added_d, dtype=np.float64),
+            "removed_offsets": np.array(removed_offsets, dtype=np.int64),
+            "removed_uv": np.array(removed, dtype=np.int32).reshape(-1, 2),
+        })
+
+class DeltaChunk():
+    '''
+    Chunk of deltas written by :class:`DeltaModelWriter`. A model is rebuilt
+    by replaying the deltas from the keyframe before it. The state of the
+    last model rebuilt is kept, so reading in order replays one delta per
+    model.
+
+    :param template: Template of the structural graph of the file
+    :type template: OntologyTemplate
+    :param meta: Header of the chunk
+    :type meta: dict
+    :param arrays: Arrays of the chunk
+    :type arrays: dict[str, ndarray]
+    '''
+
+    def __init__(self, template, meta, arrays):
+        self.template = template
+        self.ids = meta["ids"]
+        self.graph_ids = meta["graph_ids"]
+        self.arrays = arrays
+        self.extras = {(i, j): v for i, j, v in meta["extras"]}
+        self._state = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return StoredRKModel(self, i)
+
+    def _apply(self, state, i):
+        a = self.arrays
+        mask, values, links = state
+        lo, hi = a["flip_offsets"][i:i + 2].tolist()
+        mask[a["flips"][lo:hi]] ^= True
+        lo, hi = a["value_offsets"][i:i + 2].tolist()
+        for j, kind, v in zip(a["value_pos"][lo:hi].tolist(), a["value_kind"][lo:hi].tolist(),
+                              a["value_new"][lo:hi].tolist()):
+            values[j] = v if kind == _FLOAT else None if kind == _NONE else self.extras[i, j]
+        lo, hi = a["removed_offsets"][i:i + 2].tolist()
+        for e in a["removed_uv"][lo:hi].tolist():
+            del links[tuple(e)]
+        lo, hi = a["added_offsets"][i:i + 2].tolist()
+        for (u, v), d in zip(a["added_uv"][lo:hi].tolist(), a["added_d"][lo:hi].tolist()):
+            links[u, v] = d
+
+    def state(self, i):
+        '''
+        Rebuilds a model as its mask over the node positions, its node values
+        and its linkage edges by node positions. The state is shared with the
+        chunk and must not be modified.
+
+        :param i: Row of the model
+        :type i: int
+        :rtype: tuple[ndarray, ndarray, dict]
+        '''
+        keyframes = self.arrays["keyframes"]
+        start = int(keyframes[np.searchsorted(keyframes, i, side="right") - 1])
+        if self._state is not None and start <= self._state[0] <= i:
+            row, state = self._state
+        else:
+            n = len(self.template)
+            row, state = start - 1, (np.zeros(n, dtype=bool), np.full(n, None, dtype=object), {})
+        for r in range(row + 1, i + 1):
+            self._apply(state, r)
+        self._state = (i, state)
+        return state
+
+    def mask(self, i):
+        ids = self.template.ids
+        return [ids[j] for j in np.flatnonzero(self.state(i)[0])]
+
+    def values(self, i):
+        return self.state(i)[1]
+
+    def graph(self, i):
+        return StoredOverlay(self, i)
+
+    def links(self, i):
+        ids = self.template.ids
+        return [(ids[u], ids[v], {"edge_distance": d}) for (u, v), d in self.state(i)[2].items()]
@@ -0,0 +1,62 @@
+import os
+import numpy as np
+import pandas as pd
+from .archive import ModelArchive
+from .columnar import ColumnarModelReader, ColumnarModelWriter
+from .delta import DeltaModelWriter
+from ..models.pipeline import RKPipeline
+from ..models.pipeline_test import assert_same_model
+from ..functions.htg_transformers import BaseOntologyTransform
+from ..functions.filters import RangeFilter
+from ..functions.linkers import SimpleChildLinker
+
+def make_series(n=60, seed=3):
+    '''Models of a slowly drifting series: every row changes one column of the previous one'''
+    rng = np.random.default_rng(seed)
+    groups = {"G{}".format(g): ["G{}_{}".format(g, c) for c in range(12)] for g in range(4)}
+    hft = BaseOntologyTransform(mapping={"root": {g: {c: {} for c in cs} for g, cs in groups.items()}})
+    cols = [c for cs in groups.values() for c in cs]
+    row = rng.random(len(cols))
+    rows = []
+    for i in range(n):
+        row = row.copy()
+        row[rng.integers(len(cols))] = rng.random()
+        rows.append(row)
+    df = pd.DataFrame(rows, columns=cols)
+    df.loc[df.index[::7], "G0_1"] = np.nan
+    filters = {k: RangeFilter(min=.2, max=.9) for k in cols[::5]}
+    pipeline = RKPipeline(filters, {"root": SimpleChildLinker(theta=.1)})
+    models = list(pipeline.transform_batch(df, hft))
+    for i, m in enumerate(models):
+        m.id = i
+    return models
+
+def test_delta_round_trip(tmp_path):
+    models = make_series()
+    path = str(tmp_path / "models.rkd")
+    with DeltaModelWriter(path, chunk_size=25, keyframe_interval=8) as writer:
+        for m in models:
+            writer.write(m)
+
+    with ColumnarModelReader(path) as reader:
+        loaded = reader.readAll()
+    assert len(loaded) == len(models)
+    for m1, m2 in zip(models, loaded):
+        assert m1.id == m2.id
+        assert_same_model(m1, m2)
+
+    with ModelArchive(path) as archive:
+        # random access replays the deltas from the keyframe before the model
+        for i in (37, 5, 59, 36, 24, 25):
+            assert_same_model(models[i], archive.get(i))
+
+def test_delta_is_smaller(tmp_path):
+    models = make_series(200)
+    full, delta = str(tmp_path / "models.rkc"), str(tmp_path / "models.rkd")
+    with ColumnarModelWriter(full) as writer:
+        for m in models:
+            writer.write(m)
+    with DeltaModelWriter(delta) as writer:
+        for m in models:
+            writer.write(m)
+    assert os.path.getsize(delta) < os.path.getsize(full) / 5
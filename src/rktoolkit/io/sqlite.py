@@ -0,0 +1,445 @@
+import sqlite3
+import numpy as np
+from .io import RKModelWriter, RKModelReader
+from .columnar import (_dumps, _loads, _plain, _linkage_edges,
+                       StoredRKModel, StoredOverlay, decode_graph, encode_graph, model_key, pack_arrays, unpack_arrays)
+from ..models.compact import structural_index
+from ..functions.htg_transformers import OntologyTemplate
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS node (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS model (
+    id INTEGER PRIMARY KEY,
+    model_id TEXT NOT NULL,
+    graph_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    node_values BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS model_key ON model (key);
+CREATE TABLE IF NOT EXISTS masked_node (
+    model INTEGER NOT NULL REFERENCES model (id),
+    node INTEGER NOT NULL REFERENCES node (position),
+    PRIMARY KEY (model, node)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS masked_node_node ON masked_node (node, model);
+CREATE TABLE IF NOT EXISTS link_edge (
+    model INTEGER NOT NULL REFERENCES model (id),
+    u INTEGER NOT NULL REFERENCES node (position),
+    v INTEGER NOT NULL REFERENCES node (position),
+    edge_distance REAL,
+    PRIMARY KEY (model, u, v)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS link_edge_uv ON link_edge (u, v, model);
+'''
+
+# Number of ids bound per statement when reading models in bulk
+_BATCH = 500
+
+def _text(v):
+    return _dumps(_plain(v)).decode()
+
+def _connect(path):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+def _pack_values(values):
+    present = np.fromiter((isinstance(v, float) for v in values), dtype=bool, count=len(values))
+    floats = np.full(len(values), np.nan)
+    extras = []
+    for j, v in enumerate(values):
+        if present[j]:
+            floats[j] = v
+        elif v is not None:
+            extras.append([j, v])
+    return pack_arrays({"extras": extras}, {
+        "values": floats, "value_bits": np.packbits(present, bitorder="little")})
+
+def _unpack_values(blob, n):
+    meta, arrays = unpack_arrays(blob)
+    values = np.full(n, None, dtype=object)
+    present = np.unpackbits(arrays["value_bits"], count=n, bitorder="little").astype(bool)
+    values[present] = arrays["values"][present]
+    for j, v in meta["extras"]:
+        values[j] = v
+    return values
+
+class SQLiteModelWriter(RKModelWriter):
+    '''
+    Writes RK models to a SQLite catalog. The structural graph is stored
+    once, from the first model written, and every model is normalised into a
+    :code:`model` row holding its ids and packed node values, one
+    :code:`masked_node` row per masked node and one :code:`link_edge` row
+    (with its :code:`edge_distance`) per linkage edge. Nodes are referenced
+    by their position in the structural graph, and the masked nodes and
+    linkage edges are indexed by node so that :class:`ModelCatalog` queries
+    only read the matching rows.
+
+    The database runs in WAL mode, so catalogs can be queried while they are
+    written. Models are buffered and inserted in one transaction of batched
+    :code:`executemany` calls per `batch_size` models. Writing to an existing
+    catalog appends to it; all models must share the structure of the
+    stored graph.
+
+    :param path: Path of the database
+    :type path: str
+    :param batch_size: Number of models per transaction, defaults to 1024
+    :type batch_size: int, optional
+    '''
+
+    def __init__(self, path, batch_size=1024):
+        self.path = path
+        self.batch_size = batch_size
+        self._db = _connect(path)
+        with self._db:
+            self._db.executescript(_SCHEMA)
+        self._index = None
+        self._checked = None
+        self._rows = []
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'graph'").fetchone()
+        if row is not None:
+            self._set_graph(decode_graph(row[0]))
+        self._next_id = self._db.execute("SELECT COALESCE(MAX(id), -1) + 1 FROM model").fetchone()[0]
+
+    def _set_graph(self, G):
+        self._index = structural_index(G)
+        self._ids = self._index.ids
+        self._position = {n: i for i, n in enumerate(self._ids)}
+
+    def _store_graph(self, G):
+        self._set_graph(G)
+        with self._db:
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('graph', ?)", (encode_graph(G),))
+            self._db.executemany("INSERT INTO node (position, name) VALUES (?, ?)",
+                                 [(i, _text(n)) for i, n in enumerate(self._ids)])
+
+    def write(self, model) -> bool:
+        '''
+        Buffers a model and inserts the buffered models once a batch is full.
+
+        :param model: Model to be written
+        :type model: RKModel
+        :raises ValueError: Raises ValueError if the structure of the model's graph differs from the stored graph
+        :return: True once the model is buffered
+        :rtype: bool
+        '''
+        G = model.G
+        if self._index is None:
+            self._store_graph(G)
+        if G is not self._checked:
+            if not self._index.matches(G):
+                raise ValueError("The structure of model {} differs from the stored graph".format(model.id))
+            self._checked = G
+        position = self._position
+        model_id, graph_id = getattr(model, "id", None), getattr(G, "id", None)
+        i = self._next_id
+        self._next_id += 1
+        self._rows.append((
+            (i, _text(model_id), _text(graph_id), _text(model_key(model_id, graph_id)),
+             _pack_values([v for _, v in G.nodes(data="value")])),
+            [(i, position[n]) for n in model.mask],
+            [(i, position[u], position[v], attrs.get("edge_distance", np.nan))
+             for (u, v), attrs in _linkage_edges(G, model.edges)],
+        ))
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        '''Inserts the buffered models in one transaction.'''
+        if not self._rows:
+            return
+        with self._db:
+            self._db.executemany("INSERT INTO model (id, model_id, graph_id, key, node_values) "
+                                 "VALUES (?, ?, ?, ?, ?)", [r[0] for r in self._rows])
+            self._db.executemany("INSERT INTO masked_node (model, node) VALUES (?, ?)",
+                                 (m for r in self._rows for m in r[1]))
+            self._db.executemany("INSERT INTO link_edge (model, u, v, edge_distance) VALUES (?, ?, ?, ?)",
+                                 (e for r in self._rows for e in r[2]))
+        self._rows = []
+
+    def close(self):
+        '''Inserts the buffered models and closes the database.'''
+        if self._db is None:
+            return
+        self.flush()
+        self._db.close()
+        self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class _CatalogRows():
+    '''Rows of models fetched from a catalog, decoded by :class:`StoredRKModel` on access'''
+
+    def __init__(self, template, rows, masked, links):
+        self.template = template
+        self.ids = [_loads(r[1].encode()) for r in rows]
+        self.graph_ids = [_loads(r[2].encode()) for r in rows]
+        self._values = [r[3] for r in rows]
+        self._masked = masked
+        self._links = links
+        self._rowid = [r[0] for r in rows]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return StoredRKModel(self, i)
+
+    def mask(self, i):
+        ids = self.template.ids
+        return [ids[j] for j in self._masked.get(self._rowid[i], ())]
+
+    def values(self, i):
+        return _unpack_values(self._values[i], len(self.template))
+
+    def graph(self, i):
+        return StoredOverlay(self, i)
+
+    def links(self, i):
+        ids = self.template.ids
+        return [(ids[u], ids[v], {"edge_distance": np.nan if d is None else d})
+                for u, v, d in self._links.get(self._rowid[i], ())]
+
+class ModelCatalog():
+    '''
+    Queries over a catalog written by :class:`SQLiteModelWriter`. Queries
+    return catalog ids (the position at which models were written), which
+    :meth:`reader` turns into a lazy reader of the models.
+
+    :param path: Path of the database
+    :type path: str
+    :raises ValueError: Raises ValueError if the database holds no catalog
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._db = _connect(path)
+        try:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'graph'").fetchone()
+        except sqlite3.DatabaseError:
+            row = None
+        if row is None:
+            self._db.close()
+            raise ValueError("{} holds no RK model catalog".format(path))
+        self.G = decode_graph(row[0])
+        self.template = OntologyTemplate(self.G, list(self.G.nodes))
+        self._position = {n: i for i, n in enumerate(self.template.ids)}
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM model").fetchone()[0]
+
+    def _node(self, n):
+        try:
+            return self._position[n]
+        except KeyError:
+            raise KeyError("Unknown node {}".format(n)) from None
+
+    def _edge(self, e):
+        u, v = e
+        return self._node(u), self._node(v)
+
+    def query(self, masked=(), unmasked=(), linked=(), unlinked=(), max_distance=None):
+        '''
+        Returns the ids of the models matching every condition. Edges of the
+        structural graph are kept by every model, so only linkage edges
+        narrow a query.
+
+        :param masked: Nodes masked by the models
+        :type masked: Iterable
+        :param unmasked: Nodes not masked by the models
+        :type unmasked: Iterable
+        :param linked: (u, v) linkage edges of the models
+        :type linked: Iterable[tuple]
+        :param unlinked: (u, v) edges the models do not have
+        :type unlinked: Iterable[tuple]
+        :param max_distance: Largest edge distance of the edges of `linked`, defaults to any
+        :type max_distance: float, optional
+        :raises KeyError: Raises KeyError if a node is not in the structural graph
+        :return: Catalog ids in ascending order
+        :rtype: list[int]
+        '''
+        include, exclude = [], []
+        for n in masked:
+            include.append(("SELECT model FROM masked_node WHERE node = ?", (self._node(n),)))
+        for n in unmasked:
+            exclude.append(("SELECT model FROM masked_node WHERE node = ?", (self._node(n),)))
+        for e in linked:
+            if self.G.has_edge(*e):
+                continue
+            sql, params = "SELECT model FROM link_edge WHERE u = ? AND v = ?", self._edge(e)
+            if max_distance is not None:
+                sql, params = sql + " AND edge_distance <= ?", params + (max_distance,)
+            include.append((sql, params))
+        for e in unlinked:
+            if self.G.has_edge(*e):
+                return []
+            exclude.append(("SELECT model FROM link_edge WHERE u = ? AND v = ?", self._edge(e)))
+        if not include:
+            include.append(("SELECT id FROM model", ()))
+        parts = [" INTERSECT ".join(q for q, _ in include)] + [q for q, _ in exclude]
+        params = [p for _, ps in include + exclude for p in ps]
+        sql = " EXCEPT ".join(parts) + " ORDER BY 1"
+        return [r[0] for r in self._db.execute(sql, params)]
+
+    def masked(self, node):
+        '''
+        Returns the ids of the models that mask a node. See :meth:`query`.
+
+        :rtype: list[int]
+        '''
+        return self.query(masked=[node])
+
+    def linked(self, u, v, max_distance=None):
+        '''
+        Returns the ids of the models with a linkage edge from u to v. See :meth:`query`.
+
+        :rtype: list[int]
+        '''
+        return self.query(linked=[(u, v)], max_distance=max_distance)
+
+    def find(self, key):
+        '''
+        Returns the ids of the models with a key: their id, or the id of their graph if they have none.
+
+        :rtype: list[int]
+        '''
+        return [r[0] for r in self._db.execute("SELECT id FROM model WHERE key = ? ORDER BY id", (_text(key),))]
+
+    def fetch(self, ids):
+        '''
+        Fetches models by catalog id in batched queries. Their graphs and
+        edges are built on access.
+
+        :param ids: Catalog ids
+        :type ids: Iterable[int]
+        :raises KeyError: Raises KeyError if an id is not in the catalog
+        :rtype: list[RKModel]
+        '''
+        ids = [int(i) for i in ids]
+        models = []
+        for k in range(0, len(ids), _BATCH):
+            batch = ids[k:k + _BATCH]
+            marks = ",".join("?" * len(batch))
+            rows = {r[0]: r for r in self._db.execute(
+                "SELECT id, model_id, graph_id, node_values FROM model WHERE id IN ({})".format(marks), batch)}
+            missing = [i for i in batch if i not in rows]
+            if missing:
+                raise KeyError("Unknown models {}".format(missing))
+            masked, links = {}, {}
+            for m, n in self._db.execute(
+                    "SELECT model, node FROM masked_node WHERE model IN ({}) ORDER BY model, node".format(marks), batch):
+                masked.setdefault(m, []).append(n)
+            for m, u, v, d in self._db.execute(
+                    "SELECT model, u, v, edge_distance FROM link_edge WHERE model IN ({})".format(marks), batch):
+                links.setdefault(m, []).append((u, v, d))
+            chunk = _CatalogRows(self.template, [rows[i] for i in batch], masked, links)
+            models.extend(chunk[i] for i in range(len(chunk)))
+        return models
+
+    def reader(self, ids=None):
+        '''
+        Returns a reader of models of the catalog.
+
+        :param ids: Catalog ids, defaults to every model
+        :type ids: Iterable[int], optional
+        :rtype: SQLiteModelReader
+        '''
+        return SQLiteModelReader(self, ids)
+
+    def close(self):
+        '''Closes the database.'''
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class SQLiteModelReader(RKModelReader):
+    '''
+    Reads models of a :class:`ModelCatalog`, fetching them from the database
+    a batch at a time as they are read.
+
+    :param catalog: Catalog of the models, or the path of its database
+    :type catalog: ModelCatalog
+    :param ids: Catalog ids of the models, defaults to every model
+    :type ids: Iterable[int], optional
+    '''
+
+    def __init__(self, catalog, ids=None):
+        self._owned = not isinstance(catalog, ModelCatalog)
+        self.catalog = ModelCatalog(catalog) if self._owned else catalog
+        if ids is None:
+            ids = self.catalog.query()
+        self.ids = list(ids)
+        self._cursor = 0
+        self._batch = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def next(self):
+        '''
+        Reads the next model.
+
+        :return: The next model, or None once every model was read
+        :rtype: RKModel
+        '''
+        if not self._batch:
+            ids = self.ids[self._cursor:self._cursor + _BATCH]
+            if not ids:
+                return None
+            self._batch = self.catalog.fetch(ids)[::-1]
+            self._cursor += len(ids)
+        return self._batch.pop()
+
+    def read(self):
+        '''
+        Reads the next model. See :meth:`next`.
+
+        :rtype: RKModel
+        '''
+        return self.next()
+
+    def readAll(self):
+        '''
+        Reads every model that was not read yet.
+
+        :rtype: list[RKModel]
+        '''
+        models = self._batch[::-1] + self.catalog.fetch(self.ids[self._cursor:])
+        self._batch = []
+        self._cursor = len(self.ids)
+        return models
+
+    def __iter__(self):
+        while True:
+            model = self.next()
+            if model is None:
+                return
+            yield model
+
+    def close(self):
+        '''Closes the catalog if the reader opened it.'''
+        if self._owned:
+            self.catalog.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,72 @@
+import pytest
+from .io import RKModelReader, RKModelWriter
+from .sqlite import ModelCatalog, SQLiteModelReader, SQLiteModelWriter
+from .columnar_test import make_models
+from ..models.pipeline_test import assert_same_model
+
+def write_catalog(path, models, batch_size=8):
+    with SQLiteModelWriter(path, batch_size=batch_size) as writer:
+        assert isinstance(writer, RKModelWriter)
+        for m in models:
+            assert writer.write(m)
+
+def test_sqlite_round_trip(tmp_path):
+    models = make_models(30)
+    path = str(tmp_path / "models.db")
+    write_catalog(path, models[:20])
+    write_catalog(path, models[20:])
+
+    with ModelCatalog(path) as catalog:
+        assert len(catalog) == len(models)
+        with catalog.reader() as reader:
+            assert isinstance(reader, RKModelReader)
+            first = reader.next()
+            assert first.id == ("run", 0)
+            assert_same_model(models[0], first)
+            rest = reader.readAll()
+            assert reader.next() is None
+        for m1, m2 in zip(models[1:], rest):
+            assert m1.id == m2.id
+            assert_same_model(m1, m2)
+        assert catalog.find(("run", 7)) == [7]
+        assert catalog.find(("run", 70)) == []
+    with SQLiteModelReader(path, ids=[3, 1]) as reader:
+        assert [m.id for m in reader] == [("run", 3), ("run", 1)]
+
+def test_sqlite_queries(tmp_path):
+    models = make_models(40)
+    path = str(tmp_path / "models.db")
+    write_catalog(path, models)
+
+    def expected(masked=(), unmasked=(), linked=(), unlinked=()):
+        out = []
+        for i, m in enumerate(models):
+            mask, edges = set(m.mask), set(m.edges)
+            if all(n in mask for n in masked) and not any(n in mask for n in unmasked) \
+                    and all(e in edges for e in linked) and not any(e in edges for e in unlinked):
+                out.append(i)
+        return out
+
+    with ModelCatalog(path) as catalog:
+        assert catalog.masked("B_3") == expected(masked=["B_3"])
+        assert 0 < len(catalog.masked("B_3")) < len(models)
+        assert catalog.linked("A_1", "A_2") == expected(linked=[("A_1", "A_2")])
+        query = dict(masked=["A"], unmasked=["B_3"], linked=[("B_1", "B_2")], unlinked=[("A_1", "A_3")])
+        assert catalog.query(**query) == expected(**query)
+        assert catalog.query(linked=[("root", "A")]) == list(range(len(models)))
+        assert catalog.query(unlinked=[("root", "A")]) == []
+
+        close = catalog.linked("A_1", "A_2", max_distance=.1)
+        for i in close:
+            assert models[i].edges["A_1", "A_2"]["edge_distance"] <= .1
+        assert set(close) <= set(catalog.linked("A_1", "A_2"))
+
+        ids = catalog.query(masked=["A"])
+        assert [m.id for m in catalog.reader(ids).readAll()] == [models[i].id for i in ids]
+        with pytest.raises(KeyError):
+            catalog.masked("Z")
+
+def test_sqlite_rejects_other_files(tmp_path):
+    path = str(tmp_path / "empty.db")
+    with pytest.raises(ValueError):
+        ModelCatalog(path)
@@ -1,4 +1,14 @@
+import math
 import numpy as np
+import multiprocessing
+import concurrent.futures as futures
+from scipy import stats
+from ..models.cache import TransformCache
+
+# Objective snapshot of a pool worker, published once per worker by the pool
+# initializer. The pipeline of the snapshot keeps the worker's own cache of
+# row graphs across evaluations.
+_WORKER = {}
 
 class SampleObjectiveFunction():
     '''
@@ -33,3 +43,355 @@ class SampleObjectiveFunction():
         distances = self.dfunc(models, self.mdist, [1, 0])
         c = 1 - np.mean(distances)
         return c
+
+
+class CachedObjectiveFunction():
+    '''
+    Objective function computing the same value as
+    :class:`SampleObjectiveFunction`, without repeating work across
+    evaluations:
+
+        • The graph of every row, and the per-row results of the pipeline,
+          are cached with :meth:`RKPipeline.transform_cached`, so a row is
+          only transformed by the ontology once and only the parts depending
+          on changed knobs are recomputed.
+        • Rows are evaluated in a persistent :class:`RowPool` of
+          `n_workers` processes. Each worker receives the pipeline, data and
+          distance function once and keeps its own cache, and a row is
+          always evaluated by the same worker so its cached graph is reused.
+        • Objective values are memoized by `w` rounded to `decimals`, only
+          with common random numbers and a deterministic distance function,
+          as otherwise another evaluation of the same `w` is another sample.
+        • With common random numbers every evaluation uses the same sample,
+          drawn once from `seed`, so differences between evaluations come
+          from `w` only. Otherwise a new sample is drawn on every evaluation.
+
+    The distance function must return one distance per model, as the mean
+    of the distances is taken.
+
+    :param pipeline: Pipeline to be tuned
+    :type pipeline: RKPipeline
+    :param sample_size: Number of rows per evaluation
+    :type sample_size: int
+    :param w0: Initial knobs and their columns, as returned by :meth:`RKPipeline.get_w`
+    :type w0: tuple
+    :param df: Data with one row per model
+    :type df: DataFrame
+    :param hft: Transform building the hierarchy of a row
+    :type hft: BaseOntologyTransform
+    :param mdist: Reference passed to the distance function
+    :type mdist: Any
+    :param distance_function: Function of (models, mdist, weights) returning one distance per model
+    :type distance_function: Callable
+    :param n_workers: Number of worker processes, 1 evaluates in process, defaults to 1
+    :type n_workers: int, optional
+    :param seed: Seed of the samples, defaults to 0
+    :type seed: int, optional
+    :param common_random_numbers: Evaluate every w on the same sample, defaults to True
+    :type common_random_numbers: bool, optional
+    :param decimals: Decimals w is rounded to when memoizing, defaults to 6
+    :type decimals: int, optional
+    :param deterministic: Whether the distance function always returns the same distance for the same model, defaults to True
+    :type deterministic: bool, optional
+    :param max_cache_bytes: Memory budget of the row cache of each process, defaults to 256 MiB
+    :type max_cache_bytes: int, optional
+    '''
+
+    def __init__(self, pipeline, sample_size, w0, df, hft, mdist, distance_function,
+                 n_workers=1, seed=0, common_random_numbers=True, decimals=6,
+                 deterministic=True, max_cache_bytes=256 * 2**20):
+        self.pipeline = pipeline.remap([], [])
+        self.pipeline.cache = TransformCache(max_bytes=max_cache_bytes)
+        self.sample_size = sample_size
+        self.w0 = w0
+        self.df = df
+        self.hft = hft
+        self.mdist = mdist
+        self.dfunc = distance_function
+        self.n_workers = n_workers
+        self.seed = seed
+        self.common_random_numbers = common_random_numbers
+        self.decimals = decimals
+        self.deterministic = deterministic
+        self.memo = {}
+        self._rng = np.random.default_rng(seed)
+        self._sample = None
+        self._pool = None
+
+    def sample(self, sample_size=None):
+        '''
+        Returns the positions of the rows of the next evaluation. With common
+        random numbers the sample of every size is a prefix of one fixed
+        permutation of the rows, so a larger sample extends a smaller one.
+
+        :param sample_size: Number of rows, defaults to sample_size
+        :type sample_size: int, optional
+        :rtype: ndarray
+        '''
+        n = self.sample_size if sample_size is None else sample_size
+        if not self.common_random_numbers:
+            return self._rng.choice(len(self.df), size=n, replace=False)
+        if self._sample is None:
+            self._sample = self._rng.permutation(len(self.df))
+        return self._sample[:n]
+
+    def score(self, distances):
+        '''
+        Objective value of the distances of a sample.
+
+        :param distances: One distance per row
+        :type distances: ndarray
+        :rtype: float
+        '''
+        return 1 - np.mean(distances)
+
+    def evaluate(self, w, sample_size=None):
+        '''
+
+        :param w: Weights to be used for evaluation in the objective function
+        :type w: tuple
+        :param sample_size: Number of rows, defaults to sample_size
+        :type sample_size: int, optional
+        :return: The R-K distance evaluated from the objective function
+        :rtype: float
+        '''
+        if not (self.common_random_numbers and self.deterministic):
+            return self.score(self.distances(w, self.sample(sample_size)))
+        key = (tuple(np.round(np.asarray(w, dtype=np.float64), self.decimals).tolist()), sample_size)
+        if key in self.memo:
+            return self.memo[key]
+        c = self.score(self.distances(w, self.sample(sample_size)))
+        self.memo[key] = c
+        return c
+
+    def evaluate_adaptive(self, w, incumbent=None, min_sample_size=8, growth=2,
+                          confidence=.95, sample_size=None, maximize=True):
+        '''
+        Evaluates w on a sample that grows in stages, starting with
+        min_sample_size rows and multiplying by growth up to sample_size.
+        After every stage the running mean of the distances and a
+        confidence interval around it (Student t) are updated. The
+        evaluation stops early as soon as the best objective value still
+        inside the interval cannot beat the incumbent.
+
+        With common random numbers the stages are prefixes of the same
+        sample used by :meth:`evaluate`, so a completed adaptive evaluation
+        scores exactly the same rows.
+
+        :param w: Weights to be used for evaluation in the objective function
+        :type w: tuple
+        :param incumbent: Objective value to beat, defaults to None (never stop early)
+        :type incumbent: float, optional
+        :param min_sample_size: Rows of the first stage, defaults to 8
+        :type min_sample_size: int, optional
+        :param growth: Growth factor of the sample between stages, defaults to 2
+        :type growth: float, optional
+        :param confidence: Confidence level of the interval, defaults to .95
+        :type confidence: float, optional
+        :param sample_size: Largest number of rows, defaults to sample_size
+        :type sample_size: int, optional
+        :param maximize: Whether larger objective values are better, defaults to True
+        :type maximize: bool, optional
+        :return: The evaluation, with the number of rows used
+        :rtype: AdaptiveEvaluation
+        '''
+        n_max = self.sample_size if sample_size is None else sample_size
+        rows = self.sample(n_max)
+        running = RunningStats()
+        n = min(max(min_sample_size, 1), n_max)
+        while True:
+            running.update(self.distances(w, rows[running.n:n]))
+            low, high = self._bounds(running, confidence)
+            best = max(low, high) if maximize else min(low, high)
+            beaten = incumbent is not None and (best < incumbent if maximize else best > incumbent)
+            if beaten or n >= n_max:
+                break
+            n = min(max(int(math.ceil(n * growth)), n + 1), n_max)
+        return AdaptiveEvaluation(float(self.score(np.array([running.mean]))), running.n,
+                                  min(low, high), max(low, high), beaten and running.n < n_max)
+
+    def _bounds(self, running, confidence):
+        '''Objective values at both ends of the confidence interval of the mean distance'''
+        if running.n < 2:
+            half = np.inf
+        else:
+            half = stats.t.ppf(.5 + confidence / 2, running.n - 1) * np.sqrt(running.var / running.n)
+        return (float(self.score(np.array([running.mean - half]))),
+                float(self.score(np.array([running.mean + half]))))
+
+    def distances(self, w, rows):
+        '''
+        Computes the distance of the model of every given row under w.
+
+        :param w: Weights to be used for evaluation in the objective function
+        :type w: tuple
+        :param rows: Positions of the rows in df
+        :type rows: ndarray
+        :return: One distance per row
+        :rtype: ndarray
+        '''
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.n_workers == 1:
+            return _distances(self, w, rows)
+        if self._pool is None:
+            self._pool = RowPool(self, self.n_workers)
+        return self._pool.distances([(w, rows)])[0]
+
+    def close(self):
+        '''
+        Shuts the worker pool down. The pool is started again by the next
+        evaluation that needs it.
+        '''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_pool"] = None
+        return state
+
+class RowPool():
+    '''
+    Pool of worker processes evaluating the rows of an objective. Every
+    worker is a process of its own and a row is always evaluated by the same
+    worker (its position modulo the number of workers), so the rows cached
+    by the objective of a worker are found again by later evaluations.
+
+    Each worker receives the objective once, when it starts, and evaluates
+    its rows in process with :code:`objective.distances(w, rows)`.
+
+    :param objective: Objective providing :code:`distances(w, rows)`
+    :type objective: CachedObjectiveFunction
+    :param n_workers: Number of worker processes
+    :type n_workers: int
+    '''
+
+    def __init__(self, objective, n_workers):
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self._workers = [futures.ProcessPoolExecutor(max_workers=1, mp_context=ctx,
+                                                     initializer=_init_worker, initargs=(objective,))
+                         for _ in range(n_workers)]
+
+    def __len__(self):
+        return len(self._workers)
+
+    def distances(self, tasks):
+        '''
+        Evaluates many (w, rows) tasks. The rows of every task are split
+        between the workers owning them and all parts run concurrently.
+
+        :param tasks: Knob vectors and the positions of the rows to evaluate them on
+        :type tasks: list[tuple]
+        :return: One distance per row of every task
+        :rtype: list[ndarray]
+        '''
+        n, pending = len(self._workers), []
+        for w, rows in tasks:
+            rows = np.asarray(rows, dtype=np.int64)
+            owner = rows % n
+            parts = [(owner == k, self._workers[k].submit(_evaluate_chunk, w, rows[owner == k]))
+                     for k in np.unique(owner).tolist()]
+            pending.append((len(rows), parts))
+        out = []
+        for size, parts in pending:
+            d = np.empty(size)
+            for owned, f in parts:
+                d[owned] = f.result()
+            out.append(d)
+        return out
+
+    def close(self):
+        '''Shuts every worker down.'''
+        for worker in self._workers:
+            worker.shutdown(wait=True)
+        self._workers = []
+
+class RunningStats():
+    '''
+    Running count, mean and variance of a stream of values, updated a
+    chunk at a time with the parallel form of Welford's algorithm.
+    '''
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.
+        self._m2 = 0.
+
+    @property
+    def var(self):
+        '''Sample variance of the values seen so far'''
+        return self._m2 / (self.n - 1) if self.n > 1 else 0.
+
+    def update(self, values):
+        '''
+        Adds a chunk of values.
+
+        :param values: Values to be added
+        :type values: ndarray
+        '''
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        n, mean = values.size, values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+class AdaptiveEvaluation():
+    '''
+    Result of :meth:`CachedObjectiveFunction.evaluate_adaptive`.
+
+    :param value: Objective value on the rows used
+    :type value: float
+    :param n_used: Number of rows evaluated
+    :type n_used: int
+    :param low: Lower end of the confidence interval of the objective value
+    :type low: float
+    :param high: Upper end of the confidence interval of the objective value
+    :type high: float
+    :param stopped: Whether the evaluation stopped early because it could not beat the incumbent
+    :type stopped: bool
+    '''
+
+    def __init__(self, value, n_used, low, high, stopped):
+        self.value = value
+        self.n_used = n_used
+        self.low = low
+        self.high = high
+        self.stopped = stopped
+
+    def __repr__(self):
+        return "AdaptiveEvaluation(value={}, n_used={}, low={}, high={}, stopped={})".format(
+            self.value, self.n_used, self.low, self.high, self.stopped)
+
+def _distances(objective, w, rows):
+    pupdate = objective.pipeline.remap(w, objective.w0[1])
+    models = []
+    for i in rows.tolist():
+        key = objective.df.index[i]
+        g = pupdate.transform_cached(objective.df.iloc[i], key=key, ontology_transform=objective.hft)
+        g.id = key
+        models.append(g)
+    if not models:
+        return np.empty(0)
+    return np.asarray(objective.dfunc(models, objective.mdist, [1, 0]), dtype=np.float64).reshape(len(models))
+
+def _init_worker(objective):
+    # workers evaluate in process, they cannot start pools of their own
+    if hasattr(objective, "n_workers"):
+        objective.n_workers = 1
+    _WORKER["objective"] = objective
+
+def _evaluate_chunk(w, rows):
+    return _WORKER["objective"].distances(w, rows)
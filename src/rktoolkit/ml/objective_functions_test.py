@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from .objective_functions import CachedObjectiveFunction, RowPool, RunningStats
+from ..models.pipeline import RKPipeline
+from ..models.pipeline_test import make_frame, make_ontology
+from ..functions.filters import RangeFilter
+from ..functions.linkers import SimpleChildLinker
+
+def masked_fraction(models, mdist, weights):
+    return [len(m.mask) / mdist + len(m.edges) / 100 for m in models]
+
+def make_objective(**kwargs):
+    filters = {n: RangeFilter(min=.2, max=.9) for n in ["A", "A_2", "B_3"]}
+    pipeline = RKPipeline(filters, {"root": SimpleChildLinker(theta=.3)})
+    df = make_frame(30, seed=5)
+    return CachedObjectiveFunction(pipeline, 10, pipeline.get_w(), df, make_ontology(), 10,
+                                   masked_fraction, **kwargs)
+
+def expected(objective, w):
+    pupdate = objective.pipeline.remap(w, objective.w0[1])
+    rows = objective.df.iloc[objective.sample()]
+    models = [pupdate.transform(objective.hft.transform(row)) for _, row in rows.iterrows()]
+    return 1 - np.mean(masked_fraction(models, objective.mdist, [1, 0]))
+
+def test_cached_objective():
+    objective = make_objective()
+    cache = objective.pipeline.cache
+    w0 = objective.w0[0]
+    for w in [w0, [.5] + w0[1:], [.5, .6] + w0[2:-1] + [.1]]:
+        assert objective.evaluate(w) == expected(objective, w)
+    assert cache.misses == 10
+    assert objective.evaluate(np.array(w0) + 1e-9) == objective.evaluate(w0)
+    assert len(objective.memo) == 3
+
+    with make_objective(n_workers=2) as parallel:
+        for w in [w0, [.5] + w0[1:]]:
+            assert parallel.evaluate(w) == objective.evaluate(w)
+
+    noisy = make_objective(common_random_numbers=False)
+    assert not np.array_equal(noisy.sample(), noisy.sample())
+    noisy.evaluate(w0)
+    assert len(noisy.memo) == 0
+
+def worker_pid(models, mdist, weights):
+    import os
+    return [os.getpid()] * len(models)
+
+def test_row_pool_routes_rows():
+    objective = make_objective()
+    objective.dfunc = worker_pid
+    pool = RowPool(objective, 3)
+    try:
+        rows = np.arange(12)
+        first, second = pool.distances([(objective.w0[0], rows), (objective.w0[0], rows[::-1])])
+        assert np.array_equal(first, second[::-1])
+        assert len(set(first.tolist())) == 3
+        for k in range(3):
+            assert len(set(first[rows % 3 == k].tolist())) == 1
+    finally:
+        pool.close()
+
+def test_running_stats():
+    values = np.random.default_rng(0).random(50)
+    running = RunningStats()
+    for chunk in np.array_split(values, [1, 4, 20, 21]):
+        running.update(chunk)
+    assert running.n == 50
+    assert running.mean == pytest.approx(values.mean())
+    assert running.var == pytest.approx(values.var(ddof=1))
+
+def test_adaptive_evaluation():
+    objective = make_objective()
+    w = objective.w0[0]
+    full = objective.evaluate_adaptive(w, min_sample_size=2)
+    assert full.n_used == objective.sample_size and not full.stopped
+    assert full.value == pytest.approx(objective.evaluate(w))
+    assert full.low <= full.value <= full.high
+
+    early = objective.evaluate_adaptive(w, incumbent=10, min_sample_size=4)
+    assert early.stopped and early.n_used == 4
+    assert objective.evaluate_adaptive(w, incumbent=-10, min_sample_size=4).n_used == objective.sample_size
+    assert objective.evaluate_adaptive(w, incumbent=-10, min_sample_size=4, maximize=False).n_used == 4
@@ -0,0 +1,300 @@
+import itertools
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+from .objective_functions import RowPool
+
+class SearchResult():
+    '''
+    Result of a knob search.
+
+    :param cols: Knob columns, as returned by :meth:`RKPipeline.get_w`
+    :type cols: list
+    :param history: Every evaluation, as (w, sample size, value) in evaluation order
+    :type history: list[tuple]
+    :param maximize: Whether larger values are better
+    :type maximize: bool
+    '''
+
+    def __init__(self, cols, history, maximize=True):
+        self.cols = list(cols)
+        self.history = list(history)
+        self.maximize = maximize
+        budget = max((h[1] for h in self.history), default=None)
+        final = [h for h in self.history if h[1] == budget]
+        best = None
+        if final:
+            best = (max if maximize else min)(final, key=lambda h: h[2])
+        self.best_w = None if best is None else list(best[0])
+        self.best_value = None if best is None else best[2]
+
+    def to_frame(self):
+        '''
+        Returns the history as a DataFrame with one column per knob, the
+        sample size and the value of every evaluation.
+
+        :rtype: DataFrame
+        '''
+        df = pd.DataFrame([list(w) for w, _, _ in self.history], columns=self.cols)
+        df["sample_size"] = [h[1] for h in self.history]
+        df["value"] = [h[2] for h in self.history]
+        return df
+
+class KnobSearch():
+    '''
+    Search driver over the knobs of a pipeline. Candidates are knob vectors
+    laid out as :meth:`RKPipeline.get_w`; knobs missing from the search space
+    keep their initial value.
+
+    The objective must provide :code:`w0`, :code:`sample_size`,
+    :code:`sample(sample_size)`, :code:`distances(w, rows)` and
+    :code:`score(distances)`, as :class:`CachedObjectiveFunction` does. The
+    distance of every (w, row) pair is memoized, so evaluating a candidate on
+    a larger sample only computes the rows it has not seen yet. With common
+    random numbers the samples of the rungs of successive halving are nested
+    and every rung reuses the rows of the previous ones. Objectives whose
+    :code:`deterministic` attribute is False are evaluated again on every
+    row instead.
+
+    Candidates of a batch are evaluated concurrently in a :class:`RowPool`
+    of `n_jobs` processes, which evaluates a row always in the same process
+    so the row cache of the objective of every worker is reused. If a checkpoint path is given, every computed distance is
+    appended to it as a line of JSON and loaded back when the search is
+    created, so an interrupted search that is started again with the same
+    arguments replays the finished evaluations from the checkpoint and
+    resumes where it stopped.
+
+    :param objective: Objective function
+    :type objective: CachedObjectiveFunction
+    :param space: Values of every searched knob by column. A list holds the values to choose from, a (low, high) tuple a uniform range.
+    :type space: dict
+    :param n_jobs: Number of worker processes, 1 evaluates in process, defaults to 1
+    :type n_jobs: int, optional
+    :param checkpoint: Path of the checkpoint file, defaults to None
+    :type checkpoint: str, optional
+    :param maximize: Whether larger objective values are better, defaults to True
+    :type maximize: bool, optional
+    :param seed: Seed of the random candidates, defaults to 0
+    :type seed: int, optional
+    :param decimals: Decimals w is rounded to when memoizing, defaults to 6
+    :type decimals: int, optional
+    :raises ValueError: Raises ValueError if the space holds an unknown knob
+    '''
+
+    def __init__(self, objective, space, n_jobs=1, checkpoint=None, maximize=True,
+                 seed=0, decimals=6):
+        self.objective = objective
+        self.w0, self.cols = list(objective.w0[0]), list(objective.w0[1])
+        unknown = set(space) - set(self.cols)
+        if unknown:
+            raise ValueError("Unknown knobs {}".format(sorted(unknown)))
+        self.space = dict(space)
+        self.n_jobs = n_jobs
+        self.checkpoint = checkpoint
+        self.maximize = maximize
+        self.decimals = decimals
+        self.history = []
+        self._rng = np.random.default_rng(seed)
+        self._memo = {}
+        self._pool = None
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self._load()
+
+    def _key(self, w):
+        return tuple(np.round(np.asarray(w, dtype=np.float64), self.decimals).tolist())
+
+    def _load(self):
+        with open(self.checkpoint) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut short by an interruption
+                    continue
+                memo = self._memo.setdefault(self._key(record["w"]), {})
+                memo.update(zip(record["rows"], record["distances"]))
+
+    def _save(self, w, rows, distances):
+        if self.checkpoint is None:
+            return
+        with open(self.checkpoint, "a") as f:
+            f.write(json.dumps({"w": [float(v) for v in w], "rows": [int(r) for r in rows],
+                                "distances": [float(d) for d in distances]}) + "\n")
+
+    def candidate(self, values):
+        '''
+        Builds a full knob vector from the values of some knobs.
+
+        :param values: Values by column
+        :type values: dict
+        :rtype: list
+        '''
+        return [values.get(c, v) for c, v in zip(self.cols, self.w0)]
+
+    def sample_candidates(self, n):
+        '''
+        Draws n random candidates from the space.
+
+        :param n: Number of candidates
+        :type n: int
+        :rtype: list[list]
+        '''
+        out = []
+        for _ in range(n):
+            values = {}
+            for c, s in self.space.items():
+                if isinstance(s, tuple):
+                    values[c] = float(self._rng.uniform(s[0], s[1]))
+                else:
+                    values[c] = s[int(self._rng.integers(len(s)))]
+            out.append(self.candidate(values))
+        return out
+
+    def evaluate_many(self, ws, sample_size=None):
+        '''
+        Evaluates candidates on a sample of the given size, concurrently if
+        n_jobs > 1. Only the rows without a memoized distance are computed.
+
+        :param ws: Knob vectors
+        :type ws: list[list]
+        :param sample_size: Number of rows, defaults to the sample size of the objective
+        :type sample_size: int, optional
+        :return: Objective value of every candidate
+        :rtype: list[float]
+        '''
+        budget = self.objective.sample_size if sample_size is None else sample_size
+        deterministic = getattr(self.objective, "deterministic", True)
+        samples, tasks = [], []
+        for w in ws:
+            rows = np.asarray(self.objective.sample(budget), dtype=np.int64)
+            memo = self._memo.setdefault(self._key(w), {})
+            missing = [r for r in rows.tolist() if not deterministic or r not in memo]
+            samples.append(rows)
+            tasks.append((w, np.array(missing, dtype=np.int64)))
+
+        todo = [t for t in tasks if len(t[1])]
+        if self.n_jobs == 1:
+            results = [self.objective.distances(w, rows) for w, rows in todo]
+        else:
+            if self._pool is None:
+                self._pool = RowPool(self.objective, self.n_jobs)
+            results = self._pool.distances(todo)
+        computed = {}
+        for (w, rows), d in zip(todo, results):
+            computed[id(rows)] = dict(zip(rows.tolist(), np.asarray(d).tolist()))
+            self._memo[self._key(w)].update(computed[id(rows)])
+            self._save(w, rows, d)
+
+        values = []
+        for (w, missing), rows in zip(tasks, samples):
+            memo = {**self._memo[self._key(w)], **computed.get(id(missing), {})}
+            value = float(self.objective.score(np.array([memo[r] for r in rows.tolist()])))
+            self.history.append((list(w), budget, value))
+            values.append(value)
+        return values
+
+    def close(self):
+        '''Shuts the worker pool down.'''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _result(self, start):
+        return SearchResult(self.cols, self.history[start:], self.maximize)
+
+    def grid(self, sample_size=None):
+        '''
+        Evaluates every combination of the listed values of the space.
+
+        :param sample_size: Number of rows, defaults to the sample size of the objective
+        :type sample_size: int, optional
+        :raises ValueError: Raises ValueError if a knob has a range instead of a list of values
+        :rtype: SearchResult
+        '''
+        if any(isinstance(s, tuple) for s in self.space.values()):
+            raise ValueError("Grid search needs a list of values for every knob")
+        start = len(self.history)
+        keys = list(self.space)
+        ws = [self.candidate(dict(zip(keys, values)))
+              for values in itertools.product(*(self.space[k] for k in keys))]
+        self.evaluate_many(ws, sample_size)
+        return self._result(start)
+
+    def random(self, n_iter, sample_size=None):
+        '''
+        Evaluates n_iter random candidates.
+
+        :param n_iter: Number of candidates
+        :type n_iter: int
+        :param sample_size: Number of rows, defaults to the sample size of the objective
+        :type sample_size: int, optional
+        :rtype: SearchResult
+        '''
+        start = len(self.history)
+        self.evaluate_many(self.sample_candidates(n_iter), sample_size)
+        return self._result(start)
+
+    def successive_halving(self, n_candidates, min_sample_size, max_sample_size=None, eta=3,
+                           candidates=None):
+        '''
+        Successive halving: evaluates all candidates on a small sample, keeps
+        the best 1/eta of them and evaluates those on an eta times larger
+        sample, until the largest sample size is reached.
+
+        :param n_candidates: Number of random candidates, ignored if candidates are given
+        :type n_candidates: int
+        :param min_sample_size: Sample size of the first rung
+        :type min_sample_size: int
+        :param max_sample_size: Sample size of the last rung, defaults to the sample size of the objective
+        :type max_sample_size: int, optional
+        :param eta: Reduction factor between rungs, defaults to 3
+        :type eta: int, optional
+        :param candidates: Knob vectors to start from, defaults to random candidates
+        :type candidates: list[list], optional
+        :rtype: SearchResult
+        '''
+        start = len(self.history)
+        max_sample_size = max_sample_size or self.objective.sample_size
+        ws = list(candidates) if candidates is not None else self.sample_candidates(n_candidates)
+        budget = min(min_sample_size, max_sample_size)
+        while ws:
+            values = self.evaluate_many(ws, budget)
+            if budget >= max_sample_size or len(ws) == 1:
+                break
+            keep = max(1, len(ws) // eta)
+            order = np.argsort(values, kind="stable")
+            if self.maximize:
+                order = order[::-1]
+            ws = [ws[i] for i in order[:keep]]
+            budget = min(budget * eta, max_sample_size)
+        return self._result(start)
+
+    def hyperband(self, max_sample_size=None, eta=3):
+        '''
+        Hyperband: runs successive halving brackets that trade the number of
+        candidates against the size of the first sample, from many
+        candidates on small samples to few candidates on the full sample.
+
+        :param max_sample_size: Largest sample size, defaults to the sample size of the objective
+        :type max_sample_size: int, optional
+        :param eta: Reduction factor between rungs, defaults to 3
+        :type eta: int, optional
+        :rtype: SearchResult
+        '''
+        start = len(self.history)
+        max_sample_size = max_sample_size or self.objective.sample_size
+        s_max = int(math.log(max_sample_size) / math.log(eta) + 1e-9)
+        for s in range(s_max, -1, -1):
+            n = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+            self.successive_halving(n, max(1, int(max_sample_size * eta ** -s)), max_sample_size, eta)
+        return self._result(start)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from .search import KnobSearch
+from .objective_functions_test import make_objective
+
+SPACE = {"filter_min_A": [.1, .3, .5], "linkage_theta_root": [.1, .3]}
+
+def test_grid_search(tmp_path):
+    objective = make_objective()
+    path = str(tmp_path / "search.jsonl")
+    result = KnobSearch(objective, SPACE, checkpoint=path).grid()
+    assert len(result.history) == 6
+    values = [objective.evaluate(w) for w, _, _ in result.history]
+    assert [h[2] for h in result.history] == pytest.approx(values)
+    assert result.best_value == pytest.approx(max(values))
+    assert result.to_frame().shape == (6, len(objective.w0[1]) + 2)
+
+    def fail(w, rows):
+        raise AssertionError("evaluated again")
+    objective.distances = fail
+    resumed = KnobSearch(objective, SPACE, checkpoint=path).grid()
+    assert resumed.history == result.history
+
+    with pytest.raises(ValueError):
+        KnobSearch(objective, {"filter_min_Z": [0]})
+    with pytest.raises(ValueError):
+        KnobSearch(objective, {"filter_min_A": (0, 1)}).grid()
+
+def test_successive_halving_reuses_rows():
+    objective = make_objective()
+    computed = []
+    distances = objective.distances
+    def counting(w, rows):
+        computed.extend(rows.tolist())
+        return distances(w, rows)
+    objective.distances = counting
+
+    search = KnobSearch(objective, {"filter_min_A": (0, .6), "linkage_theta_root": (.05, .5)}, seed=1)
+    result = search.successive_halving(9, min_sample_size=1, max_sample_size=9, eta=3)
+    budgets = [h[1] for h in result.history]
+    assert budgets == [1] * 9 + [3] * 3 + [9]
+    assert len(computed) == 9 * 1 + 3 * 2 + 6
+    assert result.best_w == result.history[-1][0]
+
+    assert len(search.hyperband(max_sample_size=9).history) > 0
+
+def test_parallel_search():
+    serial = KnobSearch(make_objective(), SPACE).random(4)
+    with KnobSearch(make_objective(), SPACE, n_jobs=2) as search:
+        parallel = search.random(4)
+    assert parallel.history == serial.history
+
+def test_search_recomputes_noisy_objective():
+    objective = make_objective(deterministic=False)
+    computed = []
+    distances = objective.distances
+    def counting(w, rows):
+        computed.extend(rows.tolist())
+        return distances(w, rows)
+    objective.distances = counting
+    search = KnobSearch(objective, SPACE)
+    w = search.candidate({})
+    search.evaluate_many([w, w])
+    assert len(computed) == 2 * objective.sample_size
@@ -0,0 +1,92 @@
+import collections
+
+class TransformCache():
+    '''
+    Least recently used cache of per-row intermediate results, bounded by an
+    approximate memory budget. Entries must expose an :code:`nbytes`
+    attribute; the least recently used entries are evicted once the total
+    exceeds `max_bytes`.
+
+    :param max_bytes: Memory budget of the cache in bytes, defaults to 256 MiB
+    :type max_bytes: int, optional
+    '''
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        '''
+        Returns the entry of a key and marks it as recently used.
+
+        :param key: Key of the entry
+        :type key: Any
+        :return: The entry, or None if the key is not cached
+        '''
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        '''
+        Caches an entry, evicting the least recently used entries if the
+        cache is over budget. An entry larger than the whole budget is not
+        cached.
+
+        :param key: Key of the entry
+        :type key: Any
+        :param entry: Entry to be cached
+        :type entry: Any
+        '''
+        self.invalidate(key)
+        if entry.nbytes > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.nbytes += entry.nbytes
+        while self.nbytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def resize(self, key, nbytes):
+        '''
+        Updates the size of an entry that grew after it was cached.
+
+        :param key: Key of the entry
+        :type key: Any
+        :param nbytes: New size of the entry in bytes
+        :type nbytes: int
+        '''
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.nbytes -= entry.nbytes
+        entry.nbytes = nbytes
+        self.put(key, entry)
+
+    def invalidate(self, key=None):
+        '''
+        Drops the entry of a key, or every entry if no key is given.
+
+        :param key: Key of the entry, defaults to None
+        :type key: Any, optional
+        '''
+        if key is None:
+            self._entries.clear()
+            self.nbytes = 0
+            return
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
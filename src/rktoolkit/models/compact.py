@@ -0,0 +1,553 @@
+# Array backed graph representation
+import numbers
+import weakref
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from .graph import Graph, GraphOverlay
+from ..functions.distance import jaccard, cosine_similarity
+
+# Structural index of every graph, cached by the identity of the graph
+_INDEXES = weakref.WeakKeyDictionary()
+
+def structural_index(G):
+    '''
+    Returns the structure of G (interned node ids and CSR children/parents,
+    without attributes) as a :class:`CompactGraph`. The index is built once
+    per graph and cached by the identity of G, not in :code:`G.graph`, so
+    graphs derived from G (copies, relabeled graphs) get an index of their
+    own. It is built again if the nodes of G, their order or the number of
+    edges of G changed since (see :meth:`CompactGraph.matches`), but not if
+    edges are rewired.
+
+    Graphs with the same structure do not share an index. Hold the index of
+    one of them and check the others with :meth:`CompactGraph.matches`
+    instead. An overlay that did not change the structure of its base graph,
+    such as the graphs an ontology template builds for every row, shares the
+    index of the base graph.
+
+    :param G: Structural graph
+    :type G: Graph or GraphOverlay
+    :rtype: CompactGraph
+    '''
+    if isinstance(G, CompactGraph):
+        return G
+    if isinstance(G, GraphOverlay) and not G.structure_changed():
+        return structural_index(G.base)
+    index = _INDEXES.get(G)
+    if index is None or not index.matches(G):
+        index = CompactGraph.from_graph(G, attributes=False)
+        _INDEXES[G] = index
+    return index
+
+class AttributeColumn():
+    '''
+    A single attribute stored as a NumPy column. Numeric attributes are packed
+    into int64 or float64 arrays, everything else falls back to an object
+    array. Nodes or edges that do not carry the attribute are tracked by the
+    optional `present` mask so the round trip back to a dict is lossless.
+    '''
+
+    def __init__(self, values, present=None):
+        self.values = values
+        self.present = present
+
+    @classmethod
+    def from_list(cls, items, present=None):
+        '''
+        Packs a list of python values into the tightest column type.
+
+        :param items: Values of the column. Entries that are not present can be anything.
+        :type items: list
+        :param present: Mask of entries that carry the attribute, defaults to all
+        :type present: ndarray, optional
+        :return: Packed column
+        :rtype: AttributeColumn
+        '''
+        if present is not None and present.all():
+            present = None
+        check = items if present is None else [v for v, p in zip(items, present) if p]
+        values = None
+        if all(isinstance(v, numbers.Integral) and not isinstance(v, bool) for v in check):
+            try:
+                values = np.array([v if p else 0 for v, p in _zip_present(items, present)], dtype=np.int64)
+            except OverflowError:
+                values = None
+        elif all(isinstance(v, numbers.Real) and not isinstance(v, bool) for v in check):
+            values = np.array([v if p else np.nan for v, p in _zip_present(items, present)], dtype=np.float64)
+        if values is None:
+            values = np.empty(len(items), dtype=object)
+            for i, v in enumerate(items):
+                values[i] = v
+        return cls(values, present)
+
+    def get(self, i):
+        return self.values[i].item() if self.values.dtype != object else self.values[i]
+
+    def has(self, i):
+        return self.present is None or bool(self.present[i])
+
+    def as_float(self):
+        '''
+        Returns the column as floats. Missing or non-numeric entries are NaN.
+
+        :rtype: ndarray
+        '''
+        if self.values.dtype != object:
+            out = self.values.astype(np.float64)
+        else:
+            out = np.array([v if isinstance(v, numbers.Real) and not isinstance(v, bool) else np.nan
+                            for v in self.values], dtype=np.float64)
+        if self.present is not None:
+            out[~self.present] = np.nan
+        return out
+
+    def subset(self, idx):
+        present = None if self.present is None else self.present[idx]
+        return AttributeColumn(self.values[idx], present)
+
+def _zip_present(items, present):
+    if present is None:
+        return ((v, True) for v in items)
+    return zip(items, present)
+
+def _columns(dicts):
+    keys = {}
+    for d in dicts:
+        for k in d:
+            keys[k] = None
+    columns = {}
+    n = len(dicts)
+    for k in keys:
+        present = np.fromiter((k in d for d in dicts), dtype=bool, count=n)
+        columns[k] = AttributeColumn.from_list([d.get(k) for d in dicts], present)
+    return columns
+
+def _row(columns, i):
+    return {k: c.get(i) for k, c in columns.items() if c.has(i)}
+
+def _csr(offsets, index, rows):
+    '''Gathers the concatenated CSR slices of the given rows'''
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=index.dtype)
+    shift = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    return index[shift + np.arange(total)]
+
+class CompactGraph():
+    '''
+    Array backed alternative to :class:`Graph`. Node ids are interned to
+    integer positions, the children and parents of every node are kept as CSR
+    offset/index arrays, and node and edge attributes are stored as NumPy
+    columns instead of a dict per node. This keeps the memory footprint of a
+    hierarchy at a few arrays regardless of the number of nodes, and lets
+    traversal run over integer arrays instead of dicts of dicts.
+
+    A compact graph is immutable. Use :meth:`from_graph` and :meth:`to_graph`
+    to convert from and to the networkx backed :class:`Graph`.
+    '''
+
+    def __init__(self, ids, child_offsets, child_index, node_attrs=None,
+                 edge_attrs=None, id=None, graph_attrs=None):
+        self.ids = list(ids)
+        self.id = id
+        self.graph_attrs = dict(graph_attrs or {})
+        self._index = {n: i for i, n in enumerate(self.ids)}
+        if len(self._index) != len(self.ids):
+            raise ValueError("Node ids must be unique")
+        n = len(self.ids)
+        self.child_offsets = np.asarray(child_offsets, dtype=np.int64)
+        self.child_index = np.asarray(child_index, dtype=np.int32)
+        if len(self.child_offsets) != n + 1 or self.child_offsets[-1] != len(self.child_index):
+            raise ValueError("Child offsets do not match the number of nodes and edges")
+        self.node_attrs = node_attrs or {}
+        self.edge_attrs = edge_attrs or {}
+
+        # edge sources aligned with child_index, and the parent CSR
+        self.edge_source = np.repeat(np.arange(n, dtype=np.int32), np.diff(self.child_offsets))
+        order = np.argsort(self.child_index, kind="stable")
+        self.parent_index = self.edge_source[order]
+        self.parent_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.child_index, minlength=n), out=self.parent_offsets[1:])
+        self._values = {}
+        self._subtree = None
+
+    @classmethod
+    def from_graph(cls, G, attributes=True):
+        '''
+        Builds a compact graph from a networkx backed graph.
+
+        :param G: Graph to be converted
+        :type G: Graph
+        :param attributes: Copy node and edge attributes. If False, only the structure is kept, defaults to True
+        :type attributes: bool, optional
+        :return: Compact copy of the graph
+        :rtype: CompactGraph
+        '''
+        ids = list(G.nodes)
+        index = {n: i for i, n in enumerate(ids)}
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        targets, edicts = [], []
+        for i, (u, nbrs) in enumerate(G.adj.items()):
+            offsets[i + 1] = offsets[i] + len(nbrs)
+            for v, d in nbrs.items():
+                targets.append(index[v])
+                edicts.append(d)
+        if not attributes:
+            return cls(ids, offsets, np.array(targets, dtype=np.int32), id=getattr(G, "id", None))
+        return cls(ids, offsets, np.array(targets, dtype=np.int32),
+                   node_attrs=_columns([G.nodes[n] for n in ids]),
+                   edge_attrs=_columns(edicts),
+                   id=getattr(G, "id", None),
+                   graph_attrs=G.graph)
+
+    def to_graph(self):
+        '''
+        Converts back to a networkx backed graph. Node and edge order, node and
+        edge attributes and the graph id are preserved.
+
+        :return: Graph equivalent to this compact graph
+        :rtype: Graph
+        '''
+        G = Graph(id=self.id)
+        G.graph.update(self.graph_attrs)
+        G.add_nodes_from((n, _row(self.node_attrs, i)) for i, n in enumerate(self.ids))
+        G.add_edges_from((self.ids[u], self.ids[v], _row(self.edge_attrs, e))
+                         for e, (u, v) in enumerate(zip(self.edge_source.tolist(), self.child_index.tolist())))
+        return G
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id):
+        return node_id in self._index
+
+    def number_of_nodes(self):
+        return len(self.ids)
+
+    def number_of_edges(self):
+        return len(self.child_index)
+
+    def matches(self, G):
+        '''
+        Whether G has the nodes of this graph, in the same order, and as many
+        edges. This is a cheap check, O(nodes), that this graph still
+        describes the structure of G; the edges themselves are not compared.
+
+        :param G: Graph to be checked
+        :type G: Graph
+        :rtype: bool
+        '''
+        if isinstance(G, GraphOverlay) and not G.structure_changed():
+            G = G.base
+        # counting the edge view is cheaper than the degree sum of number_of_edges
+        edges = G.number_of_edges() if isinstance(G, CompactGraph) else len(G.edges)
+        return edges == len(self.child_index) and len(G) == len(self.ids) and list(G.nodes) == self.ids
+
+    def index(self, node_id):
+        '''
+        Returns the interned integer id of a node
+
+        :param node_id: ID of the node
+        :type node_id: str
+        :rtype: int
+        '''
+        return self._index[node_id]
+
+    def node_keys(self):
+        return list(self.ids)
+
+    def edge_keys(self):
+        ids = self.ids
+        return [(ids[u], ids[v]) for u, v in zip(self.edge_source.tolist(), self.child_index.tolist())]
+
+    def values(self, key="value"):
+        '''
+        Returns the given node attribute as a float column aligned to the node
+        order. Missing and non-numeric values are NaN.
+
+        :param key: Attribute to be returned, defaults to "value"
+        :type key: str, optional
+        :rtype: ndarray
+        '''
+        if key not in self._values:
+            col = self.node_attrs.get(key)
+            if col is None:
+                self._values[key] = np.full(len(self.ids), np.nan)
+            else:
+                self._values[key] = col.as_float()
+        return self._values[key]
+
+    def descendants(self, idx):
+        '''
+        Returns the interned ids of every node reachable from the given
+        interned ids, excluding the starting nodes unless they are reachable
+        through a cycle.
+
+        :param idx: Interned node ids to start from
+        :type idx: int or ndarray
+        :rtype: ndarray
+        '''
+        seen = np.zeros(len(self.ids), dtype=bool)
+        frontier = np.unique(np.atleast_1d(np.asarray(idx, dtype=np.int64)))
+        while frontier.size:
+            nxt = _csr(self.child_offsets, self.child_index, frontier)
+            nxt = np.unique(nxt[~seen[nxt]])
+            seen[nxt] = True
+            frontier = nxt.astype(np.int64)
+        return np.flatnonzero(seen)
+
+    def subtree_index(self):
+        '''
+        Returns the :class:`SubtreeIndex` of the graph, built on first use.
+
+        :rtype: SubtreeIndex
+        '''
+        if self._subtree is None:
+            self._subtree = SubtreeIndex(self)
+        return self._subtree
+
+    def get_children(self, node_id, recursive=False):
+        '''
+        Get the children nodes of the given node.
+
+        :param node_id: ID of the node whose children needs to be found
+        :type node_id: str
+        :param recursive: Condition to choose if the child nodes be found recursively till leaf node, defaults to False
+        :type recursive: bool, optional
+        :return: Returns all nodes reachable from the given node ID.
+        :rtype: set(recursive) OR list(non-recursive)
+        '''
+        i = self._index[node_id]
+        if recursive:
+            return {self.ids[j] for j in self.descendants(i).tolist()}
+        return [self.ids[j] for j in self.child_index[self.child_offsets[i]:self.child_offsets[i+1]].tolist()]
+
+    def get_parents(self, node_id):
+        '''
+        Get the parent nodes of the given node.
+
+        :param node_id: ID of the node whose parents needs to be found
+        :type node_id: str
+        :rtype: list
+        '''
+        i = self._index[node_id]
+        return [self.ids[j] for j in self.parent_index[self.parent_offsets[i]:self.parent_offsets[i+1]].tolist()]
+
+    def _adjacency(self):
+        n = len(self.ids)
+        return csr_matrix((np.ones(len(self.child_index), dtype=np.int8), self.child_index, self.child_offsets),
+                          shape=(n, n))
+
+    def validate(self):
+        '''
+        Validate if the graph is fully connected and acyclic.
+
+        :raises ValueError: Raises ValueError if graph is not connected
+        :raises ValueError: Raises ValueError if it's not a DAG
+        :return: Returns True if fully connected.
+        :rtype: bool
+        '''
+        if not self.is_connected():
+            raise ValueError("Graph is not connected")
+        if not self.is_dag():
+            raise ValueError("Not a DAG")
+        return True
+
+    def is_connected(self):
+        '''
+        Check if Graph is connected
+
+        :return: Returns True if the graph is connected, False otherwise.
+        :rtype: bool
+        '''
+        if len(self.ids) == 0:
+            raise nx.NetworkXPointlessConcept("Connectivity is undefined for the null graph.")
+        n, _ = connected_components(self._adjacency(), directed=True, connection="weak")
+        return n == 1
+
+    def _topological_order(self):
+        indegree = np.diff(self.parent_offsets).copy()
+        frontier = np.flatnonzero(indegree == 0)
+        order = []
+        while frontier.size:
+            order.append(frontier)
+            nxt = _csr(self.child_offsets, self.child_index, frontier)
+            np.subtract.at(indegree, nxt, 1)
+            nxt = np.unique(nxt)
+            frontier = nxt[indegree[nxt] == 0]
+        order = np.concatenate(order) if order else np.empty(0, dtype=np.int64)
+        return order, len(order) == len(self.ids)
+
+    def is_dag(self):
+        '''
+        Check if the graph is a Directed Acyclic Graph
+
+        :return: Returns True if graph is a DAG, else False
+        :rtype: bool
+        '''
+        return self._topological_order()[1]
+
+    def sort(self):
+        '''
+        Sort the graph in topological order.
+
+        :raises NetworkXUnfeasible: Raises if the graph contains a cycle
+        :return: Returns the nodes sorted in topological order
+        :rtype: Generator[Any]
+        '''
+        order, ok = self._topological_order()
+        if not ok:
+            raise nx.NetworkXUnfeasible("Graph contains a cycle or graph changed during iteration")
+        return (self.ids[i] for i in order.tolist())
+
+    def get_value_dict(self, key="value"):
+        col = self.node_attrs.get(key)
+        if col is None:
+            return {n: 0 for n in self.ids}
+        return {n: (col.get(i) if col.has(i) else 0) for i, n in enumerate(self.ids)}
+
+    def edge_distance(self, G, method="jaccard"):
+        '''
+        Calculate the edge distances using Jaccard method. See :meth:`Graph.edge_distance`.
+        '''
+        if method == "jaccard":
+            return jaccard(set(self.edge_keys()), set(_edge_keys(G)))
+        raise ValueError("Unknown method to compute distances")
+
+    def node_distance(self, G, method="jaccard"):
+        '''
+        Calculate the node distances using Jaccard method. See :meth:`Graph.node_distance`.
+        '''
+        if method == "jaccard":
+            return jaccard(set(self.ids), set(_node_keys(G)))
+        raise ValueError("Unknown method to compute distances")
+
+    def topological_distance(self, G, method="jaccard", weights=[.5,.5]):
+        '''
+        Calculate the topological distance. See :meth:`Graph.topological_distance`.
+        '''
+        ed = self.edge_distance(G, method)
+        nd = self.node_distance(G, method)
+        return sum([ed * weights[0], nd * weights[1]]) / 2
+
+    def value_distance(self, G, method="cossine", key="value", fillValue=0):
+        '''
+        Cosine distance between the values of the nodes both graphs share. See
+        :meth:`Graph.value_distance`.
+        '''
+        other = G.get_value_dict(key=key)
+        mine = self.get_value_dict(key=key)
+        isect = [n for n in self.ids if n in other]
+        arr1 = np.array([mine[n] for n in isect]).reshape(1, -1).astype(float)
+        arr2 = np.array([other[n] for n in isect]).reshape(1, -1).astype(float)
+        arr1[np.isnan(arr1)] = fillValue
+        arr2[np.isnan(arr2)] = fillValue
+        return 1 - cosine_similarity(arr1, arr2)
+
+    def weighted_distance(self, G, topological_method="jaccard", value_method="cossine", key="value", weights=[.5, .5]):
+        '''
+        Hybrid of the value and topological distance. See :meth:`Graph.weighted_distance`.
+        '''
+        td = self.topological_distance(G, method=topological_method, weights=[.5, .5])
+        vd = self.value_distance(G, method=value_method, key="value")
+        return ((vd + td) / 2)[0]
+
+    def similarity(self, *args, **kwargs):
+        return 1 - self.weighted_distance(*args, **kwargs)
+
+def _node_keys(G):
+    if isinstance(G, CompactGraph):
+        return G.ids
+    return G.nodes.keys()
+
+def _edge_keys(G):
+    if isinstance(G, CompactGraph):
+        return G.edge_keys()
+    return G.edges.keys()
+
+class SubtreeIndex():
+    '''
+    Pre-order interval index of a compact graph. When the graph is a forest,
+    nodes are numbered in pre-order (depth first, children in edge order) so
+    a node and all of its descendants occupy the contiguous positions
+    :code:`start[i]:end[i]`, and masking a subtree is a slice assignment.
+
+    Graphs where a node has several parents or that contain a cycle have no
+    such numbering; for those the subtree of every node is found with a
+    breadth first search on first use and cached.
+
+    :param C: Graph to be indexed
+    :type C: CompactGraph
+    '''
+
+    def __init__(self, C):
+        self.graph = C
+        n = len(C.ids)
+        indegree = np.diff(C.parent_offsets)
+        self.order = np.empty(n, dtype=np.int64)
+        self.start = np.empty(n, dtype=np.int64)
+        self.end = np.empty(n, dtype=np.int64)
+        self._subtrees = {}
+        self.is_forest = bool((indegree <= 1).all()) and self._number(np.flatnonzero(indegree == 0)) == n
+
+    def _number(self, roots):
+        '''Numbers the nodes reachable from the roots in pre-order and returns how many were numbered'''
+        offsets, children = self.graph.child_offsets, self.graph.child_index
+        pos = 0
+        stack = [(r, False) for r in roots[::-1].tolist()]
+        while stack:
+            i, done = stack.pop()
+            if done:
+                self.end[i] = pos
+                continue
+            self.start[i] = pos
+            self.order[pos] = i
+            pos += 1
+            stack.append((i, True))
+            stack.extend((c, False) for c in children[offsets[i]:offsets[i + 1]][::-1].tolist())
+        return pos
+
+    def subtree(self, i):
+        '''
+        Returns the interned ids of a node and all of its descendants.
+
+        :param i: Interned id of the node
+        :type i: int
+        :rtype: ndarray
+        '''
+        if self.is_forest:
+            return self.order[self.start[i]:self.end[i]]
+        if i not in self._subtrees:
+            self._subtrees[i] = np.union1d([i], self.graph.descendants(i))
+        return self._subtrees[i]
+
+    def mask(self, idx, rows=None):
+        '''
+        Masks the subtrees of the given nodes.
+
+        :param idx: Interned ids of the subtree roots
+        :type idx: Iterable[int]
+        :param rows: Boolean matrix with one row per model and one column per
+            root in idx, selecting the models in which each subtree is
+            masked. Defaults to a single model masking every subtree.
+        :type rows: ndarray, optional
+        :return: Mask in node order, of shape (n,) or (models, n) if rows is given
+        :rtype: ndarray[bool]
+        '''
+        idx = list(idx)
+        n = len(self.graph.ids)
+        if rows is None:
+            return self.mask(idx, np.ones((1, len(idx)), dtype=bool))[0]
+        rows = np.asarray(rows, dtype=bool)
+        out = np.zeros((rows.shape[0], n), dtype=bool)
+        if self.is_forest:
+            for k, i in enumerate(idx):
+                out[rows[:, k], self.start[i]:self.end[i]] = True
+            return out[:, self.start]
+        for k, i in enumerate(idx):
+            out[np.ix_(rows[:, k], self.subtree(i))] = True
+        return out
@@ -0,0 +1,115 @@
+import pytest
+import numpy as np
+import networkx as nx
+from .graph import Graph, Vertex, Edge
+from .compact import CompactGraph, structural_index
+
+def build_sample_graph():
+    '''build sample graph'''
+    g = Graph(id="sample")
+    g.add_vertex(Vertex('root'))
+    g.add_vertex(Vertex('a', value=1, attributes={"color": np.array([0, .5, 1, 1])}))
+    g.add_vertex(Vertex('b', value=2.5))
+    g.add_vertex(Vertex('c', value=None))
+    g.add_vertex(Vertex('d', value=4))
+    g.add_edge(Edge('root', 'a'))
+    g.add_edge(Edge('root', 'b'))
+    g.add_edge(Edge('a', 'c'))
+    g.add_edge(Edge('a', 'd', attributes={"edge_distance": .5}))
+    return g
+
+def test_compact_roundtrip():
+    g = build_sample_graph()
+    c = CompactGraph.from_graph(g)
+    assert c.number_of_nodes() == 5
+    assert c.number_of_edges() == 4
+
+    g2 = c.to_graph()
+    assert isinstance(g2, Graph)
+    assert g2.id == "sample"
+    assert list(g2.nodes) == list(g.nodes)
+    assert list(g2.edges) == list(g.edges)
+    for n in g.nodes:
+        assert g2.nodes[n].keys() == g.nodes[n].keys()
+        assert g2.nodes[n]["value"] == g.nodes[n]["value"]
+    assert np.array_equal(g2.nodes["a"]["color"], g.nodes["a"]["color"])
+    assert g2.edges["a", "d"] == {"edge_distance": .5}
+    assert g2.edges["root", "a"] == {}
+
+def test_compact_traversal():
+    g = build_sample_graph()
+    c = CompactGraph.from_graph(g)
+    assert c.get_children("root") == g.get_children("root")
+    assert c.get_children("root", recursive=True) == g.get_children("root", recursive=True)
+    assert c.get_children("d", recursive=True) == set()
+    assert c.get_parents("c") == ["a"]
+    assert c.validate() == True
+    assert c.is_dag() == True
+    assert list(c.sort())[0] == "root"
+    assert c.get_value_dict() == g.get_value_dict()
+    assert np.isnan(c.values()[c.index("c")])
+    assert c.values()[c.index("b")] == 2.5
+
+    g.add_edge(Edge('d', 'root'))
+    c = CompactGraph.from_graph(g)
+    assert c.is_dag() == False
+    with pytest.raises(nx.NetworkXUnfeasible):
+        list(c.sort())
+    with pytest.raises(ValueError):
+        c.validate()
+
+    g = build_sample_graph()
+    g.add_vertex(Vertex('island'))
+    with pytest.raises(ValueError):
+        CompactGraph.from_graph(g).validate()
+
+def test_compact_distances():
+    g1 = build_sample_graph()
+    g2 = build_sample_graph()
+    g2.remove_node('d')
+    c1 = CompactGraph.from_graph(g1)
+    c2 = CompactGraph.from_graph(g2)
+    assert c1.node_distance(c2) == g1.node_distance(g2)
+    assert c1.edge_distance(g2) == g1.edge_distance(g2)
+    assert c1.topological_distance(c2) == g1.topological_distance(g2)
+    assert np.allclose(c1.value_distance(c2), g1.value_distance(g2))
+
+def test_subtree_index():
+    g = build_sample_graph()
+    g.add_vertex(Vertex('e'))
+    g.add_edge(Edge('d', 'e'))
+    c = structural_index(g)
+    tree = c.subtree_index()
+    assert tree is c.subtree_index()
+    assert tree.is_forest
+    for n in g.nodes:
+        expected = {n} | g.get_children(n, recursive=True)
+        assert {c.ids[i] for i in tree.subtree(c.index(n))} == expected
+
+    idx = [c.index('b'), c.index('d')]
+    assert {c.ids[i] for i in np.flatnonzero(tree.mask(idx))} == {'b', 'd', 'e'}
+    rows = np.array([[True, False], [False, True], [False, False]])
+    m = tree.mask(idx, rows)
+    assert [{c.ids[i] for i in np.flatnonzero(r)} for r in m] == [{'b'}, {'d', 'e'}, set()]
+
+    g.add_edge(Edge('b', 'd'))
+    dag = structural_index(g).subtree_index()
+    assert not dag.is_forest
+    m = dag.mask(idx, rows)
+    assert [{c.ids[i] for i in np.flatnonzero(r)} for r in m] == [{'b', 'd', 'e'}, {'d', 'e'}, set()]
+
+def test_structural_index_cache():
+    g = build_sample_graph()
+    c = structural_index(g)
+    assert structural_index(g) is c
+    assert g.graph == {}
+    assert c.matches(g)
+
+    h = nx.relabel_nodes(g, {n: n.upper() for n in g.nodes})
+    assert structural_index(h) is not c
+    assert structural_index(h).ids == [n.upper() for n in g.nodes]
+    assert not c.matches(h)
+
+    g.add_vertex(Vertex('e'))
+    assert not c.matches(g)
+    assert structural_index(g).ids == list(g.nodes)
@@ -2,15 +2,22 @@
 # Main graph class
 from networkx.classes.digraph import DiGraph
 import networkx as nx
+import numpy as np
 import copy
+import logging
 import numbers
-from ..functions.distance import jaccard, mahalanobis
+from ..functions.distance import jaccard, mahalanobis, cosine_similarity
 from pydantic import BaseModel
 from enum import Enum
 from typing import List, Optional, Callable, Any
+from collections import ChainMap
+from collections.abc import Mapping, ItemsView, ValuesView
+from types import MappingProxyType
 import uuid
 from copy import deepcopy, copy
 
+logger = logging.getLogger(__name__)
+
 class NodeMask():
     '''
     A graph mask is a mask over an existing structural graph. It essentially
@@ -36,8 +43,8 @@ class NodeMask():
 
     def fit(self, G):
         sgraph = self._nmask ^ set(list(G.nodes.keys()))
-        mG = G.__class__()
-        mG.add_nodes_from((n, G.nodes[n]) for n in sgraph)
+        mG = G.base.__class__() if isinstance(G, GraphOverlay) else G.__class__()
+        mG.add_nodes_from((n, copy_attributes(G.nodes[n])) for n in sgraph)
         for e in list(G.edges):
             if e[0] in sgraph and e[1] in sgraph:
                 mG.add_edges_from([e])
@@ -48,6 +55,153 @@ class NodeMask():
                 mG.remove_edge(*e)
         return mG
 
+    def view(self, G):
+        '''
+        Returns the masked graph as a view instead of a copy. Building the view
+        costs O(\|mask\|); masked nodes and edges are filtered out when the view
+        is read. For a :class:`Graph` the result is a frozen networkx subgraph
+        view, for a :class:`GraphOverlay` it is a new overlay with the masked
+        nodes removed.
+
+        :param G: Graph to be masked
+        :type G: Graph or GraphOverlay
+        :return: Read-only view of the masked graph
+        :rtype: Graph or GraphOverlay
+        '''
+        if isinstance(G, GraphOverlay):
+            mG = G.overlay()
+            for n in self._nmask:
+                if mG.has_node(n):
+                    mG.remove_node(n)
+            for e in self._emask:
+                if mG.has_edge(*e):
+                    mG.remove_edge(*e)
+            return mG
+        mG = nx.subgraph_view(G, filter_node=nx.filters.hide_nodes(self._nmask),
+                              filter_edge=nx.filters.hide_diedges(self._emask))
+        mG.id = getattr(G, "id", None)
+        return mG
+
+def copy_attributes(attrs):
+    '''
+    Copies an attribute dict so that the copy shares no mutable value with
+    it: arrays are copied and other containers are deep copied (read-only
+    dict proxies become dicts), while immutable values (numbers, strings,
+    tuples...) are shared.
+
+    :param attrs: Node or edge attributes
+    :type attrs: dict
+    :rtype: dict
+    '''
+    return {k: v.copy() if isinstance(v, np.ndarray) else
+            deepcopy(dict(v)) if isinstance(v, MappingProxyType) else
+            deepcopy(v) if isinstance(v, (list, dict, set, bytearray)) else v
+            for k, v in attrs.items()}
+
+def copy_graph(G):
+    '''
+    Copies a graph, or materialises an overlay, without sharing any mutable
+    attribute with it (see :func:`copy_attributes`).
+
+    :param G: Graph to be copied
+    :type G: Graph or GraphOverlay
+    :rtype: Graph
+    '''
+    base = G.base if isinstance(G, GraphOverlay) else G
+    H = base.__class__(id=getattr(G, "id", None))
+    H.graph.update(copy_attributes(base.graph))
+    H.add_nodes_from((n, copy_attributes(d)) for n, d in G.nodes.items())
+    H.add_edges_from((u, v, copy_attributes(d)) for (u, v), d in G.edges.items())
+    return H
+
+def _read_only(v):
+    if isinstance(v, np.ndarray) and v.flags.writeable:
+        v = v.view()
+        v.flags.writeable = False
+    elif isinstance(v, dict):
+        v = MappingProxyType(v)
+    return v
+
+class _AttributeView(Mapping):
+    '''Read-only view of the attributes of a base graph node or edge, see :class:`GraphOverlay`'''
+
+    __slots__ = ("_d",)
+
+    def __init__(self, d):
+        self._d = d
+
+    def __getitem__(self, k):
+        return _read_only(self._d[k])
+
+    def __iter__(self):
+        return iter(self._d)
+
+    def __len__(self):
+        return len(self._d)
+
+    def __contains__(self, k):
+        return k in self._d
+
+    def __repr__(self):
+        return repr(self._d)
+
+def _as_list(items):
+    if isinstance(items, np.ndarray) and items.ndim == 1:
+        return items.tolist()
+    return list(items)
+
+def _check_attributes(names):
+    bad = Vertex._disallowed_keys.intersection(names)
+    if bad:
+        raise ValueError("key {} by attributes is not allowed".format(sorted(bad)[0]))
+
+def _columns(attrs, n):
+    columns = {k: _as_list(c) for k, c in (attrs or {}).items()}
+    _check_attributes(columns)
+    for k, c in columns.items():
+        if len(c) != n:
+            raise ValueError("Attribute {} is not aligned".format(k))
+    return columns
+
+def _node_tuples(vertices, values=None, attrs=None):
+    '''(id, attributes) of vertices, or of node ids with aligned values and attribute columns'''
+    vertices = _as_list(vertices)
+    if vertices and all(isinstance(n, Vertex) for n in vertices):
+        return [(n.id, n.to_dict()) for n in vertices]
+    values = [None] * len(vertices) if values is None else _as_list(values)
+    if len(values) != len(vertices):
+        raise ValueError("Expected one value per node")
+    columns = _columns(attrs, len(vertices))
+    if not columns:
+        return [(n, {"id": n, "value": v}) for n, v in zip(vertices, values)]
+    return [(n, {"id": n, "value": v, **{k: c[i] for k, c in columns.items()}})
+            for i, (n, v) in enumerate(zip(vertices, values))]
+
+def _edge_tuples(edges, attrs=None):
+    '''(u, v, attributes) of edges given as Edges, pairs, triples or an array'''
+    if isinstance(edges, np.ndarray):
+        if edges.ndim != 2 or edges.shape[1] != 2:
+            raise ValueError("Expected a (m x 2) array of node ids, got shape {}".format(edges.shape))
+        edges = edges.tolist()
+    edges = _as_list(edges)
+    columns = {k: _as_list(c) for k, c in (attrs or {}).items()}
+    for i, e in enumerate(edges):
+        if isinstance(e, Edge):
+            u, v, d = e.to_dict()
+            u = u.id if isinstance(u, Vertex) else u
+            v = v.id if isinstance(v, Vertex) else v
+        elif len(e) == 3:
+            u, v, d = e
+            if not isinstance(d, Mapping):
+                raise ValueError("Expected the attributes of edge ({}, {}) as a dict".format(u, v))
+        elif len(e) == 2:
+            (u, v), d = e, {}
+        else:
+            raise ValueError("Expected an edge as (u, v) or (u, v, attributes), got {}".format(e))
+        if columns:
+            d = {**d, **{k: c[i] for k, c in columns.items()}}
+        yield u, v, d
+
 class Graph(DiGraph):
 
     '''
@@ -76,7 +230,7 @@ class Graph(DiGraph):
     TODO: More tests coverage
     '''
     def __init__(self, id=None, *args, **kwargs):
-        super().__init__(self, *args, **kwargs)
+        super().__init__(*args, **kwargs)
         self.id = id
 
     def add_vertex(self, n):
@@ -112,6 +266,99 @@ class Graph(DiGraph):
         else:
             raise ValueError("Expected a Edge Type")
 
+    def add_vertices(self, vertices, values=None, attrs=None):
+        '''
+        Adds many vertices in one call, without building a :class:`Vertex` per node.
+
+        :param vertices: Vertices, or node ids as an iterable or an array
+        :type vertices: Iterable
+        :param values: Values aligned to the node ids, defaults to None. Ignored for vertices.
+        :type values: Iterable, optional
+        :param attrs: Node attributes by name, each aligned to the node ids, defaults to none
+        :type attrs: dict, optional
+        :raises ValueError: Raises ValueError if an attribute is named id or value
+        '''
+        super().add_nodes_from(_node_tuples(vertices, values, attrs))
+
+    def add_edges(self, edges, attrs=None):
+        '''
+        Adds many edges in one call, without building an :class:`Edge` per edge.
+
+        :param edges: Edges, (u, v) pairs or (u, v, attributes) tuples, or a (m x 2) array of node ids
+        :type edges: Iterable
+        :param attrs: Edge attributes by name, each aligned to edges, defaults to none
+        :type attrs: dict, optional
+        '''
+        super().add_edges_from(_edge_tuples(edges, attrs))
+
+    @classmethod
+    def from_arrays(cls, ids, values=None, parent_index=None, attrs=None, id=None):
+        '''
+        Builds a hierarchy from arrays: the node ids, their values, the
+        position of the parent of every node and node attribute columns. The
+        nodes and the edges are each added in one bulk call.
+
+        :param ids: Node ids
+        :type ids: Iterable
+        :param values: Values aligned to ids, defaults to None
+        :type values: Iterable, optional
+        :param parent_index: Position in ids of the parent of every node, negative for roots, defaults to no edges
+        :type parent_index: Iterable[int], optional
+        :param attrs: Node attributes by name, each aligned to ids, defaults to none
+        :type attrs: dict, optional
+        :param id: Id of the graph, defaults to None
+        :type id: Any, optional
+        :raises ValueError: Raises ValueError if the ids are not unique or parent_index is not aligned to ids
+        :rtype: Graph
+        '''
+        ids = _as_list(ids)
+        G = cls(id=id)
+        nodes = _node_tuples(ids, values, attrs)
+        if len(set(ids)) != len(ids):
+            raise ValueError("Expected unique node ids")
+        G.add_nodes_from(nodes)
+        if parent_index is not None:
+            parent = np.asarray(parent_index, dtype=np.int64)
+            if parent.shape != (len(ids),):
+                raise ValueError("Expected one parent position per node")
+            if (parent >= len(ids)).any():
+                raise ValueError("Parent positions must be below the number of nodes")
+            children = np.flatnonzero(parent >= 0)
+            G.add_edges_from(zip([ids[p] for p in parent[children].tolist()],
+                                 [ids[c] for c in children.tolist()]))
+        return G
+
+    @classmethod
+    def from_edge_list(cls, edges, values=None, attrs=None, edge_attrs=None, id=None):
+        '''
+        Builds a graph from a list of edges. Nodes are added in the order
+        they first appear in the edges, followed by the nodes of `values` or
+        `attrs` that are in no edge.
+
+        :param edges: Edges, (u, v) pairs or (u, v, attributes) tuples, or a (m x 2) array of node ids
+        :type edges: Iterable
+        :param values: Node values by node id, defaults to None
+        :type values: dict, optional
+        :param attrs: Node attributes by node id, defaults to none
+        :type attrs: dict[Any, dict], optional
+        :param edge_attrs: Edge attributes by name, each aligned to edges, defaults to none
+        :type edge_attrs: dict, optional
+        :param id: Id of the graph, defaults to None
+        :type id: Any, optional
+        :rtype: Graph
+        '''
+        edges = list(_edge_tuples(edges, edge_attrs))
+        values, attrs = values or {}, attrs or {}
+        ids = dict.fromkeys(n for u, v, _ in edges for n in (u, v))
+        ids.update(dict.fromkeys(values))
+        ids.update(dict.fromkeys(attrs))
+        G = cls(id=id)
+        for a in attrs.values():
+            _check_attributes(a)
+        G.add_nodes_from((n, {"id": n, "value": values.get(n), **attrs.get(n, {})}) for n in ids)
+        G.add_edges_from(edges)
+        return G
+
     def get_children(self, node_id, recursive=False):
         '''
         Get the children nodes of the given node.
@@ -157,6 +404,15 @@ class Graph(DiGraph):
         '''
         return nx.is_connected(self.to_undirected())
 
+    def overlay(self):
+        '''
+        Returns a copy on write view of the graph. See :class:`GraphOverlay`.
+
+        :return: Overlay sharing this graph read-only
+        :rtype: GraphOverlay
+        '''
+        return GraphOverlay(self)
+
     def edge_distance(self, G, method="jaccard"):
         '''
         Calculate the edge distances using Jaccard method.
@@ -306,6 +562,440 @@ class Graph(DiGraph):
                 return "top"
         return None
 
+class GraphOverlay():
+    '''
+    Copy on write view over a :class:`Graph`. The base graph is shared
+    read-only and the overlay records only the delta on top of it: added
+    nodes and edges, removed nodes and edges and changed node attributes. Reading a node
+    or edge that was not changed returns a read-only view of the base
+    attributes, so no attribute dict (or NumPy array stored in one) is copied.
+    Arrays are read through read-only views and dicts through read-only
+    proxies, so they cannot be changed through the overlay; other mutable
+    attribute values (such as lists) are shared and must not be mutated.
+
+    This replaces deep copies of the structural graph in the transform path,
+    so the memory of a linked graph or an RK model is proportional to its
+    delta instead of the whole hierarchy. The base graph must not be mutated
+    while overlays over it are alive. Use :meth:`materialize` to get an
+    independent :class:`Graph`.
+
+    NOT threadsafe
+    '''
+
+    def __init__(self, base, id=None):
+        self.base = base
+        self.id = base.id if id is None else id
+        self._added_nodes = {}
+        self._added_edges = {}
+        self._added_succ = {}
+        self._removed = set()
+        self._removed_edges = set()
+        self._updates = {}
+
+    @classmethod
+    def from_delta(cls, base, nodes=None, edges=None, id=None):
+        '''
+        Builds an overlay from a delta known to be valid for its base graph,
+        such as one decoded from a store, without checking it: every node of
+        nodes and every endpoint of edges must be a node of base, and no edge
+        of edges may be an edge of base.
+
+        :param base: Base graph
+        :type base: Graph
+        :param nodes: Changed attributes by node, the dicts are kept, defaults to none
+        :type nodes: dict, optional
+        :param edges: Added edges as (u, v, attributes) tuples, the dicts are kept, defaults to none
+        :type edges: Iterable, optional
+        :param id: Id of the overlay, defaults to the id of base
+        :type id: Any, optional
+        :rtype: GraphOverlay
+        '''
+        o = cls(base, id=id)
+        if nodes:
+            o._updates = nodes
+        if edges:
+            added, succ = o._added_edges, o._added_succ
+            for u, v, d in edges:
+                added[u, v] = d
+                succ.setdefault(u, []).append(v)
+        return o
+
+    def overlay(self):
+        '''
+        Returns a new overlay over the same base graph, starting from a copy of this delta.
+
+        :rtype: GraphOverlay
+        '''
+        o = GraphOverlay(self.base, id=self.id)
+        o._added_nodes = {n: dict(d) for n, d in self._added_nodes.items()}
+        o._added_edges = {e: dict(d) for e, d in self._added_edges.items()}
+        o._added_succ = {u: list(v) for u, v in self._added_succ.items()}
+        o._removed = set(self._removed)
+        o._removed_edges = set(self._removed_edges)
+        o._updates = {n: dict(d) for n, d in self._updates.items()}
+        return o
+
+    @property
+    def nodes(self):
+        return _OverlayNodeView(self)
+
+    @property
+    def edges(self):
+        return _OverlayEdgeView(self)
+
+    @property
+    def graph(self):
+        '''Read-only view of the graph attributes of the base graph'''
+        return MappingProxyType(self.base.graph)
+
+    @property
+    def adj(self):
+        '''Successors of every node with the attributes of the edge to them, as :code:`Graph.adj`'''
+        edges = self.edges
+        return {u: {v: edges[u, v] for v in self.successors(u)} for u in self.nodes}
+
+    def copy(self):
+        '''
+        Returns an independent copy of the overlay, see :meth:`overlay`.
+
+        :rtype: GraphOverlay
+        '''
+        return self.overlay()
+
+    def structure_changed(self):
+        '''
+        Whether nodes or edges were added to or removed from the base graph.
+        An overlay that only changed attributes has the structure of its base.
+
+        :rtype: bool
+        '''
+        if self._removed or self._removed_edges or self._added_nodes:
+            return True
+        return next(self.added_edges(), None) is not None
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, n):
+        return self.has_node(n)
+
+    def has_node(self, n):
+        return n not in self._removed and (n in self._added_nodes or n in self.base)
+
+    def has_edge(self, u, v):
+        if not self.has_node(u) or not self.has_node(v) or (u, v) in self._removed_edges:
+            return False
+        return (u, v) in self._added_edges or self.base.has_edge(u, v)
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def added_edges(self):
+        '''
+        Yields the edges of the overlay that are not edges of the base graph, with their attributes.
+
+        :rtype: Iterator[tuple[tuple, dict]]
+        '''
+        removed, has_edge = self._removed, self.base.has_edge
+        for e, d in self._added_edges.items():
+            if removed and (e[0] in removed or e[1] in removed):
+                continue
+            if not has_edge(*e):
+                yield e, d
+
+    def number_of_edges(self):
+        return len(self.edges)
+
+    def add_vertex(self, n):
+        '''
+        Adds a vertex to the overlay. See :meth:`Graph.add_vertex`.
+
+        :param n: Node vertex to be added to the graph.
+        :type n: Vertex
+        :raises ValueError: Raises an error if the input is not of the Vertex Type
+        '''
+        if not isinstance(n, Vertex):
+            raise ValueError("Expected a Vertex Type")
+        self._removed.discard(n.id)
+        if n.id in self.base and n.id not in self._added_nodes:
+            self._updates.setdefault(n.id, {}).update(n.to_dict())
+        else:
+            self._added_nodes.setdefault(n.id, {}).update(n.to_dict())
+
+    def add_edge(self, e):
+        '''
+        Adds an edge to the overlay. See :meth:`Graph.add_edge`.
+
+        :param e: Edge  node to be added to the graph.
+        :type e: Edge
+        :raises ValueError: Raises an error if the input is not of the Edge Type
+        '''
+        if not isinstance(e, Edge):
+            raise ValueError("Expected a Edge Type")
+        u, v, attrs = e.to_dict()
+        if isinstance(u, Vertex):
+            u = u.id
+        if isinstance(v, Vertex):
+            v = v.id
+        self._add_edge(u, v, attrs)
+
+    def add_edges(self, edges, attrs=None):
+        '''
+        Adds many edges to the overlay. See :meth:`Graph.add_edges`.
+
+        :param edges: Edges, (u, v) pairs or (u, v, attributes) tuples, or a (m x 2) array of node ids
+        :type edges: Iterable
+        :param attrs: Edge attributes by name, each aligned to edges, defaults to none
+        :type attrs: dict, optional
+        '''
+        for u, v, d in _edge_tuples(edges, attrs):
+            self._add_edge(u, v, d)
+
+    def _add_edge(self, u, v, attrs):
+        for n in (u, v):
+            if not self.has_node(n):
+                self._removed.discard(n)
+                self._added_nodes.setdefault(n, {})
+        e = (u, v)
+        self._removed_edges.discard(e)
+        if e not in self._added_edges:
+            self._added_edges[e] = copy_attributes(self.base.edges[u, v]) if self.base.has_edge(u, v) else {}
+            self._added_succ.setdefault(u, []).append(v)
+        self._added_edges[e].update(attrs)
+
+    def remove_node(self, n):
+        '''
+        Removes a node and all edges touching it from the overlay.
+
+        :param n: ID of the node to be removed
+        :type n: str
+        :raises KeyError: Raises KeyError if the node is not in the graph
+        '''
+        if not self.has_node(n):
+            raise KeyError(n)
+        self._removed.add(n)
+        self._added_nodes.pop(n, None)
+        self._updates.pop(n, None)
+
+    def remove_edge(self, u, v):
+        '''
+        Removes an edge from the overlay.
+
+        :param u: Source node
+        :type u: str
+        :param v: Target node
+        :type v: str
+        :raises KeyError: Raises KeyError if the edge is not in the graph
+        '''
+        if not self.has_edge(u, v):
+            raise KeyError((u, v))
+        if (u, v) in self._added_edges:
+            del self._added_edges[(u, v)]
+            self._added_succ[u].remove(v)
+        if self.base.has_edge(u, v):
+            self._removed_edges.add((u, v))
+
+    def update_node(self, n, **attrs):
+        '''
+        Changes attributes of a node. Only the changed attributes are stored.
+
+        :param n: ID of the node
+        :type n: str
+        '''
+        if not self.has_node(n):
+            raise KeyError(n)
+        if n in self._added_nodes:
+            self._added_nodes[n].update(attrs)
+        else:
+            self._updates.setdefault(n, {}).update(attrs)
+
+    def successors(self, n):
+        if not self.has_node(n):
+            raise nx.NetworkXError("The node {} is not in the digraph.".format(n))
+        in_base = n in self.base
+        if in_base:
+            for v in self.base.successors(n):
+                if v not in self._removed and (n, v) not in self._removed_edges:
+                    yield v
+        for v in self._added_succ.get(n, []):
+            if v not in self._removed and not (in_base and self.base.has_edge(n, v)):
+                yield v
+
+    def get_children(self, node_id, recursive=False):
+        '''
+        Get the children nodes of the given node. See :meth:`Graph.get_children`.
+        '''
+        if not recursive:
+            return list(self.successors(node_id))
+        seen, stack = set(), [node_id]
+        while stack:
+            for c in self.successors(stack.pop()):
+                if c not in seen:
+                    seen.add(c)
+                    stack.append(c)
+        seen.discard(node_id)
+        return seen
+
+    def neighbors(self, n):
+        return self.successors(n)
+
+    def get_value_dict(self, key="value"):
+        return {n: d.get(key, 0) for n, d in self.nodes.items()}
+
+    def _topology(self):
+        '''Graph of the nodes and edges of the overlay, without attributes'''
+        H = self.base.__class__(id=self.id)
+        H.add_nodes_from(self.nodes)
+        H.add_edges_from(self.edges)
+        return H
+
+    def validate(self):
+        '''
+        Validates the overlay. See :meth:`Graph.validate`.
+        '''
+        return self._topology().validate()
+
+    def is_connected(self):
+        return self._topology().is_connected()
+
+    def is_dag(self):
+        return self._topology().is_dag()
+
+    def sort(self, *args, **kwargs):
+        return self._topology().sort(*args, **kwargs)
+
+    def materialize(self):
+        '''
+        Builds an independent graph with the delta applied. Mutable
+        attributes are copied (see :func:`copy_attributes`), so the graph
+        shares none with the base graph.
+
+        :return: Graph equal to the overlay
+        :rtype: Graph
+        '''
+        return copy_graph(self)
+
+class _OverlayNodeView(Mapping):
+
+    def __init__(self, overlay):
+        self._o = overlay
+
+    def __getitem__(self, n):
+        o = self._o
+        if n in o._removed:
+            raise KeyError(n)
+        if n in o._added_nodes:
+            return o._added_nodes[n]
+        attrs = _AttributeView(o.base.nodes[n])
+        if n in o._updates:
+            return ChainMap(o._updates[n], attrs)
+        return attrs
+
+    def __iter__(self):
+        o = self._o
+        for n in o.base.nodes:
+            if n not in o._removed and n not in o._added_nodes:
+                yield n
+        yield from o._added_nodes
+
+    def __len__(self):
+        o = self._o
+        return len(o.base) - sum(1 for n in o._removed if n in o.base) + \
+            sum(1 for n in o._added_nodes if n not in o.base)
+
+    def __contains__(self, n):
+        return self._o.has_node(n)
+
+    def items(self):
+        return _OverlayItems(self)
+
+    def values(self):
+        return _OverlayValues(self)
+
+    def _items(self):
+        o = self._o
+        removed, added, updates = o._removed, o._added_nodes, o._updates
+        for n, d in o.base.nodes.items():
+            if n not in removed and n not in added:
+                u = updates.get(n)
+                yield n, _AttributeView(d) if u is None else ChainMap(u, _AttributeView(d))
+        yield from added.items()
+
+    def __call__(self, data=False, default=None):
+        '''Nodes, with their attributes or one of them, as :code:`Graph.nodes(data=...)`'''
+        if data is False:
+            return list(self)
+        if data is True:
+            return list(self.items())
+        return [(n, d.get(data, default)) for n, d in self.items()]
+
+class _OverlayEdgeView(Mapping):
+
+    def __init__(self, overlay):
+        self._o = overlay
+
+    def __getitem__(self, e):
+        o = self._o
+        u, v = e
+        if u in o._removed or v in o._removed or e in o._removed_edges:
+            raise KeyError(e)
+        if e in o._added_edges:
+            return o._added_edges[e]
+        return _AttributeView(o.base.edges[u, v])
+
+    def __iter__(self):
+        o = self._o
+        removed = o._removed
+        for e in o.base.edges:
+            if e[0] not in removed and e[1] not in removed and e not in o._removed_edges:
+                yield e
+        for e in o._added_edges:
+            if e[0] not in removed and e[1] not in removed and not o.base.has_edge(*e):
+                yield e
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, e):
+        return self._o.has_edge(*e)
+
+    def items(self):
+        return _OverlayItems(self)
+
+    def values(self):
+        return _OverlayValues(self)
+
+    def _items(self):
+        o = self._o
+        removed, removed_edges, added = o._removed, o._removed_edges, o._added_edges
+        for u, v, d in o.base.edges(data=True):
+            e = (u, v)
+            if u not in removed and v not in removed and e not in removed_edges:
+                yield e, added[e] if e in added else _AttributeView(d)
+        yield from o.added_edges()
+
+    def __call__(self, data=False, default=None):
+        '''Edges, with their attributes or one of them, as :code:`Graph.edges(data=...)`'''
+        if data is False:
+            return list(self)
+        if data is True:
+            return [(u, v, d) for (u, v), d in self.items()]
+        return [(u, v, d.get(data, default)) for (u, v), d in self.items()]
+
+class _OverlayItems(ItemsView):
+    '''Items of an overlay view, read in one pass over the base graph'''
+
+    def __iter__(self):
+        return self._mapping._items()
+
+class _OverlayValues(ValuesView):
+
+    def __iter__(self):
+        return (d for _, d in self._mapping._items())
+
 class Edge():
     ''' For an undirected graph, an unordered pair of nodes that specify a line
     joining these two nodes are said to form an edge which represents a
@@ -319,6 +1009,8 @@ class Edge():
 
     TODO: Consider moving this to pydantic. '''
 
+    __slots__ = ("u", "v", "w", "type", "attributes")
+
     def __init__(self, u, v, w=1, type=None, attributes={}):
         self.u = u
         self.v = v
@@ -357,11 +1049,14 @@ class Vertex():
 
     TODO: Consider moving this to pydantic.
     '''
+    __slots__ = ("value", "id", "attributes")
+
+    _disallowed_keys = frozenset(['id', 'value'])
+
     def __init__(self, id: str, value=None, attributes={}):
         self.value = value
         self.id = id
         self.attributes = attributes
-        self._disallowed_keys = set(['id', 'value'])
 
     def add_attribute(self, k: str, v: Any, unsafe=True):
         '''
@@ -4,7 +4,8 @@ import pytest
 from .graph import (
     Graph,
     Vertex,
-    Edge
+    Edge,
+    NodeMask
 )
 
 from ..functions.distance import (
@@ -92,3 +93,148 @@ def test_sort():
 def test_signature():
     assert Graph.get_signature(mahalanobis) == "mag"
     assert Graph.get_signature(jaccard) == "top"
+
+def test_overlay():
+    comp = make_graph_components()
+    g = Graph(id="base")
+    for n in comp[0]:
+        g.add_vertex(n)
+    for e in comp[1]:
+        g.add_edge(e)
+
+    o = g.overlay()
+    assert o.id == "base"
+    assert len(o.nodes) == 4 and len(o.edges) == 3
+
+    o.add_edge(Edge("b", "c", attributes={"edge_distance": 1}))
+    o.update_node("a", value=5)
+    o.remove_node("root")
+    assert len(g.edges) == 3 and "root" in g.nodes
+    assert g.nodes["a"].get("value") is None
+    assert o.nodes["a"]["value"] == 5
+    assert o.edges["b", "c"] == {"edge_distance": 1}
+    assert ("root", "a") not in o.edges
+    assert set(o.edges) == {("a", "b"), ("a", "c"), ("b", "c")}
+    assert o.get_children("a", recursive=True) == {"b", "c"}
+    assert len(o) == 3
+
+    # unchanged nodes are read-only views of the base
+    with pytest.raises(TypeError):
+        o.nodes["b"]["value"] = 1
+
+    o2 = o.overlay()
+    o2.remove_node("c")
+    assert "c" in o.nodes and "c" not in o2.nodes
+
+    m = o.materialize()
+    assert isinstance(m, Graph)
+    assert set(m.edges) == set(o.edges)
+    assert m.nodes["a"]["value"] == 5
+
+def test_overlay_graph_api():
+    from .compact import structural_index
+    comp = make_graph_components()
+    g = Graph(id="base")
+    for n in comp[0]:
+        g.add_vertex(n)
+    for e in comp[1]:
+        g.add_edge(e)
+
+    o = g.overlay()
+    o.update_node("a", value=5)
+    assert not o.structure_changed()
+    assert structural_index(o) is structural_index(g)
+    assert o.nodes(data="value") == [(n, 5 if n == "a" else d.get("value")) for n, d in g.nodes.items()]
+    assert o.edges(data=True) == list(g.edges(data=True))
+    assert o.validate() and o.is_dag() and o.is_connected()
+    assert list(o.sort()) == list(g.sort())
+
+    c = o.copy()
+    c.add_edge(Edge("c", "root"))
+    assert c.structure_changed() and not o.structure_changed()
+    assert not c.is_dag()
+    assert structural_index(c).edge_keys() == list(c.edges)
+
+def test_overlay_attributes():
+    import numpy as np
+    g = Graph()
+    g.add_vertex(Vertex("a", attributes={"color": np.ones(4), "meta": {"k": 1}}))
+    g.add_vertex(Vertex("b", attributes={"color": np.ones(4)}))
+    g.add_edge(Edge("a", "b"))
+    o = g.overlay()
+
+    # attributes of the base cannot be changed through an overlay
+    with pytest.raises(ValueError):
+        o.nodes["a"]["color"][3] = 0
+    with pytest.raises(TypeError):
+        o.nodes["a"]["meta"]["k"] = 2
+    assert np.array_equal(o.nodes["a"]["color"], g.nodes["a"]["color"])
+
+    # materialised and fitted graphs own their attributes
+    for h in (o.materialize(), NodeMask(nmasks=["b"]).fit(g), NodeMask(nmasks=["b"]).fit(o)):
+        h.nodes["a"]["color"][3] = 0
+        h.nodes["a"]["meta"]["k"] = 2
+    assert g.nodes["a"]["color"][3] == 1
+    assert g.nodes["a"]["meta"] == {"k": 1}
+
+def test_bulk_constructors():
+    import numpy as np
+    comp = make_graph_components()
+    g = Graph(id="g")
+    for n in comp[0]:
+        g.add_vertex(n)
+    for e in comp[1]:
+        g.add_edge(e)
+
+    ids = np.array(["root", "a", "b", "c"])
+    h = Graph.from_arrays(ids, values=[None, 1., 2., 3.], parent_index=np.array([-1, 0, 1, 1]),
+                          attrs={"size": np.arange(4)}, id="g")
+    assert h.id == "g"
+    assert list(h.nodes) == list(g.nodes)
+    assert set(h.edges) == set(g.edges)
+    assert h.nodes["b"] == {"id": "b", "value": 2., "size": 2}
+    assert type(h.nodes["b"]["size"]) is int
+    with pytest.raises(ValueError):
+        Graph.from_arrays(ids, parent_index=[-1, 0])
+    with pytest.raises(ValueError):
+        Graph.from_arrays(ids, attrs={"value": [1, 2, 3, 4]})
+    with pytest.raises(ValueError):
+        Graph.from_arrays(["a", "a"])
+    with pytest.raises(ValueError):
+        Graph.from_arrays(ids, parent_index=[-1, 0, 1, 4])
+
+    # arrays of edges must have two columns, rows are never read as (u, v, attributes)
+    for bad in (np.array([["a", "b", "c"]]), np.array(["a", "b"])):
+        with pytest.raises(ValueError):
+            Graph().add_edges(bad)
+    with pytest.raises(ValueError):
+        Graph().add_edges([("a", "b", "c")])
+
+    e = Graph.from_edge_list(np.array([["root", "a"], ["a", "b"], ["a", "c"]]),
+                             values={"a": 1, "d": 4}, attrs={"c": {"color": "red"}},
+                             edge_attrs={"w": [1, 2, 3]})
+    assert list(e.nodes) == ["root", "a", "b", "c", "d"]
+    assert e.nodes["d"] == {"id": "d", "value": 4}
+    assert e.nodes["c"]["color"] == "red"
+    assert e.edges["a", "c"] == {"w": 3}
+
+    f = Graph()
+    f.add_vertices(comp[0])
+    f.add_vertices(["e"], values=[5])
+    f.add_edges(comp[1])
+    f.add_edges([("a", "e"), ("e", "b", {"w": 2})], attrs={"edge_distance": [.5, .25]})
+    assert f.nodes["root"] == g.nodes["root"]
+    assert f.nodes["e"]["value"] == 5
+    assert f.edges["e", "b"] == {"w": 2, "edge_distance": .25}
+    assert set(f.edges) == set(g.edges) | {("a", "e"), ("e", "b")}
+
+    o = g.overlay()
+    o.add_edges([("b", "c")], attrs={"edge_distance": [1.]})
+    assert o.edges["b", "c"] == {"edge_distance": 1.}
+
+def test_slots():
+    v, e = Vertex("a"), Edge("a", "b")
+    for obj in (v, e):
+        assert not hasattr(obj, "__dict__")
+        with pytest.raises(AttributeError):
+            obj.extra = 1
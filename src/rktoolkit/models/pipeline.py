@@ -3,14 +3,29 @@ from .graph import (
     NodeMask,
 )
 
-from .rkmodel import RKModel
+from .rkmodel import RKModel, RKModelBatch
+from .compact import CompactGraph, structural_index
+from .cache import TransformCache
+from .graph import Edge
 from .functions import *
 from typing import List, Optional, Callable, TypedDict
 from .graph import Vertex
-from ..functions.filters import RangeFilter
+from ..functions.filters import FilterBank, RangeFilter
+import numpy as np
+import pandas as pd
+import multiprocessing
+import concurrent.futures as futures
+import asyncio
+import collections
+import itertools
+import os
 import copy
 import numbers
 
+# Pipeline snapshot of a pool worker. Published once per worker by the pool
+# initializer, inherited without pickling when the pool forks.
+_WORKER = {}
+
 class RKPipeline():
     '''
     Class implementing the R-K Pipeline explained above
@@ -18,10 +33,70 @@ class RKPipeline():
     def __init__(self,
                  filter_map: dict,
                  linkage_map: dict,
-                 structural_graph = None):
+                 structural_graph = None,
+                 cache = None):
         self.filter_map = filter_map
         self.linkage_map = linkage_map
         self.structural_graph = structural_graph
+        self.cache = cache
+        self._index = None
+        self._bank = None
+
+    def structure(self, G):
+        '''
+        Returns the structural index used to mask G. The index is built once
+        and held by the pipeline for every graph with the same nodes, in the
+        same order, and as many edges (see :meth:`CompactGraph.matches`); it
+        is built again for a graph with another structure. Call
+        :meth:`invalidate` after rewiring the edges of the graphs transformed.
+
+        :param G: Graph to be transformed
+        :type G: Graph
+        :rtype: CompactGraph
+        '''
+        index = getattr(self, "_index", None)
+        if index is None or not index.matches(G):
+            index = self._index = CompactGraph.from_graph(G, attributes=False)
+        return index
+
+    @property
+    def filter_bank(self):
+        '''
+        The filter map compiled into a :class:`FilterBank`. It is compiled on
+        first use and kept while the filters are unchanged: the bank is keyed
+        on the node, type and knobs of every filter, so it is compiled again
+        after any change to the filter map or to a knob, however it is set.
+
+        :rtype: FilterBank
+        '''
+        key = [(k, _signature(f)) for k, f in self.filter_map.items()]
+        if getattr(self, "_bank", None) is None or self._bank_key != key:
+            self._bank = FilterBank(self.filter_map)
+            self._bank_key = key
+        return self._bank
+
+    def set_knob(self, col, v):
+        '''
+        Sets one knob of the pipeline.
+
+        :param col: Knob, named as in :meth:`get_w`, e.g. "filter_min_A" or "linkage_theta_root"
+        :type col: str
+        :param v: Value of the knob
+        :type v: Any
+        '''
+        kind, knb, key = _parse_knob(col)
+        if kind == "filter":
+            self.filter_map[key].set_knob(knb, v)
+        if kind == "linkage":
+            self.linkage_map[key].set_knob(knb, v)
+
+    def invalidate(self):
+        '''
+        Drops the structural index and the filter bank held by the pipeline,
+        see :meth:`structure` and :attr:`filter_bank`.
+        '''
+        self._index = None
+        self._bank = None
 
     def check_valid_node(self, node) -> bool:
         '''
@@ -53,18 +128,230 @@ class RKPipeline():
         '''
         if is_base:
             self.structural_graph = G
-        gC = copy.deepcopy(G)
+        gC = G.overlay()
         for k, v in self.linkage_map.items():
             gC = v.link(G)
-        masks = set()
-        for n, f in self.filter_map.items():
-            if self.check_valid_node(self.structural_graph.nodes[n]):
-                if f.filter(gC.nodes[n]):
-                    for child in G.get_children(n, recursive=True):
-                        masks.add(child)
-                    masks.add(n)
+        bank = self.filter_bank
+        checked = np.array([self.check_valid_node(self.structural_graph.nodes[n]) for n in bank.nodes], dtype=bool)
+        values, present = bank.gather(gC)
+        nodes = [gC.nodes[n] for n in bank.nodes] if bank.fallback else None
+        # unchecked nodes are never filtered, so their missing values are not counted
+        fired = checked & bank.filter_array(values, present | ~checked, nodes=nodes)
+        index = self.structure(G)
+        mask = index.subtree_index().mask(index.index(bank.nodes[i]) for i in np.flatnonzero(fired).tolist())
+        masks = [index.ids[j] for j in np.flatnonzero(mask).tolist()]
+
+        return RKModel(self.structural_graph, masks, gC.edges)
 
-        return RKModel(self.structural_graph, list(masks), gC.edges)
+    def transform_cached(self, G, key=None, ontology_transform=None):
+        '''
+        Transforms a graph (or a row, given an ontology transform) like
+        :meth:`transform`, reusing the intermediate results cached for its key
+        the last time it was transformed. Only the parts depending on knobs
+        that changed since are recomputed: a filter whose knobs changed is
+        re-evaluated on its own node and only the masks are rebuilt, and when
+        the θ of a linker changes the cached sibling distances are compared
+        against the new θ instead of being computed again. The row is only
+        transformed into a graph on a cache miss.
+
+        A filter or linker is considered changed when its type or knobs
+        change. The graph is always the structural graph, as with
+        :code:`is_base=True`, and only the last linker of the linkage map is
+        evaluated since it is the one whose edges are kept.
+
+        Results are kept in :attr:`cache`, a :class:`TransformCache` shared
+        by the copies made with :meth:`remap`. Use its :code:`invalidate`
+        method after a cached graph or row changes.
+
+        :param G: Graph, or row if ontology_transform is given
+        :type G: Graph
+        :param key: Key of the graph or row in the cache, defaults to the id of the graph
+        :type key: Any, optional
+        :param ontology_transform: Transform building the hierarchy of a row, defaults to None
+        :type ontology_transform: BaseOntologyTransform, optional
+        :raises ValueError: Raises ValueError if no key is given and the graph has no id
+        :return: R-K Model of the graph.
+        :rtype: RKModel
+        '''
+        if key is None:
+            key = getattr(G, "id", None) if ontology_transform is None else None
+        if key is None:
+            raise ValueError("Graph has no id. Please provide a key")
+        if getattr(self, "cache", None) is None:
+            self.cache = TransformCache()
+        state = self.cache.get(key)
+        if state is None:
+            state = _RowState(G if ontology_transform is None else ontology_transform.transform(G))
+            self.cache.put(key, state)
+        self.structural_graph = state.G
+        model = state.transform(self)
+        self.cache.resize(key, state.measure())
+        return model
+
+    def transform_batch(self, df, ontology_transform, is_base=True):
+        '''
+        Transforms every row of a DataFrame into an R-K Model. The result is
+        the same as calling :code:`transform(ontology_transform.transform(row))`
+        for every row, but the hierarchy is built once and the filters and
+        linkers are evaluated as NumPy operations over all rows.
+
+        Filters are evaluated as one :class:`FilterBank` over all rows and
+        linkers providing :code:`link_batch` are vectorized; they are given
+        the values of all rows as floats, where they are numbers, and as
+        they were read. Other linkers are evaluated row by row. Linkage edges of
+        a batch only carry the :code:`edge_distance` attribute.
+
+        :param df: Data with one column per node of the ontology
+        :type df: DataFrame
+        :param ontology_transform: Transform building the hierarchy of a row
+        :type ontology_transform: BaseOntologyTransform
+        :param is_base: If the hierarchy is the structural graph, defaults to True
+        :type is_base: bool, optional
+        :raises ValueError: If a linker cannot link the values of the rows in a batch
+        :return: Batch of R-K Models, one per row.
+        :rtype: RKModelBatch
+        '''
+        template = ontology_transform.template
+        G = template.build()
+        ids = list(template.ids)
+        index = {n: i for i, n in enumerate(ids)}
+        value_nodes = np.zeros(len(ids), dtype=bool)
+        value_nodes[template.value_index] = True
+        values, present, valid, fvalues = _frame_values(df, ids, value_nodes)
+        if is_base:
+            self.structural_graph = G
+
+        bank = self.filter_bank
+        cols = np.array([index[n] for n in bank.nodes], dtype=np.int64)
+        if is_base:
+            checked = valid[:, cols]
+        else:
+            checked = np.array([self.check_valid_node(self.structural_graph.nodes[n]) for n in bank.nodes], dtype=bool)
+            checked = np.broadcast_to(checked, (len(df), len(cols)))
+        nodes = [G.nodes[n] for n in bank.nodes] if bank.fallback else None
+        fired = checked & bank.filter_array(fvalues[:, cols], present[:, cols] | ~checked, nodes=nodes)
+
+        roots = np.flatnonzero(fired.any(axis=0))
+        masks = self.structure(G).subtree_index().mask(cols[roots].tolist(), fired[:, roots])
+
+        batch = RKModelBatch(G, values, value_nodes, masks, _no_links(), index=df.index)
+        for k, v in self.linkage_map.items():
+            if hasattr(v, "link_batch"):
+                batch.set_links(v.link_batch(G, fvalues, valid, raw=values))
+            else:
+                batch.set_links(_link_rows(v, batch, index))
+        return batch
+
+    def transform_many(self, graphs_or_rows, ontology_transform=None, n_workers=None,
+                       chunksize=64, ordered=True):
+        '''
+        Transforms many graphs (or rows, given an ontology transform) in a
+        process pool and streams the R-K Models back.
+
+        The pipeline and the ontology transform are published once to every
+        worker when the pool starts. Where the platform supports it the pool
+        forks, so workers inherit a frozen snapshot of the pipeline instead of
+        receiving a pickled copy; only the inputs and the resulting models
+        cross process boundaries, in chunks of `chunksize` items. At most two
+        chunks per worker are in flight, so memory stays bounded for long
+        inputs.
+
+        :param graphs_or_rows: Graphs, or rows if ontology_transform is given. A DataFrame is iterated by row.
+        :type graphs_or_rows: Iterable
+        :param ontology_transform: Transform applied to every row before the pipeline, defaults to None
+        :type ontology_transform: BaseOntologyTransform, optional
+        :param n_workers: Number of worker processes, defaults to the number of CPUs. 1 runs in process.
+        :type n_workers: int, optional
+        :param chunksize: Number of items sent to a worker at once, defaults to 64
+        :type chunksize: int, optional
+        :param ordered: Yield models in input order. Otherwise yield as chunks complete, defaults to True
+        :type ordered: bool, optional
+        :return: Generator of R-K Models
+        :rtype: Generator[RKModel]
+        '''
+        if isinstance(graphs_or_rows, pd.DataFrame):
+            graphs_or_rows = (row for _, row in graphs_or_rows.iterrows())
+        n_workers = n_workers or os.cpu_count() or 1
+        if n_workers == 1:
+            for item in graphs_or_rows:
+                yield self.transform(item if ontology_transform is None else ontology_transform.transform(item))
+            return
+
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+        pool = futures.ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx,
+                                           initializer=_init_worker,
+                                           initargs=(self, ontology_transform))
+        try:
+            pending = collections.deque()
+            for chunk in _chunks(graphs_or_rows, chunksize):
+                pending.append(pool.submit(_transform_chunk, chunk))
+                if len(pending) >= 2 * n_workers:
+                    yield from _drain(pending, ordered)
+            while pending:
+                yield from _drain(pending, ordered)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def stream(self, rows, ontology_transform, batch_size=1024, writer=None):
+        '''
+        Lazily transforms an unbounded iterable of rows. Rows are pulled from
+        the source in micro-batches of `batch_size`, transformed with
+        :meth:`transform_batch` and yielded one model at a time, so at most
+        one micro-batch is held in memory.
+
+        The source is only read when the consumer asks for more models. If a
+        writer is given, every model is written before it is yielded, so a
+        slow writer throttles how fast rows are read.
+
+        :param rows: Rows as mappings or Series, e.g. a CSV reader or a live feed
+        :type rows: Iterable
+        :param ontology_transform: Transform building the hierarchy of a row
+        :type ontology_transform: BaseOntologyTransform
+        :param batch_size: Number of rows transformed at once, defaults to 1024
+        :type batch_size: int, optional
+        :param writer: Writer every model is written to, defaults to None
+        :type writer: RKModelWriter, optional
+        :raises IOError: Raises IOError if the writer fails to write a model
+        :return: Generator of R-K Models
+        :rtype: Generator[RKModel]
+        '''
+        for chunk in _chunks(rows, batch_size):
+            yield from _write(self.transform_batch(_frame(chunk), ontology_transform), writer)
+
+    async def astream(self, rows, ontology_transform, batch_size=1024, writer=None):
+        '''
+        Asynchronous variant of :meth:`stream` for asyncio based ingestion.
+        Accepts a synchronous or an asynchronous iterable of rows. Micro-batches
+        are transformed (and written) in the default executor, so the event
+        loop is not blocked while a batch is processed.
+
+        :param rows: Rows as mappings or Series
+        :type rows: Iterable or AsyncIterable
+        :param ontology_transform: Transform building the hierarchy of a row
+        :type ontology_transform: BaseOntologyTransform
+        :param batch_size: Number of rows transformed at once, defaults to 1024
+        :type batch_size: int, optional
+        :param writer: Writer every model is written to, defaults to None
+        :type writer: RKModelWriter, optional
+        :return: Asynchronous generator of R-K Models
+        :rtype: AsyncGenerator[RKModel]
+        '''
+        loop = asyncio.get_running_loop()
+
+        def run(chunk):
+            return list(_write(self.transform_batch(_frame(chunk), ontology_transform), writer))
+
+        chunk = []
+        async for row in _aiter(rows):
+            chunk.append(row)
+            if len(chunk) >= batch_size:
+                for model in await loop.run_in_executor(None, run, chunk):
+                    yield model
+                chunk = []
+        if chunk:
+            for model in await loop.run_in_executor(None, run, chunk):
+                yield model
 
     def remap(self, vmap, cols):
         '''
@@ -77,17 +364,84 @@ class RKPipeline():
         return: Returns a remapped R-K Pipeline Class
         :rtype: RKPipeline
         '''
-        pcopy = copy.deepcopy(self)
+        cache = getattr(self, "cache", None)
+        index = getattr(self, "_index", None)
+        # the copy shares the cache and the structural index
+        pcopy = copy.deepcopy(self, {id(cache): cache, id(index): index})
         for i, v in enumerate(vmap):
-            col = cols[i]
-            knb = col.split("_", maxsplit=2)[1]
-            key = col.split("_", maxsplit=2)[2]
-            if col.split("_")[0] == "filter":
-                pcopy.filter_map[key].set_knob(knb, v)
-            if col.split("_")[0] == "linkage":
-                pcopy.linkage_map[key].set_knob(knb, v)
+            pcopy.set_knob(cols[i], v)
         return pcopy
 
+    def sweep(self, graphs_or_rows, knob, lo, hi, ontology_transform=None):
+        '''
+        Sweeps one knob from lo to hi and yields every distinct set of models
+        along the way, in the style of a filtration. A range filter's models
+        only change when min or max crosses the value of its node, and a
+        linker's models only change when θ crosses a sibling distance, so
+        these breakpoints are collected and sorted once and the pipeline is
+        only re-evaluated at them, for the rows they belong to.
+
+        Yields (interval, models) pairs. The interval is the range of knob
+        values over which the models are valid: filter knobs change at a
+        breakpoint (intervals closed on the left) and θ just above it
+        (intervals closed on the right). The first models hold every row,
+        later ones only the rows whose model changed, keyed by the index of
+        the DataFrame or the position of the graph.
+
+        :param graphs_or_rows: Graphs, or rows if ontology_transform is given. A DataFrame is iterated by row.
+        :type graphs_or_rows: Iterable
+        :param knob: Knob to sweep, named as in :meth:`get_w`, e.g. "filter_min_A" or "linkage_theta_root"
+        :type knob: str
+        :param lo: Start of the sweep
+        :type lo: float
+        :param hi: End of the sweep
+        :type hi: float
+        :param ontology_transform: Transform applied to every row before the pipeline, defaults to None
+        :type ontology_transform: BaseOntologyTransform, optional
+        :raises ValueError: Raises ValueError if the knob has no breakpoints to sweep over
+        :return: Generator of intervals and the models valid over them
+        :rtype: Generator[tuple[Interval, dict]]
+        '''
+        kind, name, key = _parse_knob(knob)
+        if isinstance(graphs_or_rows, pd.DataFrame):
+            keys, items = list(graphs_or_rows.index), [row for _, row in graphs_or_rows.iterrows()]
+        else:
+            items = list(graphs_or_rows)
+            keys = list(range(len(items)))
+        p = self.remap([lo], [knob])
+        p.cache = None
+        target = p.filter_map[key] if kind == "filter" else p.linkage_map[key]
+        if kind == "filter" and not (isinstance(target, RangeFilter) and name in ("min", "max")):
+            raise ValueError("Can only sweep the min and max of a range filter")
+        if kind == "linkage" and not (hasattr(target, "sibling_distances") and name == "theta"):
+            raise ValueError("Can only sweep the theta of a linker providing sibling distances")
+
+        states = [_RowState(g if ontology_transform is None else ontology_transform.transform(g)) for g in items]
+        events = {}
+        for i, state in enumerate(states):
+            for b in state.breakpoints(p, kind, key):
+                events.setdefault(b, []).append(i)
+        left = kind == "filter"
+        if left:
+            bounds = sorted(b for b in events if lo < b <= hi)
+        else:
+            bounds = sorted(b for b in events if lo <= b < hi)
+
+        current = [state.transform(p) for state in states]
+        start, models, first = lo, dict(zip(keys, current)), True
+        for j, b in enumerate(bounds):
+            p.set_knob(knob, b if left else (bounds[j + 1] if j + 1 < len(bounds) else hi))
+            changed = {}
+            for i in events[b]:
+                m = states[i].transform(p)
+                if m.edges is not current[i].edges or set(m.mask) != set(current[i].mask):
+                    current[i] = changed[keys[i]] = m
+            if not changed:
+                continue
+            yield pd.Interval(start, b, closed="left" if left else "both" if first else "right"), models
+            start, models, first = b, changed, False
+        yield pd.Interval(start, hi, closed="both" if left or first else "right"), models
+
     def get_w(self):
         '''
         Method to get the vertices and columns (weights) for mapping.
@@ -107,3 +461,214 @@ class RKPipeline():
                 cols.append('{}_{}_{}'.format('linkage', i, k))
                 vmap.append(l)
         return vmap, cols
+
+def _parse_knob(col):
+    '''Splits a knob column of :meth:`RKPipeline.get_w` into kind, knob and key'''
+    kind, knb, key = col.split("_", maxsplit=2)
+    return kind, knb, key
+
+# Rough footprint of a node or edge of a networkx graph, used to size cache entries
+_GRAPH_ITEM_BYTES = 512
+
+def _signature(f):
+    knobs = f.get_knobs()
+    return (type(f), tuple(sorted(knobs.items())) if knobs else None)
+
+class _RowState():
+    '''
+    Intermediate results of one graph cached by :meth:`RKPipeline.transform_cached`
+    '''
+
+    def __init__(self, G):
+        self.G = G
+        self.index = structural_index(G)
+        self.fired = {} # node -> (filter signature, fired)
+        self.pairs = {} # linker key -> (u, v, d) of every sibling pair, or None
+        self.links = None # (linker signature, edges)
+        self.model = None # (signature, model)
+        self.nbytes = self.measure()
+
+    def measure(self):
+        '''Approximate size of the state in bytes'''
+        size = _GRAPH_ITEM_BYTES * (self.G.number_of_nodes() + self.G.number_of_edges())
+        for pairs in self.pairs.values():
+            if pairs is not None:
+                size += sum(a.nbytes for a in pairs)
+        return size
+
+    def transform(self, pipeline):
+        signature, roots = [], []
+        for n, f in pipeline.filter_map.items():
+            sig = _signature(f)
+            cached = self.fired.get(n)
+            if cached is None or cached[0] != sig:
+                cached = (sig, self._fire(pipeline, n, f))
+                self.fired[n] = cached
+            signature.append((n, sig))
+            if cached[1]:
+                roots.append(self.index.index(n))
+        linker = None
+        if pipeline.linkage_map:
+            linker = list(pipeline.linkage_map.items())[-1]
+        link_sig = None if linker is None else (linker[0], _signature(linker[1]))
+        signature = (tuple(signature), link_sig)
+        if self.model is not None and self.model[0] == signature:
+            return self.model[1]
+
+        if self.links is None or self.links[0] != link_sig:
+            self.links = (link_sig, self.G.overlay().edges if linker is None else self._link(*linker))
+        mask = self.index.subtree_index().mask(roots)
+        model = RKModel(self.G, [self.index.ids[j] for j in np.flatnonzero(mask).tolist()], self.links[1])
+        self.model = (signature, model)
+        return model
+
+    def breakpoints(self, pipeline, kind, key):
+        '''Knob values at which the model of the row may change, see :meth:`RKPipeline.sweep`'''
+        if kind == "filter":
+            node = self.G.nodes[key]
+            if not pipeline.check_valid_node(node) or np.isnan(node["value"]):
+                return []
+            return [node["value"]]
+        if list(pipeline.linkage_map.keys())[-1] != key:
+            return []
+        if key not in self.pairs:
+            self.pairs[key] = self._sibling_distances(pipeline.linkage_map[key])
+        if self.pairs[key] is None:
+            raise ValueError("Can only sweep theta over scalar node values")
+        return np.unique(self.pairs[key][2]).tolist()
+
+    def _fire(self, pipeline, n, f):
+        node = self.G.nodes[n]
+        if not pipeline.check_valid_node(node):
+            return False
+        bank = FilterBank({n: f})
+        values, present = bank.gather(self.G)
+        return bool(bank.filter_array(values, present, nodes=[node] if bank.fallback else None)[0])
+
+    def _link(self, key, linker):
+        if key not in self.pairs:
+            self.pairs[key] = self._sibling_distances(linker)
+        pairs = self.pairs[key]
+        if pairs is None:
+            return linker.link(self.G).edges
+        u, v, d = pairs
+        keep = np.flatnonzero(d < linker.theta)
+        ids = self.index.ids
+        gC = self.G.overlay()
+        for a, b, dist in zip(u[keep].tolist(), v[keep].tolist(), d[keep]):
+            gC.add_edge(Edge(u=ids[a], v=ids[b], attributes={"edge_distance": dist}))
+        return gC.edges
+
+    def _sibling_distances(self, linker):
+        '''Distances of every sibling pair, if the linker and the values allow computing them once for any θ'''
+        if not hasattr(linker, "sibling_distances") or not hasattr(linker, "theta"):
+            return None
+        values = [self.G.nodes[n].get("value") for n in self.index.ids]
+        valid = np.array([isinstance(v, numbers.Number) for v in values], dtype=bool)
+        if any(isinstance(v, (list, tuple, np.ndarray)) or (ok and not isinstance(v, numbers.Real))
+               for v, ok in zip(values, valid)):
+            return None
+        fvalues = np.array([v if ok else np.nan for v, ok in zip(values, valid)], dtype=np.float64)
+        _, u, v, d = linker.sibling_distances(self.G, fvalues[None, :], valid[None, :])
+        return u, v, d
+
+def _frame_values(df, ids, value_nodes):
+    '''
+    Gathers the node values of every row of df, aligned to ids. Returns the
+    raw values (None where a node has no value), whether a value is present,
+    whether it is a number, and the values as floats (NaN where not a number).
+    '''
+    shape = (len(df), len(ids))
+    values = np.full(shape, None, dtype=object)
+    present = np.zeros(shape, dtype=bool)
+    valid = np.zeros(shape, dtype=bool)
+    fvalues = np.full(shape, np.nan)
+    for j, n in enumerate(ids):
+        if not value_nodes[j] or n not in df.columns:
+            continue
+        col = df[n]
+        values[:, j] = col.to_numpy(dtype=object)
+        if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+            present[:, j] = True
+            # pd.NA of nullable columns is present but not a number
+            valid[:, j] = ~col.isna().to_numpy() if pd.api.types.is_extension_array_dtype(col) else True
+            fvalues[:, j] = col.to_numpy(dtype=np.float64, na_value=np.nan)
+            continue
+        for i, v in enumerate(values[:, j]):
+            present[i, j] = v is not None
+            if isinstance(v, numbers.Number):
+                valid[i, j] = True
+                fvalues[i, j] = v
+    return values, present, valid, fvalues
+
+def _no_links():
+    return (np.empty(0, dtype=np.int64),) * 3 + (np.empty(0, dtype=np.float64),)
+
+def _link_rows(linker, batch, index):
+    '''Links every row of a batch with a linker that has no vectorized path'''
+    rows, us, vs, ds = [], [], [], []
+    for i in range(len(batch)):
+        g = batch.graph(i)
+        for (u, v), attrs in linker.link(g).edges.items():
+            if not g.has_edge(u, v):
+                rows.append(i)
+                us.append(index[u])
+                vs.append(index[v])
+                ds.append(attrs.get("edge_distance", np.nan))
+    return (np.array(rows, dtype=np.int64), np.array(us, dtype=np.int64),
+            np.array(vs, dtype=np.int64), np.array(ds, dtype=np.float64))
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    chunk = list(itertools.islice(it, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(it, size))
+
+def _frame(rows):
+    '''
+    Builds a DataFrame from rows without turning missing values into NaN.
+    Keys missing from a row and None values stay None, as they would when
+    the row is transformed on its own.
+    '''
+    rows = [dict(r) for r in rows]
+    columns = {}
+    for k in dict.fromkeys(k for r in rows for k in r):
+        col = pd.Series([r.get(k) for r in rows], dtype=object)
+        columns[k] = col if any(v is None for v in col) else col.infer_objects()
+    return pd.DataFrame(columns)
+
+def _write(models, writer):
+    for model in models:
+        if writer is not None and writer.write(model) is False:
+            raise IOError("Failed to write model")
+        yield model
+
+async def _aiter(rows):
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+def _init_worker(pipeline, ontology_transform):
+    _WORKER["pipeline"] = pipeline
+    _WORKER["ontology_transform"] = ontology_transform
+
+def _transform_chunk(chunk):
+    pipeline = _WORKER["pipeline"]
+    ontology_transform = _WORKER["ontology_transform"]
+    if ontology_transform is not None:
+        chunk = [ontology_transform.transform(row) for row in chunk]
+    return [pipeline.transform(g) for g in chunk]
+
+def _drain(pending, ordered):
+    '''Yields the models of one completed chunk, the oldest one if ordered'''
+    if ordered:
+        done = pending.popleft()
+    else:
+        done = next(futures.as_completed(pending))
+        pending.remove(done)
+    yield from done.result()
+
@@ -56,3 +56,232 @@ def build_sample_graph():
     g.add_edge(root_a)
     g.add_edge(root_b)
     return g
+
+def make_frame(n=20, seed=0):
+    import pandas as pd
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.random((n, 5)), columns=["A", "A_1", "A_2", "B_1", "B_2"])
+    df.loc[df.index[::4], "A_2"] = np.nan
+    df["B_3"] = pd.Series([None if i % 3 == 0 else rng.random() for i in range(n)], dtype=object)
+    return df
+
+def make_ontology():
+    from ..functions.htg_transformers import BaseOntologyTransform
+    return BaseOntologyTransform(mapping={
+        "root": {
+            "A": {"A_1": {}, "A_2": {}, "A_3": {}},
+            "B": {"B_1": {}, "B_2": {}, "B_3": {}},
+        }
+    })
+
+def assert_same_model(m1, m2):
+    assert set(m1.mask) == set(m2.mask)
+    assert list(m1.G.nodes) == list(m2.G.nodes)
+    for n in m1.G.nodes:
+        v1, v2 = m1.G.nodes[n]["value"], m2.G.nodes[n]["value"]
+        assert v1 is v2 or v1 == v2 or (v1 is not None and v2 is not None and v1 != v1 and v2 != v2)
+    assert dict(m1.edges.items()) == dict(m2.edges.items())
+
+def test_transform_batch():
+    import pandas as pd
+    df = make_frame()
+    hft = make_ontology()
+    filters = {n: RangeFilter(min=.2, max=.9) for n in ["A", "A_2", "B_3"]}
+    pipeline = RKPipeline(filters, {"root": SimpleChildLinker(theta=.3)})
+    batch = pipeline.transform_batch(df, hft)
+    assert len(batch) == len(df)
+    for i, (_, row) in enumerate(df.iterrows()):
+        assert_same_model(pipeline.transform(hft.transform(row)), batch[i])
+
+    df["A_1"] = pd.array([None if i % 5 == 0 else i % 3 for i in range(len(df))], dtype="Int64")
+    pipeline.filter_map["A_1"] = RangeFilter(min=.5, max=1.5)
+    batch = pipeline.transform_batch(df, hft)
+    for i, (_, row) in enumerate(df.iterrows()):
+        assert_same_model(pipeline.transform(hft.transform(row)), batch[i])
+
+def test_transform_bool_values():
+    # bool values are linked with distance 1 by every linkage method
+    hft = make_ontology()
+    row = {"A_1": True, "A_2": False, "A_3": True, "B_1": 1.5, "B_2": False}
+    expected = None
+    for method in ["pairwise", "sort", "kdtree"]:
+        pipeline = RKPipeline({"A": RangeFilter(min=.2, max=.9)}, {"root": SimpleChildLinker(theta=2, method=method)})
+        edges = dict(pipeline.transform(hft.transform(row)).edges.items())
+        assert edges[("A_2", "A_1")] == {"edge_distance": 1.0}
+        assert expected is None or edges == expected
+        expected = edges
+
+def test_transform_structure():
+    df = make_frame(5)
+    hft = make_ontology()
+    pipeline = RKPipeline({"A": RangeFilter(min=.2, max=.9)}, {"root": SimpleChildLinker(theta=.3)})
+    graphs = [hft.transform(row) for _, row in df.iterrows()]
+    pipeline.transform(graphs[0])
+    index = pipeline.structure(graphs[0])
+    for g in graphs[1:]:
+        pipeline.transform(g)
+        assert pipeline.structure(g) is index
+        assert "_rk_structural_index" not in g.graph
+    assert pipeline.remap([.1], ["filter_min_A"]).structure(graphs[0]) is index
+
+    pipeline.invalidate()
+    assert pipeline.structure(graphs[0]) is not index
+    g = graphs[0].copy()
+    g.remove_node("B_3")
+    assert pipeline.structure(g).ids == list(g.nodes)
+
+def test_filter_bank():
+    pipeline = RKPipeline({"A": RangeFilter(min=.2, max=.9)}, {"root": SimpleChildLinker(theta=.3)})
+    bank = pipeline.filter_bank
+    assert pipeline.filter_bank is bank
+    pipeline.set_knob("linkage_theta_root", .5)
+    assert pipeline.filter_bank is bank
+    pipeline.set_knob("filter_max_A", .5)
+    assert pipeline.filter_bank is not bank
+    assert pipeline.filter_bank.max.tolist() == [.5]
+    p = pipeline.remap([.3], ["filter_min_A"])
+    assert p.filter_bank.min.tolist() == [.3]
+    assert pipeline.filter_bank.min.tolist() == [.2]
+
+    # knobs set on a filter directly and new filters are never served stale
+    pipeline.filter_map["A"].set_knob("min", .4)
+    assert pipeline.filter_bank.min.tolist() == [.4]
+    pipeline.filter_map["B"] = RangeFilter(min=.1, max=.3)
+    assert pipeline.filter_bank.nodes == ["A", "B"]
+    bank = pipeline.filter_bank
+    assert pipeline.filter_bank is bank
+
+def test_transform_many():
+    df = make_frame(30, seed=1)
+    hft = make_ontology()
+    pipeline = RKPipeline({"A": RangeFilter(min=.2, max=.9)}, {"root": SimpleChildLinker(theta=.3)})
+    serial = list(pipeline.transform_many(df, hft, n_workers=1))
+    parallel = list(pipeline.transform_many(df, hft, n_workers=2, chunksize=4))
+    assert len(parallel) == len(df)
+    for m1, m2 in zip(serial, parallel):
+        assert_same_model(m1, m2)
+
+    unordered = list(pipeline.transform_many(df, hft, n_workers=2, chunksize=4, ordered=False))
+    key = lambda m: m.G.nodes["A_1"]["value"]
+    assert sorted(map(key, unordered)) == sorted(map(key, serial))
+
+def test_stream():
+    import asyncio
+    df = make_frame(25, seed=2)
+    hft = make_ontology()
+    pipeline = RKPipeline({"A": RangeFilter(min=.2, max=.9)}, {"root": SimpleChildLinker(theta=.3)})
+    expected = list(pipeline.transform_batch(df, hft))
+
+    class ListWriter():
+        def __init__(self):
+            self.models = []
+
+        def write(self, model):
+            self.models.append(model)
+            return True
+
+    pulled = []
+    def rows():
+        for _, row in df.iterrows():
+            pulled.append(row)
+            yield row
+
+    writer = ListWriter()
+    stream = pipeline.stream(rows(), hft, batch_size=7, writer=writer)
+    next(stream)
+    assert len(pulled) == 7 and len(writer.models) == 1
+    models = [writer.models[0]] + list(stream)
+    assert len(models) == len(df) == len(writer.models)
+    for m1, m2 in zip(expected, models):
+        assert_same_model(m1, m2)
+
+    async def collect():
+        return [m async for m in pipeline.astream((r for _, r in df.iterrows()), hft, batch_size=10)]
+    for m1, m2 in zip(expected, asyncio.run(collect())):
+        assert_same_model(m1, m2)
+
+def test_transform_cached():
+    import pytest
+    from .cache import TransformCache
+    df = make_frame(15, seed=3)
+    hft = make_ontology()
+    filters = {n: RangeFilter(min=.2, max=.9) for n in ["A", "A_2", "B_3"]}
+    pipeline = RKPipeline(filters, {"root": SimpleChildLinker(theta=.3)}, cache=TransformCache())
+    vmap, cols = pipeline.get_w()
+    changes = [{}, {"filter_min_A": .5}, {"linkage_theta_root": .1}, {"filter_max_B_3": .4, "linkage_theta_root": .6}]
+    for change in changes:
+        vmap = [change.get(c, v) for c, v in zip(cols, vmap)]
+        p = pipeline.remap(vmap, cols)
+        assert p.cache is pipeline.cache
+        for i, row in df.iterrows():
+            assert_same_model(p.transform(hft.transform(row)), p.transform_cached(row, key=i, ontology_transform=hft))
+    assert pipeline.cache.misses == len(df)
+    assert pipeline.cache.hits == (len(changes) - 1) * len(df)
+    assert p.transform_cached(None, key=0) is p.transform_cached(None, key=0)
+
+    pipeline.cache.invalidate(0)
+    assert 0 not in pipeline.cache
+    with pytest.raises(ValueError):
+        pipeline.transform_cached(df.iloc[0], ontology_transform=hft)
+
+    small = TransformCache(max_bytes=pipeline.cache.nbytes // 3)
+    p = RKPipeline(filters, {"root": SimpleChildLinker(theta=.3)}, cache=small)
+    for i, row in df.iterrows():
+        p.transform_cached(row, key=i, ontology_transform=hft)
+    assert 0 < len(small) < len(df)
+    assert small.nbytes <= small.max_bytes
+
+def test_sweep():
+    import pytest
+    df = make_frame(12, seed=4)
+    hft = make_ontology()
+    filters = {n: RangeFilter(min=.2, max=.9) for n in ["A", "A_2", "B_3"]}
+    pipeline = RKPipeline(filters, {"root": SimpleChildLinker(theta=.3)})
+    for knob, closed in [("filter_min_A", "left"), ("filter_max_B_3", "left"), ("linkage_theta_root", "right")]:
+        current, steps = {}, list(pipeline.sweep(df, knob, 0, 1, ontology_transform=hft))
+        assert len(steps[0][1]) == len(df)
+        assert steps[0][0].left == 0 and steps[-1][0].right == 1
+        for k, (interval, models) in enumerate(steps):
+            assert models
+            current.update(models)
+            edge = k == len(steps) - 1 if closed == "left" else k == 0
+            assert interval.closed == ("both" if edge else closed)
+            if k > 0:
+                assert interval.left == steps[k - 1][0].right
+            points = [(interval.left + interval.right) / 2]
+            points += [interval.left] if interval.closed_left else []
+            points += [interval.right] if interval.closed_right else []
+            for x in points:
+                p = pipeline.remap([x], [knob])
+                for i, row in df.iterrows():
+                    assert_same_model(p.transform(hft.transform(row)), current[i])
+        assert len(steps) > 2
+
+    with pytest.raises(ValueError):
+        list(RKPipeline({"A": OddFilter()}, {}).sweep(df, "filter_min_A", 0, 1, hft))
+
+class OddFilter():
+    def get_knobs(self):
+        return {"min": 0}
+
+    def set_knob(self, knb, v):
+        pass
+
+def test_transform_batch_vectors():
+    import numpy as np
+    import pytest
+    df = make_frame(4)
+    df["A_1"] = pd_objects([np.zeros(2), np.ones(2), .5, None])
+    hft = make_ontology()
+    pipeline = RKPipeline({}, {"root": SimpleChildLinker(theta=.3, method="kdtree")})
+    with pytest.raises(ValueError):
+        pipeline.transform_batch(df, hft)
+    pipeline.linkage_map["root"].method = "sort"
+    batch = pipeline.transform_batch(df, hft)
+    for i, (_, row) in enumerate(df.iterrows()):
+        assert_same_model(pipeline.transform(hft.transform(row)), batch[i])
+
+def pd_objects(values):
+    import pandas as pd
+    return pd.Series(values, dtype=object)
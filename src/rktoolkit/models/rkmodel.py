@@ -1,22 +1,315 @@
-import copy
 import numbers
-from .graph import Edge, NodeMask
+import numpy as np
+from .graph import Edge, NodeMask, copy_graph
+from .compact import structural_index
 
 class RKModel():
-    
-    def __init__(self, G, mask, edges):
+    '''
+    An RK model is a mask over a structural graph G together with the edges
+    of the linked graph. The edges are typically the edge view of a
+    :class:`GraphOverlay` over G, so a model shares G instead of holding its
+    own copy of it. G is shared by every model built from it and must be
+    treated as read-only; the overlay returned by :meth:`get` can be mutated
+    without changing it.
+    '''
+
+    def __init__(self, G, mask, edges, id=None):
         self.G = G
         self.mask = mask
         self.edges = edges
+        self.id = id
+
+    @property
+    def mask(self):
+        return self._mask
+
+    @mask.setter
+    def mask(self, mask):
+        self._mask = mask
+        self._view = None
+
+    @property
+    def edges(self):
+        return self._edges
+
+    @edges.setter
+    def edges(self, edges):
+        self._edges = edges
+        self._view = None
+
+    def invalidate(self):
+        '''
+        Drops the cached graph of :meth:`get`. Needed only after mutating the
+        mask or edges in place; assigning them invalidates the cache.
+        '''
+        self._view = None
+
+    def get(self):
+        '''
+        Get the Graph for RKModel: a copy on write :class:`GraphOverlay` over
+        G holding the linkage edges, with the masked nodes removed. G is not
+        copied. The overlay is built on the first call and cached until the
+        mask or the edges change. Every call returns a new copy of the cached
+        delta, O(\|mask\| + linkage edges), so the result can be mutated
+        without changing the cache or G; use :meth:`view` to read the graph
+        without copying it, and :meth:`GraphOverlay.materialize` to get a
+        :class:`Graph`.
+
+        :return: Returns the masked, linked graph
+        :rtype: GraphOverlay
+        '''
+        return self.view().overlay()
+
+    def view(self):
+        '''
+        Returns the cached overlay of :meth:`get` itself instead of a copy,
+        for reading the masked, linked graph. It must not be mutated.
+
+        :return: Read-only masked, linked graph
+        :rtype: GraphOverlay
+        '''
+        if self._view is None:
+            gC = getattr(self.edges, "_o", None)
+            if gC is None or gC.base is not self.G:
+                gC = self.G.overlay()
+                for k,v in self.edges.items():
+                    if not self.G.has_edge(*k):
+                        gC.add_edge(Edge(*k, attributes=v))
+            self._view = NodeMask(nmasks=self.mask).view(gC)
+        return self._view
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_view"] = None
+        return state
+
+class CompactRKModel():
+    '''
+    Memory compact RK model. Stores the masked nodes as a packed bit array
+    over the node order of the structural graph, the linkage edges (edges of
+    the linked graph that are not structural edges) as an int32 (k x 2)
+    array of node positions with a float64 :code:`edge_distance` column, and
+    a reference to the structural graph, which is shared by all models built
+    from it. The full :class:`RKModel` and its graph are materialised on
+    demand.
+
+    Models whose graph is not the structural graph itself, such as the rows
+    of a pipeline, also keep their node values: a packed bit array of the
+    nodes holding a value, a float64 array of the numeric values and a dict,
+    by node position, of the other values (None if there are none).
+
+    Linkage edge attributes other than :code:`edge_distance` are not kept.
+    '''
+
+    __slots__ = ("G", "mask_bits", "link_edges", "edge_distance", "value_bits", "values",
+                 "extra_values", "id")
+
+    def __init__(self, G, mask_bits, link_edges, edge_distance, value_bits=None, values=None,
+                 extra_values=None, id=None):
+        self.G = G
+        self.mask_bits = mask_bits
+        self.link_edges = link_edges
+        self.edge_distance = edge_distance
+        self.value_bits = value_bits
+        self.values = values
+        self.extra_values = extra_values
+        self.id = id
+
+    @classmethod
+    def from_model(cls, model, G=None):
+        '''
+        Compacts an RK model against a structural graph. Pass the same G to
+        every model sharing a structure, e.g. the template graph of a
+        pipeline, so that the models share G and its index instead of each
+        holding its own row graph.
+
+        :param model: Model to be compacted
+        :type model: RKModel
+        :param G: Structural graph with the nodes of model.G in the same order, defaults to model.G
+        :type G: Graph, optional
+        :raises ValueError: If the structure of model.G differs from G
+        :rtype: CompactRKModel
+        '''
+        if G is None:
+            G = model.G
+        index = structural_index(G)
+        if model.G is not G and not index.matches(model.G):
+            raise ValueError("The structure of the model differs from the structural graph")
+        mask = np.zeros(len(index), dtype=bool)
+        mask[[index.index(n) for n in model.mask]] = True
+        links, dist = [], []
+        for (u, v), attrs in model.edges.items():
+            if not G.has_edge(u, v):
+                links.append((index.index(u), index.index(v)))
+                dist.append(attrs.get("edge_distance", np.nan))
+        value_bits = values = extra = None
+        if model.G is not G:
+            present = np.zeros(len(index), dtype=bool)
+            values, extra = [], {}
+            for i, d in enumerate(model.G.nodes.values()):
+                if "value" not in d:
+                    continue
+                present[i] = True
+                v = d["value"]
+                if isinstance(v, numbers.Real) and not isinstance(v, (bool, np.bool_)):
+                    values.append(v)
+                else:
+                    values.append(np.nan)
+                    extra[i] = v
+            value_bits = np.packbits(present, bitorder="little")
+            values = np.array(values, dtype=np.float64)
+            extra = extra or None
+        return cls(G, np.packbits(mask, bitorder="little"),
+                   np.array(links, dtype=np.int32).reshape(-1, 2),
+                   np.array(dist, dtype=np.float64), value_bits, values, extra,
+                   id=getattr(model, "id", None))
+
+    @property
+    def nbytes(self):
+        '''Bytes held by the arrays of the model, excluding the shared structural graph'''
+        n = self.mask_bits.nbytes + self.link_edges.nbytes + self.edge_distance.nbytes
+        if self.value_bits is not None:
+            n += self.value_bits.nbytes + self.values.nbytes
+        return n
+
+    def mask_array(self):
+        '''
+        Returns the mask as a bool vector aligned to the node order of G
+
+        :rtype: ndarray
+        '''
+        n = len(structural_index(self.G))
+        return np.unpackbits(self.mask_bits, count=n, bitorder="little").astype(bool)
+
+    @property
+    def mask(self):
+        ids = structural_index(self.G).ids
+        return [ids[i] for i in np.flatnonzero(self.mask_array())]
+
+    def graph(self):
+        '''
+        Returns the graph of the model: the structural graph itself, or a
+        copy of it holding the node values of the model if they were kept.
+
+        :rtype: Graph
+        '''
+        if self.value_bits is None:
+            return self.G
+        index = structural_index(self.G)
+        present = np.unpackbits(self.value_bits, count=len(index), bitorder="little").astype(bool)
+        extra = self.extra_values or {}
+        g = copy_graph(self.G)
+        nodes = g.nodes
+        for n in index.ids:
+            nodes[n].pop("value", None)
+        for i, v in zip(np.flatnonzero(present).tolist(), self.values.tolist()):
+            nodes[index.ids[i]]["value"] = extra[i] if i in extra else v
+        return g
+
+    def to_model(self):
+        '''
+        Materialises the RK model. Its edges are an overlay over the graph of
+        the model (see :meth:`graph`).
+
+        :rtype: RKModel
+        '''
+        ids = structural_index(self.G).ids
+        g = self.graph()
+        gC = g.overlay()
+        for (u, v), d in zip(self.link_edges.tolist(), self.edge_distance.tolist()):
+            gC.add_edge(Edge(u=ids[u], v=ids[v], attributes={"edge_distance": d}))
+        return RKModel(g, self.mask, gC.edges, id=self.id)
+
+    @property
+    def edges(self):
+        return self.to_model().edges
 
     def get(self):
         '''
-        Get the Graph for RKModel
+        Get the Graph for RKModel. See :meth:`RKModel.get`.
+
+        :rtype: Graph
+        '''
+        return self.to_model().get()
+
+    def view(self):
+        '''
+        Read-only graph of the model. See :meth:`RKModel.view`.
+
+        :rtype: GraphOverlay
+        '''
+        return self.to_model().view()
+
+class RKModelBatch():
+    '''
+    Columnar batch of RK models sharing one structural graph G. The batch
+    holds the node values of every row, a boolean mask matrix (rows x nodes)
+    and the linkage edges of all rows as flat arrays, and builds the
+    :class:`RKModel` of a row only when it is accessed.
+
+    :param G: Structural graph shared by all rows. Node values are taken from `values`.
+    :type G: Graph
+    :param values: Object matrix (rows x nodes) of node values aligned to the node order of G
+    :type values: ndarray
+    :param value_nodes: Bool vector of the nodes whose value is taken from `values`
+    :type value_nodes: ndarray
+    :param masks: Bool matrix (rows x nodes) of masked nodes
+    :type masks: ndarray
+    :param links: Row, source position, target position and edge distance of every linkage edge
+    :type links: tuple[ndarray, ndarray, ndarray, ndarray]
+    :param index: Labels of the rows, defaults to 0..n-1
+    :type index: list, optional
+    '''
+
+    def __init__(self, G, values, value_nodes, masks, links, index=None):
+        self.G = G
+        self.ids = list(G.nodes)
+        self.values = values
+        self.value_nodes = value_nodes
+        self.masks = masks
+        self.set_links(links)
+        self.index = list(range(len(masks))) if index is None else list(index)
+
+    def set_links(self, links):
+        '''
+        Replaces the linkage edges of the batch.
+
+        :param links: Row, source position, target position and edge distance of every linkage edge, ordered by row
+        :type links: tuple[ndarray, ndarray, ndarray, ndarray]
+        '''
+        self.link_rows, self.link_u, self.link_v, self.link_d = links
+        self._link_offsets = np.searchsorted(self.link_rows, np.arange(len(self.masks) + 1))
+
+    def __len__(self):
+        return len(self.masks)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("batch index out of range")
+        g = self.graph(i)
+        gC = g.overlay()
+        for k in range(self._link_offsets[i], self._link_offsets[i + 1]):
+            gC.add_edge(Edge(u=self.ids[self.link_u[k]], v=self.ids[self.link_v[k]],
+                             attributes={"edge_distance": self.link_d[k]}))
+        mask = [self.ids[j] for j in np.flatnonzero(self.masks[i])]
+        return RKModel(g, mask, gC.edges)
+
+    def graph(self, i):
+        '''
+        Builds the graph of a row: a copy of the structural graph holding the
+        row's values. The copy shares no mutable attribute with G.
 
-        :return: Returns the graphmask for the RKModel
-        :rtype: GraphMask
+        :param i: Position of the row
+        :type i: int
+        :rtype: Graph
         '''
-        gC = copy.deepcopy(self.G)
-        for k,v in self.edges.items():
-            gC.add_edge(Edge(*k, attributes=v))
-        return NodeMask(nmasks=self.mask).fit(gC)
+        g = copy_graph(self.G)
+        for j in np.flatnonzero(self.value_nodes):
+            g.nodes[self.ids[j]]["value"] = self.values[i, j]
+        return g
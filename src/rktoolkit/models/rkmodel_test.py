@@ -30,3 +30,82 @@ def testRKModel():
     assert len(g.nodes) == 3
     m = RKModel(g, ['b'], g.edges)
     assert len(m.get().nodes) == 2
+
+def testCompactRKModel():
+    from .rkmodel import CompactRKModel
+    g = build_sample_graph()
+    gC = g.overlay()
+    gC.add_edge(Edge('a', 'b', attributes={"edge_distance": 1.0}))
+    m = RKModel(g, ['b'], gC.edges, id=7)
+    c = CompactRKModel.from_model(m)
+    assert c.id == 7
+    assert c.mask == ['b']
+    assert c.link_edges.tolist() == [[1, 2]]
+    assert c.edge_distance.tolist() == [1.0]
+    assert c.nbytes < 32
+    assert dict(c.edges.items()) == dict(m.edges.items())
+    assert set(c.get().nodes) == set(m.get().nodes)
+
+    # models compacted from the same structural graph share one index
+    c2 = CompactRKModel.from_model(RKModel(g, [], g.edges))
+    assert c2.G is c.G
+    assert not c2.mask_array().any()
+
+def testRKModelCachedView():
+    from .graph import GraphOverlay
+    g = build_sample_graph()
+    gC = g.overlay()
+    gC.add_edge(Edge('a', 'b', attributes={"edge_distance": 1.0}))
+    m = RKModel(g, [], gC.edges)
+    v = m.get()
+    assert isinstance(v, GraphOverlay) and v.base is g
+    assert m._view is not None
+    assert set(v.edges) == {('root', 'a'), ('root', 'b'), ('a', 'b')}
+    assert v.edges['a', 'b']['edge_distance'] == 1.0
+
+    # the result can be mutated without changing the model or G
+    v.add_vertex(Vertex('c'))
+    v.remove_node('a')
+    assert set(m.get().nodes) == {'root', 'a', 'b'}
+    assert set(g.nodes) == {'root', 'a', 'b'}
+    assert len(gC.edges) == 3
+
+    # view returns the cached overlay itself, get a new copy of it per call
+    assert m.view() is m.view() is m._view
+    assert m.get() is not m.get() and set(m.get().edges) == set(m.view().edges)
+
+    m.mask = ['b']
+    v2 = m.get()
+    assert v2 is not v
+    assert set(v2.nodes) == {'root', 'a'}
+    assert set(v2.edges) == {('root', 'a')}
+    assert set(NodeMask(nmasks=['b']).fit(g).nodes) == set(NodeMask(nmasks=['b']).view(g).nodes)
+    assert set(NodeMask(nmasks=['b']).view(gC).edges) == {('root', 'a')}
+
+def testCompactRKModelSharedGraph():
+    from .rkmodel import CompactRKModel
+    g = build_sample_graph()
+    rows = []
+    for i in range(3):
+        h = g.copy()
+        h.nodes['a']['value'] = i
+        h.nodes['b']['value'] = "x" if i == 2 else i / 2
+        gC = h.overlay()
+        gC.add_edge(Edge('a', 'b', attributes={"edge_distance": 0.5}))
+        rows.append(RKModel(h, ['b'] if i else [], gC.edges, id=i))
+
+    compact = [CompactRKModel.from_model(m, G=g) for m in rows]
+    assert all(c.G is g for c in compact)
+    for m, c in zip(rows, compact):
+        r = c.to_model()
+        assert r.G is not g and r.id == m.id and r.mask == m.mask
+        assert dict(r.G.nodes(data=True)) == dict(m.G.nodes(data=True))
+        assert dict(r.edges.items()) == dict(m.edges.items())
+    assert compact[2].extra_values == {0: None, 2: "x"}
+    assert g.nodes['a']['value'] == 1
+
+    other = Graph()
+    other.add_vertex(Vertex('b'))
+    import pytest
+    with pytest.raises(ValueError):
+        CompactRKModel.from_model(RKModel(other, [], other.edges), G=g)
@@ -5,7 +5,7 @@ from ..visualizer import RKModelVisualizer, RKDiagram
 import matplotlib.pyplot as plt
 import numpy as np
 from typing import List
-from rktoolkit.models.graph import NodeMask
+from rktoolkit.models.graph import NodeMask, GraphOverlay
 from rktoolkit.models.rkmodel import RKModel
 import copy
 import logging
@@ -55,8 +55,12 @@ def hierarchy_pos(G, root=None, width=1., vert_gap = 0.2, vert_loc = 0, xcenter
 #    if not nx.is_tree(G):
 #        raise TypeError('cannot use hierarchy_pos on a graph that is not a tree')
 
+    # overlays, such as the graphs of ontology rows, are directed as their base graph
+    directed = isinstance(G, (nx.DiGraph, GraphOverlay))
     if root is None:
-        if isinstance(G, nx.DiGraph):
+        if isinstance(G, GraphOverlay):
+            root = next(iter(G.sort()))
+        elif directed:
             root = next(iter(nx.topological_sort(G)))  #allows back compatibility with nx version 1.11
         else:
             root = random.choice(list(G.nodes))
@@ -74,7 +78,7 @@ def hierarchy_pos(G, root=None, width=1., vert_gap = 0.2, vert_loc = 0, xcenter
         else:
             pos[root] = (xcenter, vert_loc)
         children = list(G.neighbors(root))
-        if not isinstance(G, nx.DiGraph) and parent is not None:
+        if not directed and parent is not None:
             children.remove(parent)
         if len(children)!=0:
             dx = width/len(children)
@@ -105,8 +105,10 @@ def draw_rk_diagram(rkmodel, spread=1, ax=None, with_labels=True, minsize=100, c
 
     # indexing
     nodes = list(rkmodel.G.nodes)
-    g = rkmodel.get()
+    # the cached graph of the model is only read, so it is neither copied nor materialised
+    g = rkmodel.view()
     node_subset = list(g.nodes)
+    edge_subset = list(g.edges)
     selected_indexes = [nodes.index(n) for n in node_subset]
 
     # positioning
@@ -150,8 +152,10 @@ def draw_rk_diagram(rkmodel, spread=1, ax=None, with_labels=True, minsize=100, c
     sizes = _get_sizes(node_subset)
     sizes = _resize(sizes)
 
-    nx.draw(g, pos=filtered_pos, with_labels=with_labels,
+    # the nodes and edges are drawn over the base graph of the overlay
+    nx.draw(g.base, pos=filtered_pos, nodelist=node_subset, edgelist=edge_subset,
+            labels={n: n for n in node_subset}, with_labels=with_labels,
             font_size=10, node_size=sizes, ax=ax, node_color = filtered_colors, edgecolors = 'black')
 
-    nx.draw_networkx_nodes(g, pos=filtered_pos, nodelist = ['root'],
+    nx.draw_networkx_nodes(g.base, pos=filtered_pos, nodelist = ['root'],
                            node_color = center_color, ax=ax, node_size = sizes.max()*emult)